@@ -2,8 +2,15 @@
 JWT Authentication and Authorization
 """
 import os
-from datetime import datetime, timedelta
-from typing import Optional, Union
+import sys
+import hmac
+import hashlib
+import secrets
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Optional, Tuple, Union
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status, Request
@@ -11,7 +18,9 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from database import get_db
 from models import User, UserRole
-from schemas import TokenData
+from schemas import TokenData, Principal
+from cache import principal_cache
+from write_behind import record_last_login
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,10 +32,59 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-jwt-key-change-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
 
 # Security scheme
 security = HTTPBearer()
 
+# bcrypt is deliberately slow (~250 ms) and releases the GIL, so it runs on a
+# dedicated bounded pool; calls beyond workers + queue are rejected at once
+# rather than queueing logins behind each other until clients time out.
+# One core is left to the event loop by default
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+# Hashing threads run at a lower OS priority (Linux schedules threads
+# individually), so the event loop thread still gets a core when every
+# worker is busy and other requests keep their latency during a login storm
+PASSWORD_HASH_NICE = int(os.getenv("PASSWORD_HASH_NICE", "10"))
+
+def _lower_hash_thread_priority() -> None:
+    """Executor initializer renicing the current worker thread"""
+    # Elsewhere setpriority with a thread id would target some other process
+    if not PASSWORD_HASH_NICE or not sys.platform.startswith("linux"):
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), PASSWORD_HASH_NICE)
+    except OSError as e:
+        logger.warning(f"Could not lower password hashing thread priority: {e}")
+
+_password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash",
+    initializer=_lower_hash_thread_priority
+)
+_password_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_PENDING)
+
+async def run_password_task(func: Callable[..., Any], *args) -> Any:
+    """Run bcrypt call on the password pool, or raise 503 when it is saturated"""
+    if not _password_slots.acquire(blocking=False):
+        logger.warning("Password hashing pool saturated, rejecting request")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, try again later",
+            headers={"Retry-After": "1"}
+        )
+    
+    try:
+        future = _password_executor.submit(func, *args)
+    except Exception:
+        _password_slots.release()
+        raise
+    # Release on completion, not when the awaiting request goes away
+    future.add_done_callback(lambda _: _password_slots.release())
+    return await asyncio.wrap_future(future)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -35,6 +93,14 @@ def get_password_hash(password: str) -> str:
     """Generate password hash"""
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify password on the password hashing pool"""
+    return await run_password_task(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Generate password hash on the password hashing pool"""
+    return await run_password_task(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
@@ -47,6 +113,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_user_access_token(user: User) -> str:
+    """Create access token carrying the user's identity, company and role"""
+    return create_access_token(
+        data={
+            "sub": user.email,
+            "company_id": user.company_id,
+            "role": user.role.value
+        },
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+
+def hash_refresh_token(token: str) -> str:
+    """Keyed hash of a refresh token; the lookup key, so raw tokens are never stored"""
+    # Tokens are 256 random bits, so a single HMAC is enough - unlike
+    # passwords they need no slow hash to resist guessing
+    return hmac.new(SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+def generate_refresh_token() -> Tuple[str, str]:
+    """New refresh token and its keyed hash"""
+    token = secrets.token_urlsafe(32)
+    return token, hash_refresh_token(token)
+
 def verify_token(token: str) -> Optional[TokenData]:
     """Verify and decode JWT token"""
     try:
@@ -68,26 +156,61 @@ def verify_token(token: str) -> Optional[TokenData]:
         logger.warning(f"JWT verification failed: {e}")
         return None
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+async def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     """Authenticate user with email and password"""
     user = db.query(User).filter(
         User.email == email,
         User.is_active == True
     ).first()
     
-    if not user or not verify_password(password, user.hashed_password):
+    if not user:
+        return None
+    
+    # End the transaction so the pooled connection is not held while the
+    # password waits for and runs on the hashing pool. Detached first, so the
+    # rollback does not expire the user and every later access reload it
+    hashed_password = user.hashed_password
+    db.expunge(user)
+    db.rollback()
+    if not await verify_password_async(password, hashed_password):
         return None
     
-    # Update last login
-    user.last_login = datetime.utcnow()
-    db.commit()
+    # Written behind in batches; the login itself does not commit. Set on the
+    # detached user too, so the login response shows this login, not the last flushed one
+    user.last_login = datetime.now(timezone.utc)
+    record_last_login(user.id, user.last_login)
     
     return user
 
+def invalidate_principal(email: str, company_id: int) -> None:
+    """Drop cached principal so the next request reloads the user"""
+    principal_cache.delete((email, company_id))
+
+def get_principal(db: Session, token_data: TokenData) -> Optional[Principal]:
+    """Resolve token claims to an active user, from cache or the database"""
+    cache_key = (token_data.email, token_data.company_id)
+    principal = principal_cache.get(cache_key)
+    if principal is not None:
+        return principal
+    
+    user = db.query(User).filter(
+        User.email == token_data.email,
+        User.company_id == token_data.company_id,
+        User.is_active == True
+    ).first()
+    
+    if user is None:
+        return None
+    
+    principal = Principal.from_orm(user)
+    principal_cache.set(cache_key, principal)
+    return principal
+
 async def get_current_user(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
-) -> User:
+) -> Principal:
     """Get current authenticated user"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -98,22 +221,20 @@ async def get_current_user(
     if not credentials.credentials:
         raise credentials_exception
     
-    token_data = verify_token(credentials.credentials)
+    # Claims decoded by MultiTenantMiddleware; decode here only when it did not run
+    token_data = getattr(request.state, "token_data", None)
+    if token_data is None:
+        token_data = verify_token(credentials.credentials)
     if token_data is None:
         raise credentials_exception
     
-    user = db.query(User).filter(
-        User.email == token_data.email,
-        User.company_id == token_data.company_id,
-        User.is_active == True
-    ).first()
-    
+    user = get_principal(db, token_data)
     if user is None:
         raise credentials_exception
         
     return user
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     """Get current active user"""
     if not current_user.is_active:
         raise HTTPException(
@@ -128,7 +249,7 @@ def require_role(allowed_roles: Union[UserRole, list]):
     if isinstance(allowed_roles, UserRole):
         allowed_roles = [allowed_roles]
     
-    def role_checker(current_user: User = Depends(get_current_active_user)) -> User:
+    def role_checker(current_user: Principal = Depends(get_current_active_user)) -> Principal:
         if current_user.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -145,6 +266,13 @@ require_warehouse_access = require_role([UserRole.ADMIN, UserRole.ACCOUNTANT, Us
 require_read_access = require_role([UserRole.ADMIN, UserRole.ACCOUNTANT, UserRole.WAREHOUSE_KEEPER, UserRole.OBSERVER])
 
 # Multi-tenancy middleware
+PUBLIC_PATHS = {"/", "/health", "/auth/login", "/auth/register", "/auth/refresh", "/auth/logout"}
+PUBLIC_PATH_PREFIXES = ("/docs", "/redoc", "/openapi.json")
+
+def is_public_path(path: str) -> bool:
+    """Whether path is served without authentication"""
+    return path in PUBLIC_PATHS or path.startswith(PUBLIC_PATH_PREFIXES)
+
 class MultiTenantMiddleware:
     """Middleware to ensure data isolation between companies"""
     
@@ -152,21 +280,17 @@ class MultiTenantMiddleware:
         self.app = app
     
     async def __call__(self, scope, receive, send):
-        if scope["type"] == "http":
+        if scope["type"] == "http" and not is_public_path(scope["path"]):
             request = Request(scope, receive)
             
-            # Skip authentication for public endpoints
-            public_paths = ["/", "/docs", "/redoc", "/openapi.json", "/health", "/auth/login", "/auth/register"]
-            if any(request.url.path.startswith(path) for path in public_paths):
-                await self.app(scope, receive, send)
-                return
-            
-            # Extract and validate company_id from token
+            # Decode the token once; request.state lives in the ASGI scope,
+            # so get_current_user and get_company_db reuse the claims
             auth_header = request.headers.get("authorization")
             if auth_header and auth_header.startswith("Bearer "):
                 token = auth_header.split(" ")[1]
                 token_data = verify_token(token)
                 if token_data:
+                    request.state.token_data = token_data
                     # Add company_id to request state for use in CRUD operations
                     request.state.company_id = token_data.company_id
                     request.state.user_role = token_data.role
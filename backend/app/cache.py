@@ -0,0 +1,99 @@
+"""
+In-process caching with per-company data versions
+Cached entries are keyed by the company's data version, so any write that
+bumps the version makes older entries unreachable without explicit deletes
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a fixed TTL"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get cached value or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value and evict least recently used entries over maxsize"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Drop entry if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# Per-company data versions
+_company_versions: Dict[int, int] = {}
+_versions_lock = threading.Lock()
+
+def get_company_version(company_id: int) -> int:
+    """Get current data version for company"""
+    return _company_versions.get(company_id, 0)
+
+def bump_company_version(company_id: int) -> int:
+    """Mark company data as changed, invalidating cached results keyed by the old version"""
+    with _versions_lock:
+        version = _company_versions.get(company_id, 0) + 1
+        _company_versions[company_id] = version
+    return version
+
+# Versions live in process memory, so other workers only observe a write
+# once their entry expires; the TTL bounds that staleness
+dashboard_cache = TTLCache(
+    maxsize=int(os.getenv("DASHBOARD_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("DASHBOARD_CACHE_TTL", "60"))
+)
+
+# Report aggregates are only as fresh as the rollups they read, so they can
+# live longer than the dashboard; a write still invalidates them immediately
+report_cache = TTLCache(
+    maxsize=int(os.getenv("REPORT_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("REPORT_CACHE_TTL", "300"))
+)
+
+# Authenticated principals by token subject; user_crud.update drops the
+# entry, other workers see the change once it expires
+principal_cache = TTLCache(
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+)
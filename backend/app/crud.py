@@ -2,18 +2,49 @@
 CRUD operations with multi-tenancy support
 All operations automatically filter by company_id for data isolation
 """
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func, desc
-from datetime import datetime, timedelta
+import os
+import re
+import json
+import uuid
+import threading
+import numpy as np
+from typing import List, Optional, Dict, Any, Tuple, Iterable, Iterator
+from sqlalchemy.orm import Session, joinedload, aliased
+from sqlalchemy import (
+    and_, or_, func, desc, tuple_, text, literal_column, insert, update, select, any_, bindparam, cast, Integer, Date
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.sql.expression import Executable, ClauseElement
+from sqlalchemy.ext.compiler import compiles
+from pydantic import ValidationError
+from datetime import datetime, date, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from models import *
 from schemas import *
-from auth import get_password_hash
-from utils import generate_unique_inventory_number, log_audit_action
+from auth import get_password_hash, invalidate_principal, generate_refresh_token, hash_refresh_token
+from utils import (
+    format_inventory_number, log_audit_action, encode_cursor, decode_cursor,
+    calculate_portfolio_depreciation, MONTH_ABBREVIATIONS
+)
+from cache import bump_company_version
+from database import autonomous_engine
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Planner estimates
+class Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) of a statement, which keeps its bound parameters"""
+    inherit_cache = False
+    
+    def __init__(self, statement):
+        self.statement = statement
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    # Filter values (user search text included) stay bound parameters
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
 class CRUDBase:
     """Base CRUD class with multi-tenancy support"""
     
@@ -29,20 +60,27 @@ class CRUDBase:
             raise ValueError("Company ID is required for data isolation")
         
         return company_id
+    
+    def estimate_count(self, db: Session, query) -> int:
+        """Estimate query row count from the planner without executing it"""
+        plan = db.execute(Explain(query.statement)).scalar()
+        return int(plan[0]["Plan"]["Plan Rows"])
 
 # Company CRUD
 class CRUDCompany(CRUDBase):
     def __init__(self):
         super().__init__(Company)
     
-    def create_with_admin(self, db: Session, company_data: CompanyCreate) -> Company:
-        """Create company with admin user"""
+    def create_with_admin(self, db: Session, company_data: CompanyCreate,
+                          hashed_password: Optional[str] = None) -> Company:
+        """Create company with admin user; pass hashed_password when hashed off the event loop"""
         # Create company
         company = Company(
             name=company_data.name,
             inn=company_data.inn,
             email=company_data.email,
-            address=company_data.address
+            address=company_data.address,
+            timezone=company_data.timezone
         )
         db.add(company)
         db.flush()  # Get company ID
@@ -51,7 +89,7 @@ class CRUDCompany(CRUDBase):
         admin_user = User(
             email=company_data.admin_email,
             username=company_data.admin_username,
-            hashed_password=get_password_hash(company_data.admin_password),
+            hashed_password=hashed_password or get_password_hash(company_data.admin_password),
             role=UserRole.ADMIN,
             company_id=company.id
         )
@@ -75,12 +113,13 @@ class CRUDUser(CRUDBase):
         """Get user by email"""
         return db.query(User).filter(User.email == email, User.is_active == True).first()
     
-    def create(self, db: Session, user_data: UserCreate, company_id: int) -> User:
-        """Create user"""
+    def create(self, db: Session, user_data: UserCreate, company_id: int,
+               hashed_password: Optional[str] = None) -> User:
+        """Create user; pass hashed_password when hashed off the event loop"""
         user = User(
             email=user_data.email,
             username=user_data.username,
-            hashed_password=get_password_hash(user_data.password),
+            hashed_password=hashed_password or get_password_hash(user_data.password),
             role=user_data.role,
             company_id=company_id
         )
@@ -91,6 +130,10 @@ class CRUDUser(CRUDBase):
         log_audit_action(user.id, company_id, "CREATE", "User", user.id, db=db)
         return user
     
+    def get_by_id(self, db: Session, user_id: int, company_id: int) -> Optional[User]:
+        """Get user by id within company"""
+        return db.query(User).filter(User.id == user_id, User.company_id == company_id).first()
+    
     def get_users_by_company(self, db: Session, company_id: int, skip: int = 0, limit: int = 100) -> List[User]:
         """Get users by company"""
         return db.query(User).filter(
@@ -98,8 +141,9 @@ class CRUDUser(CRUDBase):
             User.is_active == True
         ).offset(skip).limit(limit).all()
     
-    def update(self, db: Session, user_id: int, user_data: UserUpdate, current_user: User) -> Optional[User]:
-        """Update user"""
+    def update(self, db: Session, user_id: int, user_data: UserUpdate, current_user: Principal,
+               hashed_password: Optional[str] = None) -> Optional[User]:
+        """Update user; pass hashed_password when hashed off the event loop"""
         user = db.query(User).filter(
             User.id == user_id,
             User.company_id == current_user.company_id,
@@ -111,17 +155,113 @@ class CRUDUser(CRUDBase):
         
         update_data = user_data.dict(exclude_unset=True)
         if 'password' in update_data:
-            update_data['hashed_password'] = get_password_hash(update_data.pop('password'))
+            password = update_data.pop('password')
+            update_data['hashed_password'] = hashed_password or get_password_hash(password)
         
+        previous_email = user.email
         for field, value in update_data.items():
             setattr(user, field, value)
         
+        # A new password or deactivation ends every session of the user
+        if 'hashed_password' in update_data or update_data.get('is_active') is False:
+            refresh_token_crud.revoke_user(db, user.id, commit=False)
+        
         db.commit()
         db.refresh(user)
+        bump_company_version(current_user.company_id)
+        # Role or active flag may have changed; tokens are keyed by the old email
+        invalidate_principal(previous_email, user.company_id)
         
         log_audit_action(current_user.id, current_user.company_id, "UPDATE", "User", user.id, db=db)
         return user
 
+# Refresh token CRUD
+class CRUDRefreshToken(CRUDBase):
+    def __init__(self):
+        super().__init__(RefreshToken)
+    
+    def issue(self, db: Session, user: User, ttl: timedelta, family_id: Optional[str] = None,
+              commit: bool = True) -> str:
+        """Create refresh token for user, starting a new family unless rotating one"""
+        # Expired tokens are dead for rotation and reuse detection alike
+        db.query(RefreshToken).filter(
+            RefreshToken.user_id == user.id,
+            RefreshToken.expires_at < func.now()
+        ).delete(synchronize_session=False)
+        
+        token, token_hash = generate_refresh_token()
+        db.add(RefreshToken(
+            user_id=user.id,
+            company_id=user.company_id,
+            token_hash=token_hash,
+            family_id=family_id or uuid.uuid4().hex,
+            expires_at=func.now() + ttl
+        ))
+        if commit:
+            db.commit()
+        return token
+    
+    def rotate(self, db: Session, token: str, ttl: timedelta) -> Optional[Tuple[User, str]]:
+        """Exchange a valid refresh token for a new one of the same family"""
+        row = db.query(
+            RefreshToken, (RefreshToken.expires_at > func.now()).label("is_live")
+        ).filter(
+            RefreshToken.token_hash == hash_refresh_token(token)
+        ).with_for_update(of=RefreshToken).first()
+        
+        if not row:
+            return None
+        
+        record, is_live = row
+        if record.revoked_at is not None:
+            # A rotated token used again means it was copied; whoever holds
+            # the newer token of the family loses it as well
+            logger.warning(f"Revoked refresh token presented for user {record.user_id}, revoking token family")
+            self._revoke(db, RefreshToken.family_id == record.family_id)
+            db.commit()
+            return None
+        
+        user = db.query(User).filter(
+            User.id == record.user_id,
+            User.is_active == True
+        ).first()
+        
+        if not is_live or not user:
+            db.rollback()
+            return None
+        
+        record.revoked_at = func.now()
+        new_token = self.issue(db, user, ttl, family_id=record.family_id, commit=False)
+        db.commit()
+        return user, new_token
+    
+    def revoke(self, db: Session, token: str) -> bool:
+        """Revoke the token's family (logout of that session)"""
+        family_id = db.query(RefreshToken.family_id).filter(
+            RefreshToken.token_hash == hash_refresh_token(token)
+        ).scalar()
+        
+        if not family_id:
+            return False
+        
+        self._revoke(db, RefreshToken.family_id == family_id)
+        db.commit()
+        return True
+    
+    def revoke_user(self, db: Session, user_id: int, commit: bool = True) -> int:
+        """Revoke all refresh tokens of user (logout everywhere)"""
+        count = self._revoke(db, RefreshToken.user_id == user_id)
+        if commit:
+            db.commit()
+        return count
+    
+    def _revoke(self, db: Session, condition) -> int:
+        """Mark matching live tokens revoked"""
+        return db.query(RefreshToken).filter(
+            condition,
+            RefreshToken.revoked_at.is_(None)
+        ).update({"revoked_at": func.now()}, synchronize_session=False)
+
 # Branch CRUD
 class CRUDBranch(CRUDBase):
     def __init__(self):
@@ -163,6 +303,7 @@ class CRUDBranch(CRUDBase):
         
         db.commit()
         db.refresh(branch)
+        bump_company_version(company_id)
         return branch
 
 # Warehouse CRUD
@@ -190,6 +331,7 @@ class CRUDWarehouse(CRUDBase):
         db.add(warehouse)
         db.commit()
         db.refresh(warehouse)
+        bump_company_version(company_id)
         return warehouse
     
     def get_by_company(self, db: Session, company_id: int, skip: int = 0, limit: int = 100) -> List[Warehouse]:
@@ -209,6 +351,202 @@ class CRUDWarehouse(CRUDBase):
             Branch.is_active == True
         ).all()
 
+# Inventory rollup CRUD
+class CRUDInventoryRollup:
+    """Maintains inventory_rollups incrementally inside the caller's transaction"""
+    
+    KEY_COLUMNS = ["company_id", "warehouse_id", "category", "status"]
+    # Asset columns that make up a snapshot, in snapshot order
+    SNAPSHOT_FIELDS = ("warehouse_id", "category", "status", "quantity", "cost")
+    
+    def snapshot(self, asset: Asset) -> Optional[tuple]:
+        """Capture the rollup contribution of an asset, None if it is not counted"""
+        # is_active is still None on a pending asset until its column default applies
+        if asset is None or asset.is_active is False:
+            return None
+        return tuple(getattr(asset, field) for field in self.SNAPSHOT_FIELDS)
+    
+    def record(self, deltas: Dict[tuple, List], before: Optional[tuple], after: Optional[tuple]) -> None:
+        """Accumulate the difference between two snapshots into deltas"""
+        for snap, sign in ((before, -1), (after, 1)):
+            if snap is None:
+                continue
+            warehouse_id, category, asset_status, quantity, cost = snap
+            delta = deltas.setdefault((warehouse_id, category, asset_status), [0, 0, 0.0])
+            delta[0] += sign
+            delta[1] += sign * quantity
+            delta[2] += sign * cost * quantity
+    
+    def apply(self, db: Session, company_id: int, deltas: Dict[tuple, List]) -> None:
+        """Apply accumulated deltas with a single multi-row upsert (no commit)"""
+        # Rows in key order, so writers touching the same keys lock them in the same order
+        rows = [
+            {
+                "company_id": company_id,
+                "warehouse_id": warehouse_id,
+                "category": category,
+                "status": asset_status,
+                "asset_count": count,
+                "total_quantity": quantity,
+                "total_value": value
+            }
+            for (warehouse_id, category, asset_status), (count, quantity, value) in sorted(deltas.items())
+            if count or quantity or value
+        ]
+        if not rows:
+            return
+        
+        stmt = pg_insert(InventoryRollup).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=self.KEY_COLUMNS,
+            set_={
+                "asset_count": InventoryRollup.asset_count + stmt.excluded.asset_count,
+                "total_quantity": InventoryRollup.total_quantity + stmt.excluded.total_quantity,
+                "total_value": InventoryRollup.total_value + stmt.excluded.total_value,
+                "updated_at": func.now()
+            }
+        )
+        db.execute(stmt)
+    
+    def track(self, db: Session, company_id: int, before: Optional[tuple], after: Optional[tuple]) -> None:
+        """Apply the change of a single asset between two snapshots (no commit)"""
+        deltas = {}
+        self.record(deltas, before, after)
+        self.apply(db, company_id, deltas)
+    
+    def _base_query(self, db: Session, company_id: Optional[int] = None):
+        """Recompute rollup rows from the base tables"""
+        query = db.query(
+            Asset.company_id,
+            Asset.warehouse_id,
+            Asset.category,
+            Asset.status,
+            func.count(Asset.id).label("asset_count"),
+            func.coalesce(func.sum(Asset.quantity), 0).label("total_quantity"),
+            func.coalesce(func.sum(Asset.cost * Asset.quantity), 0).label("total_value")
+        ).filter(
+            Asset.is_active == True
+        ).group_by(Asset.company_id, Asset.warehouse_id, Asset.category, Asset.status)
+        
+        if company_id is not None:
+            query = query.filter(Asset.company_id == company_id)
+        
+        return query
+    
+    def rebuild(self, db: Session, company_id: Optional[int] = None) -> int:
+        """Recompute rollups from base tables, returns number of rows written"""
+        # Blocks concurrent upserts until commit; writers that already changed
+        # assets but not yet their rollup apply their delta after the rebuild
+        db.execute(text("LOCK TABLE inventory_rollups IN SHARE ROW EXCLUSIVE MODE"))
+        
+        delete_query = db.query(InventoryRollup)
+        if company_id is not None:
+            delete_query = delete_query.filter(InventoryRollup.company_id == company_id)
+        delete_query.delete(synchronize_session=False)
+        
+        source = self._base_query(db, company_id).subquery()
+        result = db.execute(
+            pg_insert(InventoryRollup).from_select(
+                self.KEY_COLUMNS + ["asset_count", "total_quantity", "total_value"],
+                db.query(source).statement
+            )
+        )
+        db.commit()
+        
+        if company_id is not None:
+            bump_company_version(company_id)
+        
+        logger.info(f"Rebuilt {result.rowcount} inventory rollup rows")
+        return result.rowcount
+    
+    def verify(self, db: Session, company_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Compare rollups with base tables, returns mismatching keys"""
+        expected = {
+            (row.company_id, row.warehouse_id, row.category, row.status):
+                (row.asset_count, int(row.total_quantity), float(row.total_value))
+            for row in self._base_query(db, company_id).all()
+        }
+        
+        query = db.query(InventoryRollup)
+        if company_id is not None:
+            query = query.filter(InventoryRollup.company_id == company_id)
+        actual = {
+            (row.company_id, row.warehouse_id, row.category, row.status):
+                (row.asset_count, row.total_quantity, float(row.total_value))
+            for row in query.all()
+        }
+        
+        mismatches = []
+        for key in set(expected) | set(actual):
+            exp = expected.get(key, (0, 0, 0.0))
+            act = actual.get(key, (0, 0, 0.0))
+            if exp[0] != act[0] or exp[1] != act[1] or abs(exp[2] - act[2]) > 0.005:
+                mismatches.append({
+                    "company_id": key[0],
+                    "warehouse_id": key[1],
+                    "category": key[2],
+                    "status": key[3],
+                    "expected": exp,
+                    "actual": act
+                })
+        
+        return mismatches
+
+# Inventory number allocation
+class CRUDInventoryNumber:
+    """Hands out per-company inventory numbers from counter blocks reserved in inventory_counters"""
+    
+    def __init__(self, block_size: int = 100):
+        self.block_size = block_size
+        self._blocks: Dict[int, List[int]] = {}  # company_id -> [next_value, last_value]
+        self._locks: Dict[int, threading.Lock] = {}  # company_id -> lock over its block
+        self._locks_guard = threading.Lock()
+    
+    def _company_lock(self, company_id: int) -> threading.Lock:
+        """Lock serializing one company's allocations, so companies never wait on each other"""
+        with self._locks_guard:
+            return self._locks.setdefault(company_id, threading.Lock())
+    
+    def _reserve(self, company_id: int, count: int) -> int:
+        """Advance the company counter by count and return the new last value"""
+        stmt = pg_insert(InventoryCounter).values(company_id=company_id, last_value=count)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[InventoryCounter.company_id],
+            set_={
+                "last_value": InventoryCounter.last_value + stmt.excluded.last_value,
+                "updated_at": func.now()
+            }
+        ).returning(InventoryCounter.last_value)
+        
+        # Reserve in a separate short transaction so the counter row lock is
+        # released immediately instead of being held until the caller commits
+        # (a rolled back caller must not give back numbers already handed out).
+        # Its connection comes from the autonomous pool, not the session pool
+        with autonomous_engine.begin() as connection:
+            return connection.execute(stmt).scalar_one()
+    
+    def allocate(self, db: Session, company_id: int, count: int = 1) -> List[str]:
+        """Allocate count unique inventory numbers for company"""
+        if count < 1:
+            return []
+        
+        with self._company_lock(company_id):
+            block = self._blocks.get(company_id)
+            if block is None or block[1] - block[0] + 1 < count:
+                # Unused numbers of a replaced block are skipped, like sequence gaps
+                last_value = self._reserve(company_id, max(count, self.block_size))
+                block = [last_value - max(count, self.block_size) + 1, last_value]
+                self._blocks[company_id] = block
+            
+            first_value = block[0]
+            block[0] += count
+        
+        return [format_inventory_number(company_id, value) for value in range(first_value, first_value + count)]
+    
+    def next(self, db: Session, company_id: int) -> str:
+        """Allocate a single inventory number"""
+        return self.allocate(db, company_id, 1)[0]
+
 # Asset CRUD
 class CRUDAsset(CRUDBase):
     def __init__(self):
@@ -227,8 +565,7 @@ class CRUDAsset(CRUDBase):
         if not warehouse:
             raise ValueError("Warehouse not found or doesn't belong to company")
         
-        # Generate unique inventory number
-        inventory_number = generate_unique_inventory_number(db, company_id)
+        inventory_number = inventory_number_crud.next(db, company_id)
         
         asset = Asset(
             inventory_number=inventory_number,
@@ -239,6 +576,7 @@ class CRUDAsset(CRUDBase):
             quantity=asset_data.quantity,
             status=asset_data.status,
             warehouse_id=asset_data.warehouse_id,
+            company_id=company_id,
             serial_number=asset_data.serial_number,
             purchase_date=asset_data.purchase_date,
             warranty_until=asset_data.warranty_until,
@@ -246,32 +584,159 @@ class CRUDAsset(CRUDBase):
             notes=asset_data.notes
         )
         db.add(asset)
+        rollup_crud.track(db, company_id, None, rollup_crud.snapshot(asset))
         db.commit()
         db.refresh(asset)
+        bump_company_version(company_id)
         return asset
     
-    def get_by_company(self, db: Session, company_id: int, skip: int = 0, limit: int = 100, 
-                      search: Optional[str] = None, category: Optional[AssetCategory] = None,
-                      status: Optional[AssetStatus] = None, warehouse_id: Optional[int] = None) -> List[Asset]:
-        """Get assets by company with filters"""
-        query = db.query(Asset).join(Warehouse).join(Branch).filter(
+    def create_bulk(self, db: Session, assets_data: List[AssetCreate], company_id: int) -> List[BulkAssetResult]:
+        """Create many assets in one transaction, reporting the outcome of every row"""
+        warehouse_ids = {asset_data.warehouse_id for asset_data in assets_data}
+        valid_warehouse_ids = {
+            warehouse_id for (warehouse_id,) in db.query(Warehouse.id).join(Branch).filter(
+                Warehouse.id.in_(warehouse_ids),
+                Branch.company_id == company_id,
+                Warehouse.is_active == True,
+                Branch.is_active == True
+            )
+        }
+        
+        accepted = [
+            index for index, asset_data in enumerate(assets_data)
+            if asset_data.warehouse_id in valid_warehouse_ids
+        ]
+        
+        if not accepted:
+            return [self._bulk_warehouse_error(index) for index in range(len(assets_data))]
+        
+        inventory_numbers = inventory_number_crud.allocate(db, company_id, len(accepted))
+        rows = []
+        deltas = {}
+        for index, inventory_number in zip(accepted, inventory_numbers):
+            asset_data = assets_data[index]
+            rows.append({
+                "inventory_number": inventory_number,
+                "name": asset_data.name,
+                "description": asset_data.description,
+                "category": asset_data.category,
+                "cost": asset_data.cost,
+                "quantity": asset_data.quantity,
+                "status": asset_data.status,
+                "warehouse_id": asset_data.warehouse_id,
+                "company_id": company_id,
+                "serial_number": asset_data.serial_number,
+                "purchase_date": asset_data.purchase_date,
+                "warranty_until": asset_data.warranty_until,
+                "supplier": asset_data.supplier,
+                "notes": asset_data.notes,
+                "is_active": True
+            })
+            rollup_crud.record(deltas, None, (
+                asset_data.warehouse_id, asset_data.category, asset_data.status,
+                asset_data.quantity, asset_data.cost
+            ))
+        
+        # Core insert against the table keeps NULL columns in every row, so all rows
+        # share one batched multi-row INSERT ... RETURNING; returned rows are matched
+        # back by inventory number because requesting parameter order would force
+        # one statement per row
+        stmt = insert(Asset.__table__).returning(Asset.id, Asset.inventory_number)
+        asset_ids = {inventory_number: asset_id for asset_id, inventory_number in db.execute(stmt, rows)}
+        rollup_crud.apply(db, company_id, deltas)
+        db.commit()
+        bump_company_version(company_id)
+        
+        created = {
+            index: BulkAssetResult(
+                index=index, success=True,
+                id=asset_ids[row["inventory_number"]], inventory_number=row["inventory_number"]
+            )
+            for index, row in zip(accepted, rows)
+        }
+        return [created.get(index) or self._bulk_warehouse_error(index) for index in range(len(assets_data))]
+    
+    def _bulk_warehouse_error(self, index: int) -> BulkAssetResult:
+        return BulkAssetResult(index=index, success=False, error="Warehouse not found or doesn't belong to company")
+    
+    def import_rows(self, db: Session, rows: Iterable[Tuple[int, Dict[str, Any]]], company_id: int,
+                    default_warehouse_id: Optional[int] = None, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Validate and insert spreadsheet rows in batches, yielding row errors and progress events"""
+        processed = created = failed = 0
+        
+        def flush(batch):
+            nonlocal created, failed
+            results = self.create_bulk(db, [asset_data for _, asset_data in batch], company_id)
+            for (row_number, _), result in zip(batch, results):
+                if result.success:
+                    created += 1
+                else:
+                    failed += 1
+                    yield {"event": "error", "row": row_number, "errors": [result.error]}
+        
+        batch = []
+        for row_number, record in rows:
+            processed += 1
+            if default_warehouse_id is not None and record.get("warehouse_id") is None:
+                record["warehouse_id"] = default_warehouse_id
+            
+            try:
+                batch.append((row_number, AssetCreate(**record)))
+            except ValidationError as e:
+                failed += 1
+                errors = [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()]
+                yield {"event": "error", "row": row_number, "errors": errors}
+            
+            if len(batch) >= batch_size:
+                yield from flush(batch)
+                batch = []
+                yield {"event": "progress", "processed": processed, "created": created, "failed": failed}
+        
+        if batch:
+            yield from flush(batch)
+        
+        logger.info(f"Imported {created} of {processed} asset rows for company {company_id}")
+        yield {"event": "done", "processed": processed, "created": created, "failed": failed}
+    
+    # Text search configuration of idx_assets_search
+    SEARCH_CONFIG = "russian"
+    
+    # Columns allowed for sorting; each is paired with id for a stable keyset
+    SORT_COLUMNS = {
+        "id": Asset.id,
+        "name": Asset.name,
+        "inventory_number": Asset.inventory_number,
+        "cost": Asset.cost,
+        "created_at": Asset.created_at
+    }
+    # Python type of each sort column's value in a cursor
+    SORT_TYPES = {"id": int, "name": str, "inventory_number": str, "cost": float, "created_at": datetime}
+    
+    def _active_warehouses(self, db: Session, company_id: int):
+        """Select of the company's active warehouse ids, for semi-joins"""
+        return db.query(Warehouse.id).join(Branch).filter(
             Branch.company_id == company_id,
-            Asset.is_active == True,
             Warehouse.is_active == True,
             Branch.is_active == True
-        ).options(
-            joinedload(Asset.warehouse).joinedload(Warehouse.branch)
+        ).subquery().select()
+    
+    def _filtered_query(self, db: Session, company_id: int, search: Optional[str] = None,
+                        category: Optional[AssetCategory] = None, status: Optional[AssetStatus] = None,
+                        warehouse_id: Optional[int] = None, search_mode: str = "fulltext",
+                        warehouse_ids: Optional[List[int]] = None):
+        """Build company-scoped asset query with filters shared by listing and counting"""
+        # Tenancy comes from assets.company_id; active warehouses are a small
+        # semi-join set, so filtered counts run as index-only scans over
+        # idx_assets_company_warehouse
+        query = db.query(Asset).filter(
+            Asset.company_id == company_id,
+            Asset.is_active == True,
+            Asset.warehouse_id.in_(self._active_warehouses(db, company_id))
         )
         
         # Apply filters
         if search:
-            query = query.filter(
-                or_(
-                    Asset.name.ilike(f"%{search}%"),
-                    Asset.inventory_number.ilike(f"%{search}%"),
-                    Asset.description.ilike(f"%{search}%")
-                )
-            )
+            query = query.filter(self._search_filter(search, search_mode))
         
         if category:
             query = query.filter(Asset.category == category)
@@ -282,44 +747,310 @@ class CRUDAsset(CRUDBase):
         if warehouse_id:
             query = query.filter(Asset.warehouse_id == warehouse_id)
         
+        if warehouse_ids:
+            query = query.filter(Asset.warehouse_id == any_(bindparam("warehouse_ids", warehouse_ids, type_=ARRAY(Integer))))
+        
+        return query
+    
+    def _search_document(self):
+        """Text search document matching the idx_assets_search expression in init.sql"""
+        return func.to_tsvector(
+            literal_column(f"'{self.SEARCH_CONFIG}'::regconfig"),
+            Asset.name + " " + func.coalesce(Asset.description, "") + " " + Asset.inventory_number
+        )
+    
+    def _search_query(self, search: str):
+        """Prefix tsquery for every word of the search term, None if it has no words"""
+        words = re.findall(r"\w+", search)
+        if not words:
+            return None
+        return func.to_tsquery(
+            literal_column(f"'{self.SEARCH_CONFIG}'::regconfig"),
+            " & ".join(f"{word}:*" for word in words)
+        )
+    
+    def _search_filter(self, search: str, search_mode: str = "fulltext"):
+        """Build search condition for the given mode"""
+        if search_mode == "contains":
+            return or_(
+                Asset.name.ilike(f"%{search}%"),
+                Asset.inventory_number.ilike(f"%{search}%"),
+                Asset.description.ilike(f"%{search}%")
+            )
+        if search_mode != "fulltext":
+            raise ValueError(f"Unsupported search mode: {search_mode}")
+        
+        # Inventory and serial fragments are matched through trigram indexes
+        conditions = [
+            Asset.inventory_number.ilike(f"%{search}%"),
+            Asset.serial_number.ilike(f"%{search}%")
+        ]
+        tsquery = self._search_query(search)
+        if tsquery is not None:
+            conditions.insert(0, self._search_document().op("@@")(tsquery))
+        return or_(*conditions)
+    
+    def _cursor_position(self, cursor: str, sort_by: str, sort_order: str) -> Tuple[Any, int]:
+        """Decode cursor into (sort value, asset id), raising ValueError unless it fits the sort column"""
+        position = decode_cursor(cursor)
+        if position.get("sort_by") != sort_by or position.get("sort_order") != sort_order:
+            raise ValueError("Cursor does not match requested sort order")
+        
+        # Checked here: a tampered value would otherwise fail in the database
+        value, asset_id = position.get("value"), position.get("id")
+        value_type = self.SORT_TYPES[sort_by]
+        try:
+            if type(asset_id) is not int:
+                raise TypeError("id must be an integer")
+            if value_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif value_type is float and type(value) in (int, float):
+                value = float(value)
+            elif type(value) is not value_type:
+                raise TypeError(f"{sort_by} value must be {value_type.__name__}")
+        except (TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
+        return value, asset_id
+    
+    def _sort_column(self, sort_by: Optional[str], sort_order: str):
+        """Resolve sort column, raising ValueError for unsupported values"""
+        sort_by = sort_by or "id"
+        if sort_by == "relevance":
+            raise ValueError("Relevance sorting is not supported here")
+        if sort_by not in self.SORT_COLUMNS:
+            raise ValueError(f"Unsupported sort field: {sort_by}")
+        if sort_order not in ("asc", "desc"):
+            raise ValueError(f"Unsupported sort order: {sort_order}")
+        return sort_by, self.SORT_COLUMNS[sort_by]
+    
+    def get_by_company(self, db: Session, company_id: int, skip: int = 0, limit: int = 100, 
+                      search: Optional[str] = None, category: Optional[AssetCategory] = None,
+                      status: Optional[AssetStatus] = None, warehouse_id: Optional[int] = None,
+                      sort_by: Optional[str] = None, sort_order: str = "asc",
+                      cursor: Optional[str] = None, search_mode: str = "fulltext",
+                      warehouse_ids: Optional[List[int]] = None) -> List[Asset]:
+        """Get assets by company with filters
+        
+        With a cursor (see make_cursor) the page starts right after the cursor
+        row instead of skipping rows, so deep pages cost the same as the first.
+        sort_by="relevance" orders full-text matches by rank (offset pages only).
+        """
+        query = self._filtered_query(
+            db, company_id, search=search, category=category, status=status,
+            warehouse_id=warehouse_id, search_mode=search_mode, warehouse_ids=warehouse_ids
+        ).options(
+            joinedload(Asset.warehouse).joinedload(Warehouse.branch)
+        )
+        
+        if sort_by == "relevance":
+            if cursor:
+                raise ValueError("Relevance sorting does not support cursors")
+            tsquery = self._search_query(search) if search and search_mode == "fulltext" else None
+            if tsquery is not None:
+                query = query.order_by(desc(func.ts_rank(self._search_document(), tsquery)), Asset.id.asc())
+            else:
+                query = query.order_by(Asset.id.asc())
+            return query.offset(skip).limit(limit).all()
+        
+        sort_by, column = self._sort_column(sort_by, sort_order)
+        
+        if cursor:
+            value, asset_id = self._cursor_position(cursor, sort_by, sort_order)
+            keyset = tuple_(column, Asset.id)
+            if sort_order == "asc":
+                query = query.filter(keyset > tuple_(value, asset_id))
+            else:
+                query = query.filter(keyset < tuple_(value, asset_id))
+            skip = 0
+        
+        if sort_order == "asc":
+            query = query.order_by(column.asc(), Asset.id.asc())
+        else:
+            query = query.order_by(column.desc(), Asset.id.desc())
+        
         return query.offset(skip).limit(limit).all()
     
-    def count_by_company(self, db: Session, company_id: int, **filters) -> int:
-        """Count assets by company with filters"""
-        query = db.query(Asset).join(Warehouse).join(Branch).filter(
+    def export_query(self, db: Session, company_id: int, batch_size: int = 1000, **filters):
+        """Query export rows of matching assets, streamed through a server-side cursor"""
+        # Only the exported columns are fetched, as tuples rather than ORM objects
+        return self._filtered_query(db, company_id, **filters).join(
+            Warehouse, Asset.warehouse_id == Warehouse.id
+        ).with_entities(
+            Asset.id,
+            Asset.inventory_number,
+            Asset.name,
+            Asset.category,
+            Asset.status,
+            Asset.quantity,
+            Asset.cost,
+            Warehouse.name.label("warehouse_name"),
+            Asset.serial_number,
+            Asset.supplier,
+            Asset.purchase_date,
+            Asset.notes
+        ).order_by(Asset.id).yield_per(batch_size)
+    
+    def make_cursor(self, asset: Asset, sort_by: Optional[str] = None, sort_order: str = "asc") -> str:
+        """Build opaque cursor pointing right after the given asset"""
+        sort_by, column = self._sort_column(sort_by, sort_order)
+        value = getattr(asset, sort_by)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        return encode_cursor({"sort_by": sort_by, "sort_order": sort_order, "value": value, "id": asset.id})
+    
+    def get_report_summary(self, db: Session, company_id: int, category: Optional[AssetCategory] = None,
+                           status: Optional[AssetStatus] = None,
+                           warehouse_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        """Asset count, quantity and value in total and per category and status, for report filters"""
+        # Grouped from inventory_rollups, restricted to active warehouses like
+        # _filtered_query, so totals match the detail rows at any volume
+        query = db.query(
+            InventoryRollup.category,
+            InventoryRollup.status,
+            func.sum(InventoryRollup.asset_count).label("count"),
+            func.sum(InventoryRollup.total_quantity).label("quantity"),
+            func.sum(InventoryRollup.total_value).label("value")
+        ).filter(
+            InventoryRollup.company_id == company_id,
+            InventoryRollup.warehouse_id.in_(self._active_warehouses(db, company_id))
+        )
+        
+        if category:
+            query = query.filter(InventoryRollup.category == category)
+        
+        if status:
+            query = query.filter(InventoryRollup.status == status)
+        
+        if warehouse_ids:
+            query = query.filter(
+                InventoryRollup.warehouse_id == any_(bindparam("warehouse_ids", warehouse_ids, type_=ARRAY(Integer)))
+            )
+        
+        rows = query.group_by(InventoryRollup.category, InventoryRollup.status).having(
+            func.sum(InventoryRollup.asset_count) > 0
+        ).all()
+        
+        summary = {"total_count": 0, "total_quantity": 0, "total_value": 0.0, "by_category": {}, "by_status": {}}
+        for row in rows:
+            summary["total_count"] += row.count
+            summary["total_quantity"] += row.quantity
+            summary["total_value"] += row.value
+            for key, group in ((row.category.value, "by_category"), (row.status.value, "by_status")):
+                totals = summary[group].setdefault(key, {"count": 0, "value": 0.0})
+                totals["count"] += row.count
+                totals["value"] += row.value
+        
+        return summary
+    
+    def get_depreciation_report(self, db: Session, company_id: int, params: DepreciationRequest) -> DepreciationReport:
+        """Depreciation and book value of assets on the balance, grouped by category and/or branch"""
+        as_of = params.as_of or date.today()
+        period_start = params.period_start or date(as_of.year, 1, 1)
+        
+        # Depreciation is linear in cost, so assets of one group bought on the
+        # same day are summed in SQL and the engine runs over those buckets
+        purchase_day = cast(Asset.purchase_date, Date)
+        group_columns = []
+        if "category" in params.group_by:
+            group_columns.append(Asset.category)
+        if "branch" in params.group_by:
+            group_columns.extend([Branch.id, Branch.name])
+        
+        query = db.query(
+            *group_columns,
+            purchase_day.label("purchase_day"),
+            func.count(Asset.id).label("count"),
+            func.sum(Asset.cost * Asset.quantity).label("cost")
+        ).join(
+            Warehouse, Warehouse.id == Asset.warehouse_id
+        ).join(Branch).filter(
+            Asset.company_id == company_id,
+            Asset.is_active == True,
+            Asset.status.in_(CRUDDashboard.BALANCE_STATUSES),
             Branch.company_id == company_id,
-            Asset.is_active == True
+            Warehouse.is_active == True,
+            Branch.is_active == True,
+            or_(Asset.purchase_date.is_(None), purchase_day <= as_of)
         )
         
-        # Apply same filters as get_by_company
-        if filters.get('search'):
-            search = filters['search']
+        if params.category:
+            query = query.filter(Asset.category == params.category)
+        
+        if params.warehouse_ids:
             query = query.filter(
-                or_(
-                    Asset.name.ilike(f"%{search}%"),
-                    Asset.inventory_number.ilike(f"%{search}%"),
-                    Asset.description.ilike(f"%{search}%")
-                )
+                Asset.warehouse_id == any_(bindparam("warehouse_ids", params.warehouse_ids, type_=ARRAY(Integer)))
             )
         
-        if filters.get('category'):
-            query = query.filter(Asset.category == filters['category'])
+        rows = query.group_by(*group_columns, purchase_day).order_by(*group_columns, purchase_day).all()
+        
+        # Map each bucket to its output group, in query order
+        groups = {}
+        group_index = np.fromiter(
+            (groups.setdefault(tuple(row[:len(group_columns)]), len(groups)) for row in rows),
+            dtype=np.intp, count=len(rows)
+        )
+        result = calculate_portfolio_depreciation(
+            np.fromiter((row.cost for row in rows), dtype=np.float64, count=len(rows)),
+            np.array([row.purchase_day for row in rows], dtype="datetime64[D]"),
+            as_of,
+            useful_life_years=params.useful_life_years,
+            method=params.method,
+            factor=params.factor,
+            period_start=period_start
+        )
+        
+        columns = {
+            "asset_count": np.fromiter((row.count for row in rows), dtype=np.float64, count=len(rows)),
+            "cost": result["book_value"] + result["accumulated_depreciation"],
+            "accumulated_depreciation": result["accumulated_depreciation"],
+            "period_depreciation": result["period_depreciation"],
+            "book_value": result["book_value"]
+        }
+        sums = {
+            name: np.bincount(group_index, weights=values, minlength=len(groups))
+            for name, values in columns.items()
+        }
         
-        if filters.get('status'):
-            query = query.filter(Asset.status == filters['status'])
+        def build_group(values: Dict[str, float], **keys) -> DepreciationGroup:
+            return DepreciationGroup(
+                asset_count=int(values["asset_count"]),
+                **{name: round(float(value), 2) for name, value in values.items() if name != "asset_count"},
+                **keys
+            )
         
-        if filters.get('warehouse_id'):
-            query = query.filter(Asset.warehouse_id == filters['warehouse_id'])
+        report_groups = []
+        for key, index in groups.items():
+            keys = {}
+            if "category" in params.group_by:
+                keys["category"], key = key[0], key[1:]
+            if "branch" in params.group_by:
+                keys["branch_id"], keys["branch_name"] = key
+            report_groups.append(build_group({name: values[index] for name, values in sums.items()}, **keys))
         
-        return query.count()
+        return DepreciationReport(
+            as_of=as_of,
+            period_start=period_start,
+            method=params.method,
+            useful_life_years=params.useful_life_years,
+            groups=report_groups,
+            totals=build_group({name: values.sum() for name, values in columns.items()})
+        )
+    
+    def count_by_company(self, db: Session, company_id: int, estimate: bool = False, **filters) -> int:
+        """Count assets by company with filters, optionally using the planner estimate"""
+        query = self._filtered_query(db, company_id, **filters)
+        if estimate:
+            return self.estimate_count(db, query)
+        return query.with_entities(func.count()).scalar()
     
     def update(self, db: Session, asset_id: int, asset_data: AssetUpdate, company_id: int) -> Optional[Asset]:
         """Update asset"""
-        asset = db.query(Asset).join(Warehouse).join(Branch).filter(
+        # Locked so concurrent writers take their rollup "before" snapshot in turn
+        asset = db.query(Asset).filter(
             Asset.id == asset_id,
-            Branch.company_id == company_id,
+            Asset.company_id == company_id,
             Asset.is_active == True
-        ).first()
+        ).with_for_update().first()
         
         if not asset:
             return None
@@ -336,13 +1067,76 @@ class CRUDAsset(CRUDBase):
             if not warehouse:
                 raise ValueError("Warehouse not found or doesn't belong to company")
         
+        before = rollup_crud.snapshot(asset)
         for field, value in update_data.items():
             setattr(asset, field, value)
         
         asset.updated_at = datetime.utcnow()
+        rollup_crud.track(db, company_id, before, rollup_crud.snapshot(asset))
         db.commit()
         db.refresh(asset)
+        bump_company_version(company_id)
         return asset
+    
+    def update_bulk(self, db: Session, asset_ids: List[int], asset_data: AssetUpdate, company_id: int,
+                    all_or_nothing: bool = False) -> Tuple[List[int], List[int]]:
+        """Apply the same changes to many assets with one UPDATE, returning (updated_ids, skipped_ids)"""
+        update_data = asset_data.dict(exclude_unset=True)
+        if not update_data:
+            raise ValueError("No fields to update")
+        
+        if 'warehouse_id' in update_data:
+            warehouse = db.query(Warehouse.id).join(Branch).filter(
+                Warehouse.id == update_data['warehouse_id'],
+                Branch.company_id == company_id,
+                Warehouse.is_active == True
+            ).first()
+            if not warehouse:
+                raise ValueError("Warehouse not found or doesn't belong to company")
+        
+        # Joining the table to itself exposes pre-update values in RETURNING,
+        # so rollup deltas need no separate read of the rows. The old rows are
+        # read FOR UPDATE: a plain self-join would keep the version seen before
+        # waiting on a concurrent writer and apply a delta from stale values
+        assets = Asset.__table__
+        requested_ids = list(dict.fromkeys(asset_ids))
+        old = select(
+            assets.c.id, *(assets.c[field] for field in rollup_crud.SNAPSHOT_FIELDS)
+        ).where(
+            assets.c.id == any_(bindparam("asset_ids", requested_ids, type_=ARRAY(Integer))),
+            assets.c.company_id == company_id,
+            assets.c.is_active == True
+        ).order_by(assets.c.id).with_for_update().subquery("old")
+        stmt = update(assets).where(
+            assets.c.id == old.c.id
+        ).values(
+            **update_data, updated_at=func.now()
+        ).returning(assets.c.id, *(old.c[field] for field in rollup_crud.SNAPSHOT_FIELDS))
+        rows = db.execute(stmt).all()
+        
+        updated_ids = {row[0] for row in rows}
+        skipped_ids = [asset_id for asset_id in requested_ids if asset_id not in updated_ids]
+        if skipped_ids and all_or_nothing:
+            db.rollback()
+            raise ValueError(
+                f"{len(skipped_ids)} assets not found or don't belong to company: "
+                f"{', '.join(str(asset_id) for asset_id in skipped_ids[:20])}"
+            )
+        
+        if any(field in update_data for field in rollup_crud.SNAPSHOT_FIELDS + ("is_active",)):
+            deltas = {}
+            for row in rows:
+                before = tuple(row[1:])
+                after = None if update_data.get("is_active") is False else tuple(
+                    update_data.get(field, value) for field, value in zip(rollup_crud.SNAPSHOT_FIELDS, before)
+                )
+                rollup_crud.record(deltas, before, after)
+            rollup_crud.apply(db, company_id, deltas)
+        
+        db.commit()
+        if rows:
+            bump_company_version(company_id)
+        return [row[0] for row in rows], skipped_ids
 
 # Asset Operation CRUD
 class CRUDAssetOperation(CRUDBase):
@@ -351,12 +1145,13 @@ class CRUDAssetOperation(CRUDBase):
     
     def create(self, db: Session, operation_data: AssetOperationCreate, user_id: int, company_id: int) -> AssetOperation:
         """Create asset operation"""
-        # Verify asset belongs to company
-        asset = db.query(Asset).join(Warehouse).join(Branch).filter(
+        # Verify asset belongs to company; locked so the rollup snapshot below
+        # cannot be taken from a state another writer is changing
+        asset = db.query(Asset).filter(
             Asset.id == operation_data.asset_id,
-            Branch.company_id == company_id,
+            Asset.company_id == company_id,
             Asset.is_active == True
-        ).first()
+        ).with_for_update().first()
         
         if not asset:
             raise ValueError("Asset not found or doesn't belong to company")
@@ -383,6 +1178,7 @@ class CRUDAssetOperation(CRUDBase):
         operation = AssetOperation(
             type=operation_data.type,
             asset_id=operation_data.asset_id,
+            company_id=company_id,
             quantity=operation_data.quantity,
             from_warehouse_id=operation_data.from_warehouse_id,
             to_warehouse_id=operation_data.to_warehouse_id,
@@ -397,31 +1193,128 @@ class CRUDAssetOperation(CRUDBase):
         db.add(operation)
         
         # Update asset based on operation type
-        if operation_data.type == OperationType.TRANSFER and operation_data.to_warehouse_id:
-            asset.warehouse_id = operation_data.to_warehouse_id
-        elif operation_data.type == OperationType.DISPOSAL:
-            asset.status = AssetStatus.DISPOSED
-        elif operation_data.type == OperationType.ADJUSTMENT:
-            if operation_data.cost_after:
-                asset.cost = operation_data.cost_after
+        before = rollup_crud.snapshot(asset)
+        for field, value in self._asset_changes(operation_data).items():
+            setattr(asset, field, value)
         
+        rollup_crud.track(db, company_id, before, rollup_crud.snapshot(asset))
         db.commit()
         db.refresh(operation)
+        bump_company_version(company_id)
         return operation
     
-    def get_by_company(self, db: Session, company_id: int, skip: int = 0, limit: int = 100,
-                      operation_type: Optional[OperationType] = None,
-                      start_date: Optional[datetime] = None,
-                      end_date: Optional[datetime] = None) -> List[AssetOperation]:
-        """Get operations by company with filters"""
-        query = db.query(AssetOperation).join(Asset).join(Warehouse).join(Branch).filter(
-            Branch.company_id == company_id,
+    def _asset_changes(self, operation_data: AssetOperationDetails) -> Dict[str, Any]:
+        """Asset column values an operation sets as its side effect"""
+        if operation_data.type == OperationType.TRANSFER and operation_data.to_warehouse_id:
+            return {"warehouse_id": operation_data.to_warehouse_id}
+        if operation_data.type == OperationType.DISPOSAL:
+            return {"status": AssetStatus.DISPOSED}
+        if operation_data.type == OperationType.ADJUSTMENT and operation_data.cost_after:
+            return {"cost": operation_data.cost_after}
+        return {}
+    
+    def create_bulk(self, db: Session, asset_ids: List[int], operation_data: AssetOperationDetails,
+                    user_id: int, company_id: int) -> List[BulkOperationResult]:
+        """Apply one operation to many assets in a single transaction with a fixed number of queries"""
+        warehouse_ids = {
+            warehouse_id for warehouse_id in (operation_data.from_warehouse_id, operation_data.to_warehouse_id)
+            if warehouse_id
+        }
+        if warehouse_ids:
+            found_ids = {
+                warehouse_id for (warehouse_id,) in db.query(Warehouse.id).join(Branch).filter(
+                    Warehouse.id.in_(warehouse_ids),
+                    Branch.company_id == company_id,
+                    Warehouse.is_active == True
+                )
+            }
+            if operation_data.from_warehouse_id and operation_data.from_warehouse_id not in found_ids:
+                raise ValueError("From warehouse not found or doesn't belong to company")
+            if operation_data.to_warehouse_id and operation_data.to_warehouse_id not in found_ids:
+                raise ValueError("To warehouse not found or doesn't belong to company")
+        
+        snapshots = {
+            row[0]: tuple(row[1:]) for row in db.query(
+                Asset.id, *(getattr(Asset, field) for field in rollup_crud.SNAPSHOT_FIELDS)
+            ).filter(
+                Asset.id.in_(set(asset_ids)),
+                Asset.company_id == company_id,
+                Asset.is_active == True
+            ).order_by(Asset.id).with_for_update()
+        }
+        
+        # Per position error, None for assets that get an operation
+        errors = []
+        accepted = []
+        accepted_ids = set()
+        for asset_id in asset_ids:
+            if asset_id not in snapshots:
+                errors.append("Asset not found or doesn't belong to company")
+            elif asset_id in accepted_ids:
+                errors.append("Duplicate asset in request")
+            else:
+                accepted.append(asset_id)
+                accepted_ids.add(asset_id)
+                errors.append(None)
+        
+        operation_ids = {}
+        if accepted:
+            operation_fields = operation_data.dict()
+            stmt = insert(AssetOperation.__table__).returning(AssetOperation.id, AssetOperation.asset_id)
+            operation_ids = {
+                asset_id: operation_id for operation_id, asset_id in db.execute(stmt, [
+                    {**operation_fields, "asset_id": asset_id, "company_id": company_id,
+                     "user_id": user_id, "is_active": True}
+                    for asset_id in accepted
+                ])
+            }
+            
+            changes = self._asset_changes(operation_data)
+            if changes:
+                db.query(Asset).filter(Asset.id.in_(accepted)).update(
+                    {**changes, "updated_at": func.now()}, synchronize_session=False
+                )
+                
+                deltas = {}
+                for asset_id in accepted:
+                    before = snapshots[asset_id]
+                    after = tuple(
+                        changes.get(field, value) for field, value in zip(rollup_crud.SNAPSHOT_FIELDS, before)
+                    )
+                    rollup_crud.record(deltas, before, after)
+                rollup_crud.apply(db, company_id, deltas)
+            
+            db.commit()
+            bump_company_version(company_id)
+        
+        return [
+            BulkOperationResult(asset_id=asset_id, success=True, operation_id=operation_ids[asset_id])
+            if error is None else
+            BulkOperationResult(asset_id=asset_id, success=False, error=error)
+            for asset_id, error in zip(asset_ids, errors)
+        ]
+    
+    def response_options(self):
+        """Eager-load exactly the relationships AssetOperationResponse serializes"""
+        # All are many-to-one, so joined loads never multiply rows
+        return (
+            joinedload(AssetOperation.asset, innerjoin=True)
+                .joinedload(Asset.warehouse, innerjoin=True)
+                .joinedload(Warehouse.branch, innerjoin=True),
+            joinedload(AssetOperation.user, innerjoin=True),
+            joinedload(AssetOperation.from_warehouse).joinedload(Warehouse.branch, innerjoin=True),
+            joinedload(AssetOperation.to_warehouse).joinedload(Warehouse.branch, innerjoin=True)
+        )
+    
+    def _filtered_query(self, db: Session, company_id: int,
+                        operation_type: Optional[OperationType] = None,
+                        start_date: Optional[datetime] = None,
+                        end_date: Optional[datetime] = None,
+                        warehouse_ids: Optional[List[int]] = None):
+        """Build company-scoped operation query with filters shared by listing, reports and export"""
+        query = db.query(AssetOperation).filter(
+            AssetOperation.company_id == company_id,
             AssetOperation.is_active == True
-        ).options(
-            joinedload(AssetOperation.asset),
-            joinedload(AssetOperation.user),
-            joinedload(AssetOperation.from_warehouse),
-            joinedload(AssetOperation.to_warehouse)
         )
         
         if operation_type:
@@ -433,96 +1326,595 @@ class CRUDAssetOperation(CRUDBase):
         if end_date:
             query = query.filter(AssetOperation.operation_date <= end_date)
         
-        return query.order_by(desc(AssetOperation.operation_date)).offset(skip).limit(limit).all()
+        if warehouse_ids:
+            # Operations moving stock out of or into any of the warehouses
+            ids = bindparam("warehouse_ids", warehouse_ids, type_=ARRAY(Integer))
+            query = query.filter(or_(
+                AssetOperation.from_warehouse_id == any_(ids),
+                AssetOperation.to_warehouse_id == any_(ids)
+            ))
+        
+        return query
+    
+    def get_report_summary(self, db: Session, company_id: int, **filters) -> Dict[str, Any]:
+        """Operation count in total and per type, for report filters"""
+        rows = self._filtered_query(db, company_id, **filters).with_entities(
+            AssetOperation.type, func.count(AssetOperation.id)
+        ).group_by(AssetOperation.type).all()
+        
+        by_type = {op_type.value: 0 for op_type in OperationType}
+        for op_type, count in rows:
+            by_type[op_type.value] = count
+        return {"total_count": sum(by_type.values()), "by_type": by_type}
+    
+    def export_query(self, db: Session, company_id: int, batch_size: int = 1000, **filters):
+        """Query export rows of matching operations, newest first, streamed through a server-side cursor"""
+        # Plain labelled columns instead of ORM objects: hydrating the joined
+        # graph costs several times more than fetching and encoding the rows
+        from_warehouse = aliased(Warehouse)
+        to_warehouse = aliased(Warehouse)
+        return self._filtered_query(db, company_id, **filters).join(
+            Asset, AssetOperation.asset_id == Asset.id
+        ).join(
+            User, AssetOperation.user_id == User.id
+        ).outerjoin(
+            from_warehouse, AssetOperation.from_warehouse_id == from_warehouse.id
+        ).outerjoin(
+            to_warehouse, AssetOperation.to_warehouse_id == to_warehouse.id
+        ).with_entities(
+            AssetOperation.id,
+            AssetOperation.operation_date,
+            AssetOperation.type,
+            AssetOperation.asset_id,
+            Asset.name.label("asset_name"),
+            AssetOperation.quantity,
+            from_warehouse.name.label("from_warehouse_name"),
+            to_warehouse.name.label("to_warehouse_name"),
+            User.username,
+            AssetOperation.reason,
+            AssetOperation.document_number,
+            AssetOperation.notes
+        ).order_by(
+            AssetOperation.operation_date.desc(), AssetOperation.id.desc()
+        ).yield_per(batch_size)
+    
+    def get_by_company(self, db: Session, company_id: int, skip: int = 0, limit: int = 100,
+                      operation_type: Optional[OperationType] = None,
+                      start_date: Optional[datetime] = None,
+                      end_date: Optional[datetime] = None,
+                      cursor: Optional[str] = None,
+                      warehouse_ids: Optional[List[int]] = None) -> List[AssetOperation]:
+        """Get operations by company with filters, newest first
+        
+        With a cursor (see make_cursor) the page starts right after the cursor
+        row on (operation_date, id) instead of skipping rows.
+        """
+        query = self._filtered_query(
+            db, company_id, operation_type, start_date, end_date, warehouse_ids
+        ).options(*self.response_options())
+        
+        if cursor:
+            position = decode_cursor(cursor)
+            try:
+                operation_date = datetime.fromisoformat(position["value"])
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError("Invalid cursor") from e
+            # The plain bound lets the planner prune partitions newer than the cursor
+            query = query.filter(
+                AssetOperation.operation_date <= operation_date,
+                tuple_(AssetOperation.operation_date, AssetOperation.id) < tuple_(operation_date, position["id"])
+            )
+            skip = 0
+        
+        return query.order_by(
+            AssetOperation.operation_date.desc(), AssetOperation.id.desc()
+        ).offset(skip).limit(limit).all()
+    
+    def make_cursor(self, operation: AssetOperation) -> str:
+        """Build opaque cursor pointing right after the given operation"""
+        return encode_cursor({"value": operation.operation_date.isoformat(), "id": operation.id})
+
+# Operation partition maintenance
+class CRUDOperationPartitions:
+    """Creates, lists and archives the monthly range partitions of asset_operations"""
+    
+    PARENT = "asset_operations"
+    ARCHIVE_SCHEMA = "archive"
+    NAME_PATTERN = re.compile(r"^asset_operations_(\d{4})_(\d{2})$")
+    
+    def _add_months(self, month: date, months: int) -> date:
+        index = month.year * 12 + month.month - 1 + months
+        return date(index // 12, index % 12 + 1, 1)
+    
+    def partition_name(self, month: date) -> str:
+        return f"{self.PARENT}_{month:%Y_%m}"
+    
+    def list(self, db: Session) -> List[Tuple[str, date]]:
+        """Attached monthly partitions as (name, first day of month), oldest first"""
+        rows = db.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass)"
+        ), {"parent": self.PARENT}).scalars()
+        
+        partitions = []
+        for name in rows:
+            match = self.NAME_PATTERN.match(name)
+            if match:
+                partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+        return sorted(partitions, key=lambda partition: partition[1])
+    
+    def ensure(self, db: Session, months_ahead: int = 3, start: Optional[date] = None) -> List[str]:
+        """Create missing partitions from start (default: current month) through months_ahead months ahead"""
+        current = date.today().replace(day=1)
+        month = (start or current).replace(day=1)
+        last = self._add_months(current, months_ahead)
+        existing = {name for name, _ in self.list(db)}
+        
+        created = []
+        while month <= last:
+            name = self.partition_name(month)
+            if name not in existing:
+                db.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {self.PARENT} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{self._add_months(month, 1).isoformat()}')"
+                ))
+                created.append(name)
+            month = self._add_months(month, 1)
+        
+        db.commit()
+        if created:
+            logger.info(f"Created operation partitions: {', '.join(created)}")
+        return created
+    
+    def archive(self, db: Session, before: date, drop: bool = False) -> List[str]:
+        """Detach partitions for months before the given date and move them to the archive schema (or drop them)"""
+        cutoff = before.replace(day=1)
+        names = [name for name, month in self.list(db) if month < cutoff]
+        db.commit()
+        
+        # DETACH ... CONCURRENTLY only takes a SHARE UPDATE EXCLUSIVE lock on the
+        # parent, so reads and writes continue, but it cannot run in a transaction
+        with db.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            if names and not drop:
+                connection.execute(text(f"CREATE SCHEMA IF NOT EXISTS {self.ARCHIVE_SCHEMA}"))
+            for name in names:
+                connection.execute(text(f"ALTER TABLE {self.PARENT} DETACH PARTITION {name} CONCURRENTLY"))
+                if drop:
+                    connection.execute(text(f"DROP TABLE {name}"))
+                else:
+                    connection.execute(text(f"ALTER TABLE {name} SET SCHEMA {self.ARCHIVE_SCHEMA}"))
+                logger.info(f"{'Dropped' if drop else 'Archived'} operation partition {name}")
+        
+        return names
+
+# Export job CRUD
+class CRUDExportJob(CRUDBase):
+    ACTIVE_STATUSES = ("pending", "running")
+    
+    def __init__(self):
+        super().__init__(ExportJob)
+    
+    def create(self, db: Session, job_data: ExportJobCreate, user_id: int, company_id: int,
+               max_active: Optional[int] = None) -> Optional[ExportJob]:
+        """Create pending export job; None if the company already has max_active unfinished jobs"""
+        if max_active is not None:
+            # Per-company transaction lock: concurrent requests count and insert
+            # one at a time, so together they cannot exceed the limit
+            db.execute(select(func.pg_advisory_xact_lock(func.hashtext("export_jobs"), company_id)))
+            if self.count_active(db, company_id) >= max_active:
+                db.rollback()
+                return None
+        
+        filters = job_data.dict(exclude={"kind", "format"}, exclude_none=True)
+        job = ExportJob(
+            company_id=company_id,
+            user_id=user_id,
+            kind=job_data.kind,
+            format=job_data.format,
+            filters=json.dumps(filters, default=str)
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+    
+    def get(self, db: Session, job_id: int, company_id: int) -> Optional[ExportJob]:
+        """Get export job within company"""
+        return db.query(ExportJob).filter(
+            ExportJob.id == job_id,
+            ExportJob.company_id == company_id
+        ).first()
+    
+    def count_active(self, db: Session, company_id: int) -> int:
+        """Count company jobs that are queued or rendering"""
+        return db.query(func.count(ExportJob.id)).filter(
+            ExportJob.company_id == company_id,
+            ExportJob.status.in_(self.ACTIVE_STATUSES)
+        ).scalar()
+    
+    def get_pending_ids(self, db: Session) -> List[int]:
+        """Ids of all queued jobs, oldest first"""
+        rows = db.query(ExportJob.id).filter(ExportJob.status == "pending").order_by(ExportJob.id).all()
+        return [row.id for row in rows]
+    
+    def start(self, db: Session, job_id: int) -> Optional[ExportJob]:
+        """Claim pending job for rendering; None if it was already claimed or removed"""
+        job = db.query(ExportJob).filter(
+            ExportJob.id == job_id,
+            ExportJob.status == "pending"
+        ).with_for_update(skip_locked=True).first()
+        if not job:
+            return None
+        
+        job.status = "running"
+        job.started_at = func.now()
+        job.heartbeat_at = func.now()
+        db.commit()
+        db.refresh(job)
+        return job
+    
+    def set_progress(self, db: Session, job_id: int, rows_done: int, rows_total: Optional[int] = None) -> None:
+        """Record rendering progress, which also refreshes the job's heartbeat"""
+        values = {"rows_done": rows_done, "heartbeat_at": func.now()}
+        if rows_total is not None:
+            values["rows_total"] = rows_total
+        
+        # Separate transaction: the caller's transaction holds the open export cursor
+        with db.get_bind().begin() as connection:
+            connection.execute(update(ExportJob).where(ExportJob.id == job_id).values(**values))
+    
+    def complete(self, db: Session, job_id: int, rows_done: int, file_name: str, file_path: str,
+                 file_size: int, ttl: timedelta) -> bool:
+        """Mark running job completed with its file, available until ttl from now
+        
+        False if the job is no longer running (e.g. failed as stale meanwhile);
+        the caller then owns and removes the file.
+        """
+        updated = db.query(ExportJob).filter(
+            ExportJob.id == job_id,
+            ExportJob.status == "running"
+        ).update({
+            "status": "completed",
+            "rows_done": rows_done,
+            "file_name": file_name,
+            "file_path": file_path,
+            "file_size": file_size,
+            "finished_at": func.now(),
+            "expires_at": func.now() + ttl
+        }, synchronize_session=False)
+        db.commit()
+        return updated > 0
+    
+    def fail(self, db: Session, job_id: int, error: str, ttl: timedelta) -> None:
+        """Mark unfinished job failed; the row is kept until ttl from now so the error can be read"""
+        db.query(ExportJob).filter(
+            ExportJob.id == job_id,
+            ExportJob.status.in_(self.ACTIVE_STATUSES)
+        ).update({
+            "status": "failed",
+            "error": error,
+            "finished_at": func.now(),
+            "expires_at": func.now() + ttl
+        }, synchronize_session=False)
+        db.commit()
+    
+    def expire_due(self, db: Session, ttl: timedelta, stale_after: timedelta) -> List[str]:
+        """Expire finished jobs past expires_at and fail abandoned ones; return file paths to delete
+        
+        A running job is abandoned once its heartbeat is older than stale_after,
+        however long the export itself takes; a pending one once it has waited
+        longer than ttl for a worker.
+        """
+        now = datetime.now(ZoneInfo("UTC"))
+        jobs = db.query(ExportJob).filter(or_(
+            and_(ExportJob.status.in_(("completed", "failed")), ExportJob.expires_at < now),
+            and_(
+                ExportJob.status == "running",
+                func.coalesce(ExportJob.heartbeat_at, ExportJob.started_at) < now - stale_after
+            ),
+            and_(ExportJob.status == "pending", ExportJob.created_at < now - ttl)
+        )).with_for_update(skip_locked=True).all()
+        
+        paths = []
+        for job in jobs:
+            if job.status in self.ACTIVE_STATUSES:
+                # Failed like any other error, so it stays readable until ttl
+                job.error = ("Export worker stopped responding" if job.status == "running"
+                             else "Export was not started in time")
+                job.status = "failed"
+                job.finished_at = now
+                job.expires_at = now + ttl
+                continue
+            
+            if job.file_path:
+                paths.append(job.file_path)
+            job.status = "expired"
+            job.file_path = None
+        
+        db.commit()
+        return paths
+    
+    def purge_expired(self, db: Session, older_than: timedelta) -> int:
+        """Delete rows of jobs that expired more than older_than ago; returns rows deleted"""
+        cutoff = datetime.now(ZoneInfo("UTC")) - older_than
+        deleted = db.query(ExportJob).filter(
+            ExportJob.status == "expired",
+            func.coalesce(ExportJob.expires_at, ExportJob.created_at) < cutoff
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
 
 # Dashboard CRUD
 class CRUDDashboard:
+    # Statuses counted as being on the company's balance
+    BALANCE_STATUSES = [AssetStatus.ACTIVE, AssetStatus.INACTIVE, AssetStatus.REPAIR]
+    
+    def _company_timezone(self, db: Session, company_id: int) -> Tuple[str, ZoneInfo]:
+        """Get the company timezone name and zone, falling back to UTC"""
+        timezone = db.query(Company.timezone).filter(Company.id == company_id).scalar() or "UTC"
+        try:
+            return timezone, ZoneInfo(timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.warning(f"Unknown timezone {timezone} for company {company_id}, using UTC")
+            return "UTC", ZoneInfo("UTC")
+    
+    def get_aggregates(self, db: Session, company_id: int) -> Dict[str, Any]:
+        """Get rolled-up asset count and value per category and status plus dashboard totals in one query"""
+        # Today runs from midnight to midnight in company local time
+        _, tz = self._company_timezone(db, company_id)
+        today = datetime.now(tz).date()
+        day_start = datetime.combine(today, datetime.min.time(), tzinfo=tz)
+        day_end = datetime.combine(today + timedelta(days=1), datetime.min.time(), tzinfo=tz)
+        
+        # A range on operation_date, unlike date(operation_date), prunes to the current partition
+        operations_today = db.query(func.count(AssetOperation.id)).filter(
+            AssetOperation.company_id == company_id,
+            AssetOperation.operation_date >= day_start,
+            AssetOperation.operation_date < day_end,
+            AssetOperation.is_active == True
+        ).scalar_subquery()
+        
+        active_warehouses = db.query(func.count(Warehouse.id)).join(Branch).filter(
+            Branch.company_id == company_id,
+            Warehouse.is_active == True,
+            Branch.is_active == True
+        ).scalar_subquery()
+        
+        # The empty grouping set always yields one row, so the scalar
+        # totals come back even for a company without assets
+        rows = db.query(
+            InventoryRollup.category,
+            InventoryRollup.status,
+            func.coalesce(func.sum(InventoryRollup.asset_count), 0).label("count"),
+            func.coalesce(func.sum(InventoryRollup.total_value), 0).label("value"),
+            operations_today.label("operations_today"),
+            active_warehouses.label("active_warehouses")
+        ).filter(
+            InventoryRollup.company_id == company_id
+        ).group_by(
+            func.grouping_sets(tuple_(InventoryRollup.category, InventoryRollup.status), tuple_())
+        ).all()
+        
+        aggregates = {"groups": {}, "operations_today": 0, "active_warehouses": 0}
+        for row in rows:
+            if row.category is None:
+                aggregates["operations_today"] = row.operations_today or 0
+                aggregates["active_warehouses"] = row.active_warehouses or 0
+            else:
+                aggregates["groups"][(row.category, row.status)] = (row.count, float(row.value))
+        
+        return aggregates
+    
+    def get_overview(self, db: Session, company_id: int) -> Tuple[DashboardStats, List[AssetCategoryStats], List[AssetStatusStats]]:
+        """Get dashboard statistics, category and status breakdowns in a single round trip"""
+        aggregates = self.get_aggregates(db, company_id)
+        return (
+            self._build_stats(aggregates),
+            self._build_category_stats(aggregates),
+            self._build_status_stats(aggregates)
+        )
+    
     def get_stats(self, db: Session, company_id: int) -> DashboardStats:
         """Get dashboard statistics"""
-        # Total assets
-        total_assets = db.query(Asset).join(Warehouse).join(Branch).filter(
-            Branch.company_id == company_id,
-            Asset.is_active == True,
-            Asset.status.in_([AssetStatus.ACTIVE, AssetStatus.INACTIVE, AssetStatus.REPAIR])
-        ).count()
+        return self._build_stats(self.get_aggregates(db, company_id))
+    
+    def get_category_stats(self, db: Session, company_id: int) -> List[AssetCategoryStats]:
+        """Get asset statistics by category"""
+        return self._build_category_stats(self.get_aggregates(db, company_id))
+    
+    def get_status_stats(self, db: Session, company_id: int) -> List[AssetStatusStats]:
+        """Get asset statistics by status"""
+        return self._build_status_stats(self.get_aggregates(db, company_id))
+    
+    def get_monthly_operations(self, db: Session, company_id: int, months: int = 6) -> List[MonthlyOperationStats]:
+        """Get operation counts per month and type bucketed in the company timezone"""
+        timezone, tz = self._company_timezone(db, company_id)
         
-        # Total value
-        total_value = db.query(func.sum(Asset.cost * Asset.quantity)).join(Warehouse).join(Branch).filter(
-            Branch.company_id == company_id,
-            Asset.is_active == True,
-            Asset.status.in_([AssetStatus.ACTIVE, AssetStatus.INACTIVE, AssetStatus.REPAIR])
-        ).scalar() or 0
+        # Month starts of the window, oldest first, in company local time
+        now = datetime.now(tz)
+        periods = []
+        year, month = now.year, now.month
+        for _ in range(months):
+            periods.append((year, month))
+            year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+        periods.reverse()
+        window_start = datetime(periods[0][0], periods[0][1], 1, tzinfo=tz)
         
-        # Operations today
-        today = datetime.now().date()
-        operations_today = db.query(AssetOperation).join(Asset).join(Warehouse).join(Branch).filter(
-            Branch.company_id == company_id,
-            func.date(AssetOperation.operation_date) == today,
+        # Bounding operation_date from below keeps the scan proportional to the
+        # window; listing every type lets the planner use idx_operations_company_type_date
+        bucket = func.date_trunc("month", func.timezone(timezone, AssetOperation.operation_date))
+        rows = db.query(
+            bucket.label("bucket"),
+            AssetOperation.type,
+            func.count(AssetOperation.id).label("count")
+        ).filter(
+            AssetOperation.company_id == company_id,
+            AssetOperation.type.in_(list(OperationType)),
+            AssetOperation.operation_date >= window_start,
             AssetOperation.is_active == True
-        ).count()
+        ).group_by(bucket, AssetOperation.type).all()
+        
+        counts = {}
+        for row in rows:
+            counts[(row.bucket.year, row.bucket.month, row.type)] = row.count
         
-        # Active warehouses
-        active_warehouses = db.query(Warehouse).join(Branch).filter(
+        return [
+            MonthlyOperationStats(
+                month=MONTH_ABBREVIATIONS[month - 1],
+                period=f"{year:04d}-{month:02d}",
+                receipt=counts.get((year, month, OperationType.RECEIPT), 0),
+                transfer=counts.get((year, month, OperationType.TRANSFER), 0),
+                disposal=counts.get((year, month, OperationType.DISPOSAL), 0),
+                adjustment=counts.get((year, month, OperationType.ADJUSTMENT), 0)
+            )
+            for year, month in periods
+        ]
+    
+    def get_pivot(self, db: Session, company_id: int, pivot: PivotRequest) -> PivotResponse:
+        """Get pivot measures by branch, warehouse, category and status with subtotals in one query"""
+        # inventory_rollups already holds per warehouse/category/status sums,
+        # so the ROLLUP/CUBE reads a few rows per warehouse, not the assets
+        group_columns = {
+            "branch": Warehouse.branch_id,
+            "warehouse": InventoryRollup.warehouse_id,
+            "category": InventoryRollup.category,
+            "status": InventoryRollup.status
+        }
+        name_columns = {"branch": Branch.name, "warehouse": Warehouse.name}
+        measure_columns = {
+            "count": func.sum(InventoryRollup.asset_count),
+            "quantity": func.sum(InventoryRollup.total_quantity),
+            "value": func.sum(InventoryRollup.total_value)
+        }
+        
+        dimensions = [group_columns[dimension] for dimension in pivot.dimensions]
+        # Names are functionally dependent on the ids, so min() is the name on
+        # rows grouped by that dimension; on subtotal rows it is ignored
+        names = [
+            func.min(name_columns[dimension]).label(f"{dimension}_name")
+            for dimension in pivot.dimensions if dimension in name_columns
+        ]
+        
+        query = db.query(
+            *[column.label(dimension) for dimension, column in zip(pivot.dimensions, dimensions)],
+            *[measure_columns[measure].label(measure) for measure in pivot.measures],
+            *names,
+            func.grouping(*dimensions).label("grouping")
+        ).join(
+            Warehouse, Warehouse.id == InventoryRollup.warehouse_id
+        ).join(Branch).filter(
+            InventoryRollup.company_id == company_id,
             Branch.company_id == company_id,
             Warehouse.is_active == True,
             Branch.is_active == True
-        ).count()
+        )
+        
+        if pivot.category:
+            query = query.filter(InventoryRollup.category == pivot.category)
+        
+        if pivot.status:
+            query = query.filter(InventoryRollup.status == pivot.status)
+        
+        if pivot.warehouse_ids:
+            query = query.filter(
+                InventoryRollup.warehouse_id == any_(bindparam("warehouse_ids", pivot.warehouse_ids, type_=ARRAY(Integer)))
+            )
+        
+        if pivot.totals == "rollup":
+            query = query.group_by(func.rollup(*dimensions))
+        elif pivot.totals == "cube":
+            query = query.group_by(func.cube(*dimensions))
+        else:
+            query = query.group_by(*dimensions)
+        
+        # Subtotals sort after the groups they total; rollup rows left empty
+        # by deleted assets are dropped
+        rows = query.having(
+            func.sum(InventoryRollup.asset_count) > 0
+        ).order_by(*[column.asc().nullslast() for column in dimensions]).all()
+        
+        columns = {name: [] for name in (*pivot.dimensions, *pivot.measures)}
+        labels = {dimension: {} for dimension in pivot.dimensions if dimension in name_columns}
+        grouping = []
+        for row in rows:
+            row = row._mapping
+            for dimension in pivot.dimensions:
+                value = row[dimension]
+                if dimension in ("category", "status") and value is not None:
+                    value = value.value
+                elif dimension in labels and value is not None:
+                    labels[dimension][value] = row[f"{dimension}_name"]
+                columns[dimension].append(value)
+            for measure in pivot.measures:
+                value = row[measure]
+                columns[measure].append(float(value) if measure == "value" else int(value))
+            grouping.append(row["grouping"])
+        
+        return PivotResponse(
+            dimensions=pivot.dimensions,
+            measures=pivot.measures,
+            totals=pivot.totals,
+            row_count=len(rows),
+            columns=columns,
+            grouping=grouping,
+            labels=labels
+        )
+    
+    def _build_stats(self, aggregates: Dict[str, Any]) -> DashboardStats:
+        """Build dashboard totals from aggregated groups"""
+        total_assets = 0
+        total_value = 0.0
+        for (category, asset_status), (count, value) in aggregates["groups"].items():
+            if asset_status in self.BALANCE_STATUSES:
+                total_assets += count
+                total_value += value
         
         return DashboardStats(
             total_assets=total_assets,
-            total_value=float(total_value),
-            operations_today=operations_today,
-            active_warehouses=active_warehouses,
+            total_value=total_value,
+            operations_today=aggregates["operations_today"],
+            active_warehouses=aggregates["active_warehouses"],
             monthly_growth=0.0  # TODO: Calculate actual growth
         )
     
-    def get_category_stats(self, db: Session, company_id: int) -> List[AssetCategoryStats]:
-        """Get asset statistics by category"""
-        stats = []
-        total_assets = 0
-        total_value = 0
+    def _build_category_stats(self, aggregates: Dict[str, Any]) -> List[AssetCategoryStats]:
+        """Build per-category statistics from aggregated groups"""
+        totals = {category: [0, 0.0] for category in AssetCategory}
+        for (category, asset_status), (count, value) in aggregates["groups"].items():
+            if asset_status in self.BALANCE_STATUSES:
+                totals[category][0] += count
+                totals[category][1] += value
         
-        # First pass to get totals
-        for category in AssetCategory:
-            count = db.query(Asset).join(Warehouse).join(Branch).filter(
-                Branch.company_id == company_id,
-                Asset.category == category,
-                Asset.is_active == True,
-                Asset.status.in_([AssetStatus.ACTIVE, AssetStatus.INACTIVE, AssetStatus.REPAIR])
-            ).count()
-            
-            value = db.query(func.sum(Asset.cost * Asset.quantity)).join(Warehouse).join(Branch).filter(
-                Branch.company_id == company_id,
-                Asset.category == category,
-                Asset.is_active == True,
-                Asset.status.in_([AssetStatus.ACTIVE, AssetStatus.INACTIVE, AssetStatus.REPAIR])
-            ).scalar() or 0
-            
-            total_assets += count
-            total_value += float(value)
+        total_assets = sum(count for count, _ in totals.values())
         
-        # Second pass to calculate percentages
-        for category in AssetCategory:
-            count = db.query(Asset).join(Warehouse).join(Branch).filter(
-                Branch.company_id == company_id,
-                Asset.category == category,
-                Asset.is_active == True,
-                Asset.status.in_([AssetStatus.ACTIVE, AssetStatus.INACTIVE, AssetStatus.REPAIR])
-            ).count()
-            
-            value = db.query(func.sum(Asset.cost * Asset.quantity)).join(Warehouse).join(Branch).filter(
-                Branch.company_id == company_id,
-                Asset.category == category,
-                Asset.is_active == True,
-                Asset.status.in_([AssetStatus.ACTIVE, AssetStatus.INACTIVE, AssetStatus.REPAIR])
-            ).scalar() or 0
-            
+        stats = []
+        for category, (count, value) in totals.items():
             percentage = (count / total_assets * 100) if total_assets > 0 else 0
-            
             stats.append(AssetCategoryStats(
                 category=category,
                 count=count,
-                value=float(value),
+                value=value,
+                percentage=round(percentage, 1)
+            ))
+        
+        return stats
+    
+    def _build_status_stats(self, aggregates: Dict[str, Any]) -> List[AssetStatusStats]:
+        """Build per-status statistics from aggregated groups"""
+        totals = {asset_status: [0, 0.0] for asset_status in AssetStatus}
+        for (category, asset_status), (count, value) in aggregates["groups"].items():
+            totals[asset_status][0] += count
+            totals[asset_status][1] += value
+        
+        total_assets = sum(count for count, _ in totals.values())
+        
+        stats = []
+        for asset_status, (count, value) in totals.items():
+            percentage = (count / total_assets * 100) if total_assets > 0 else 0
+            stats.append(AssetStatusStats(
+                status=asset_status,
+                count=count,
+                value=value,
                 percentage=round(percentage, 1)
             ))
         
@@ -530,9 +1922,14 @@ class CRUDDashboard:
 
 # Initialize CRUD instances
 company_crud = CRUDCompany()
+rollup_crud = CRUDInventoryRollup()
+inventory_number_crud = CRUDInventoryNumber(block_size=int(os.getenv("INVENTORY_NUMBER_BLOCK", "100")))
 user_crud = CRUDUser()
+refresh_token_crud = CRUDRefreshToken()
 branch_crud = CRUDBranch()
 warehouse_crud = CRUDWarehouse()
 asset_crud = CRUDAsset()
 operation_crud = CRUDAssetOperation()
+partition_crud = CRUDOperationPartitions()
+export_job_crud = CRUDExportJob()
 dashboard_crud = CRUDDashboard()
\ No newline at end of file
@@ -25,6 +25,16 @@ engine = create_engine(
     echo=os.getenv("DEBUG", "False").lower() == "true"
 )
 
+# Small separate pool for short autonomous transactions (inventory number
+# blocks): they run while the caller's session holds a connection, so drawing
+# from the same pool could leave every request waiting on a busy pool
+autonomous_engine = create_engine(
+    DATABASE_URL,
+    pool_size=int(os.getenv("AUTONOMOUS_POOL_SIZE", "2")),
+    max_overflow=int(os.getenv("AUTONOMOUS_MAX_OVERFLOW", "3")),
+    pool_pre_ping=True
+)
+
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
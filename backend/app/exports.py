@@ -0,0 +1,218 @@
+"""
+Background export jobs
+Jobs are rendered to local disk by a bounded process pool, so large exports
+never run on a web worker's event loop; finished files expire after a TTL
+"""
+import os
+import json
+import asyncio
+import tempfile
+import time
+import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, Optional
+from fastapi.concurrency import run_in_threadpool
+from database import SessionLocal
+from models import Company, ExportJob
+from schemas import ExportJobCreate
+from crud import asset_crud, operation_crud, export_job_crud
+from utils import (
+    ExcelExporter, stream_csv, asset_export_row, operation_export_row,
+    ASSET_EXPORT_HEADERS, OPERATION_EXPORT_HEADERS
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "asset_exports"))
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_MAX_ACTIVE_JOBS = int(os.getenv("EXPORT_MAX_ACTIVE_JOBS", "5"))  # per company
+EXPORT_TTL = timedelta(hours=float(os.getenv("EXPORT_TTL_HOURS", "24")))
+EXPORT_CLEANUP_INTERVAL = float(os.getenv("EXPORT_CLEANUP_INTERVAL", "600"))
+# A running job whose worker has not reported for this long is failed
+EXPORT_STALE_AFTER = timedelta(minutes=float(os.getenv("EXPORT_STALE_MINUTES", "15")))
+# Expired job rows are deleted this long after their file expired
+EXPORT_PURGE_AFTER = timedelta(days=float(os.getenv("EXPORT_PURGE_DAYS", "7")))
+EXPORT_PROGRESS_EVERY = 5000  # rows between progress updates
+
+EXPORT_EXTENSIONS = {"excel": "xlsx", "csv": "csv"}
+EXPORT_MEDIA_TYPES = {
+    "excel": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv"
+}
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Create the worker pool on first use"""
+    global _executor
+    if _executor is None:
+        # spawn, not fork: children must not inherit the web worker's threads
+        # or its pooled database connections
+        _executor = ProcessPoolExecutor(
+            max_workers=EXPORT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+def submit(job_id: int) -> None:
+    """Queue export job for rendering in the worker pool"""
+    global _executor
+    try:
+        future = _get_executor().submit(run_export_job, job_id)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool
+        logger.warning("Export worker pool was broken, restarting it")
+        _executor = None
+        future = _get_executor().submit(run_export_job, job_id)
+    future.add_done_callback(lambda done: _on_job_done(job_id, done))
+
+def _on_job_done(job_id: int, future) -> None:
+    """Record jobs whose worker process died before it could report"""
+    if future.cancelled() or future.exception() is None:
+        return
+    logger.error(f"Export job {job_id} worker failed: {future.exception()}")
+    db = SessionLocal()
+    try:
+        export_job_crud.fail(db, job_id, "Export worker stopped unexpectedly", EXPORT_TTL)
+    finally:
+        db.close()
+
+def resume_pending() -> int:
+    """Resubmit jobs left pending by a previous process; start() lets only one worker claim each"""
+    db = SessionLocal()
+    try:
+        job_ids = export_job_crud.get_pending_ids(db)
+    finally:
+        db.close()
+    for job_id in job_ids:
+        submit(job_id)
+    return len(job_ids)
+
+def shutdown() -> None:
+    """Stop the worker pool, dropping jobs that have not started"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _job_rows(db, job: ExportJob, params: ExportJobCreate):
+    """Export query, headers and row builder for the job's kind and filters"""
+    if job.kind == "assets":
+        query = asset_crud.export_query(
+            db, job.company_id, category=params.category, status=params.status,
+            warehouse_id=params.warehouse_id
+        )
+        return query, ASSET_EXPORT_HEADERS, asset_export_row
+    
+    query = operation_crud.export_query(
+        db, job.company_id, operation_type=params.operation_type,
+        start_date=params.start_date, end_date=params.end_date
+    )
+    return query, OPERATION_EXPORT_HEADERS, operation_export_row
+
+def _track_progress(db, job_id: int, rows: Iterable, state: Dict[str, Any]) -> Iterator:
+    """Pass rows through, recording the count every EXPORT_PROGRESS_EVERY rows and at the end"""
+    for count, row in enumerate(rows, 1):
+        state["rows_done"] = count
+        if count % EXPORT_PROGRESS_EVERY == 0:
+            export_job_crud.set_progress(db, job_id, count)
+        yield row
+    # Heartbeat before the file is finalized, which can take a while for large workbooks
+    export_job_crud.set_progress(db, job_id, state["rows_done"])
+
+def run_export_job(job_id: int) -> None:
+    """Render export job to EXPORT_DIR (runs in a worker process)"""
+    db = SessionLocal()
+    file_path = None
+    try:
+        job = export_job_crud.start(db, job_id)
+        if not job:
+            return
+        
+        params = ExportJobCreate(kind=job.kind, format=job.format, **json.loads(job.filters or "{}"))
+        query, headers, build_row = _job_rows(db, job, params)
+        export_job_crud.set_progress(db, job_id, 0, rows_total=query.order_by(None).count())
+        
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        extension = EXPORT_EXTENSIONS[job.format]
+        file_name = f"{job.kind}_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+        file_path = os.path.join(EXPORT_DIR, f"{job.id}_{uuid.uuid4().hex}.{extension}")
+        
+        state = {"rows_done": 0}
+        rows = _track_progress(db, job_id, query, state)
+        with open(file_path, "w+b") as export_file:
+            if job.format == "csv":
+                for chunk in stream_csv(headers, (build_row(row) for row in rows)):
+                    export_file.write(chunk)
+            else:
+                company = db.query(Company).filter(Company.id == job.company_id).first()
+                company_name = company.name if company else "Company"
+                exporter = ExcelExporter(export_file)
+                if job.kind == "assets":
+                    exporter.create_assets_report(rows, company_name)
+                else:
+                    exporter.create_operations_report(rows, company_name)
+        
+        db.rollback()  # release the export cursor's snapshot
+        if not export_job_crud.complete(
+            db, job_id, state["rows_done"], file_name, file_path, os.path.getsize(file_path), EXPORT_TTL
+        ):
+            logger.warning(f"Export job {job_id} finished after it was failed as stale, discarding file")
+            os.remove(file_path)
+            return
+        logger.info(f"Export job {job_id} completed: {state['rows_done']} rows")
+    
+    except Exception as e:
+        logger.error(f"Export job {job_id} failed: {e}")
+        db.rollback()
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+        export_job_crud.fail(db, job_id, str(e), EXPORT_TTL)
+    
+    finally:
+        db.close()
+
+def cleanup_expired() -> int:
+    """Expire due jobs and delete their files, plus any file in EXPORT_DIR older than the TTL"""
+    db = SessionLocal()
+    try:
+        paths = set(export_job_crud.expire_due(db, EXPORT_TTL, EXPORT_STALE_AFTER))
+        purged = export_job_crud.purge_expired(db, EXPORT_PURGE_AFTER)
+    finally:
+        db.close()
+    
+    if purged:
+        logger.info(f"Purged {purged} expired export jobs")
+    
+    # Files of jobs removed with their company are only reachable by age;
+    # running jobs keep writing, so their files are never this old
+    if os.path.isdir(EXPORT_DIR):
+        cutoff = time.time() - EXPORT_TTL.total_seconds()
+        for entry in os.scandir(EXPORT_DIR):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                paths.add(entry.path)
+    
+    removed = 0
+    for path in paths:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    
+    if removed:
+        logger.info(f"Removed {removed} expired export files")
+    return removed
+
+async def cleanup_loop() -> None:
+    """Run cleanup_expired every EXPORT_CLEANUP_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(EXPORT_CLEANUP_INTERVAL)
+        try:
+            await run_in_threadpool(cleanup_expired)
+        except Exception as e:
+            logger.error(f"Export cleanup failed: {e}")
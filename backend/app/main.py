@@ -2,21 +2,31 @@
 FastAPI main application for Asset Management Platform
 """
 import os
-from datetime import timedelta
-from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Depends, Request, Response, status
+import json
+import asyncio
+from datetime import datetime, date, timedelta
+from typing import List, Optional, Union
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, status, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from database import get_db, init_database
+from database import get_db, init_database, SessionLocal
 from auth import (
-    authenticate_user, create_access_token, get_current_active_user,
+    authenticate_user, create_user_access_token, get_current_active_user, get_password_hash_async,
     require_admin, require_admin_or_accountant, require_warehouse_access, require_read_access,
-    MultiTenantMiddleware, get_company_db, ACCESS_TOKEN_EXPIRE_MINUTES
+    MultiTenantMiddleware, get_company_db, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 )
 from crud import *
 from schemas import *
-from utils import ExcelExporter
+from utils import (
+    ExcelExporter, iter_file, parse_byte_range, validate_file_upload, sanitize_filename, read_import_rows,
+    stream_csv, asset_export_row, operation_export_row, ASSET_EXPORT_HEADERS, OPERATION_EXPORT_HEADERS,
+    stream_columnar, COLUMNAR_FORMATS, ASSET_ARROW_SCHEMA, OPERATION_ARROW_SCHEMA
+)
+from cache import dashboard_cache, report_cache, get_company_version, bump_company_version
+import exports
+from write_behind import write_buffer
 import logging
 
 # Configure logging
@@ -45,17 +55,50 @@ app.add_middleware(
 # Multi-tenant middleware
 app.add_middleware(MultiTenantMiddleware)
 
+# Months of asset_operations partitions kept ready ahead of the current one,
+# re-checked every OPERATION_PARTITIONS_INTERVAL seconds while the app runs
+OPERATION_PARTITIONS_AHEAD = int(os.getenv("OPERATION_PARTITIONS_AHEAD", "3"))
+OPERATION_PARTITIONS_INTERVAL = float(os.getenv("OPERATION_PARTITIONS_INTERVAL", "86400"))
+
+def ensure_operation_partitions() -> List[str]:
+    """Create missing asset_operations partitions up to OPERATION_PARTITIONS_AHEAD months ahead"""
+    db = SessionLocal()
+    try:
+        return partition_crud.ensure(db, months_ahead=OPERATION_PARTITIONS_AHEAD)
+    finally:
+        db.close()
+
+async def operation_partitions_loop() -> None:
+    """Keep future partitions ready for processes that stay up past the startup window"""
+    while True:
+        await asyncio.sleep(OPERATION_PARTITIONS_INTERVAL)
+        try:
+            await run_in_threadpool(ensure_operation_partitions)
+        except Exception as e:
+            logger.error(f"Operation partition maintenance failed: {e}")
+
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
     """Initialize database connection and tables"""
     try:
         init_database()
+        ensure_operation_partitions()
+        exports.resume_pending()
+        asyncio.create_task(exports.cleanup_loop())
+        asyncio.create_task(operation_partitions_loop())
+        write_buffer.start()
         logger.info("Application started successfully!")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background export workers and flush buffered writes"""
+    exports.shutdown()
+    write_buffer.stop()
+
 # Health check endpoint
 @app.get("/health", response_model=HealthCheck)
 async def health_check():
@@ -75,6 +118,9 @@ async def root():
 @app.post("/auth/register", response_model=CompanyResponse)
 async def register_company(company_data: CompanyCreate, db: Session = Depends(get_db)):
     """Register new company with admin user"""
+    # Hash before querying so no pooled connection is held while waiting for the pool
+    hashed_password = await get_password_hash_async(company_data.admin_password)
+    
     # Check if company with INN already exists
     existing_company = company_crud.get_by_inn(db, company_data.inn)
     if existing_company:
@@ -92,7 +138,7 @@ async def register_company(company_data: CompanyCreate, db: Session = Depends(ge
         )
     
     try:
-        company = company_crud.create_with_admin(db, company_data)
+        company = company_crud.create_with_admin(db, company_data, hashed_password=hashed_password)
         return company
     except Exception as e:
         logger.error(f"Error creating company: {e}")
@@ -101,10 +147,21 @@ async def register_company(company_data: CompanyCreate, db: Session = Depends(ge
             detail="Error creating company"
         )
 
+def build_token_response(user: User, refresh_token: str) -> Token:
+    """Token response with a fresh access token for user"""
+    return Token(
+        access_token=create_user_access_token(user),
+        token_type="bearer",
+        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        refresh_token=refresh_token,
+        refresh_expires_in=REFRESH_TOKEN_EXPIRE_DAYS * 86400,
+        user=UserResponse.from_orm(user)
+    )
+
 @app.post("/auth/login", response_model=Token)
 async def login(user_data: UserLogin, db: Session = Depends(get_db)):
-    """Authenticate user and return JWT token"""
-    user = authenticate_user(db, user_data.email, user_data.password)
+    """Authenticate user and return JWT access token and refresh token"""
+    user = await authenticate_user(db, user_data.email, user_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -112,27 +169,42 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={
-            "sub": user.email,
-            "company_id": user.company_id,
-            "role": user.role.value
-        },
-        expires_delta=access_token_expires
-    )
+    refresh_token = refresh_token_crud.issue(db, user, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    return build_token_response(user, refresh_token)
+
+@app.post("/auth/refresh", response_model=Token)
+async def refresh_access_token(token_data: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Exchange refresh token for a new access token and a rotated refresh token
     
-    return Token(
-        access_token=access_token,
-        token_type="bearer",
-        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        user=UserResponse.from_orm(user)
-    )
+    No password check, so no bcrypt; the presented refresh token stops working.
+    """
+    result = refresh_token_crud.rotate(db, token_data.refresh_token, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    if not result:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    user, refresh_token = result
+    return build_token_response(user, refresh_token)
+
+@app.post("/auth/logout")
+async def logout(token_data: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Revoke refresh token and every token rotated from the same login"""
+    refresh_token_crud.revoke(db, token_data.refresh_token)
+    return {"message": "Logged out successfully"}
 
 @app.get("/auth/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_active_user)):
+async def get_current_user_info(
+    current_user: Principal = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
     """Get current user information"""
-    return UserResponse.from_orm(current_user)
+    user = user_crud.get_by_email(db, current_user.email)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return UserResponse.from_orm(user)
 
 # ==========================================
 # DASHBOARD ROUTES
@@ -141,67 +213,114 @@ async def get_current_user_info(current_user: User = Depends(get_current_active_
 @app.get("/dashboard", response_model=DashboardData)
 async def get_dashboard_data(
     request: Request,
+    months: int = Query(6, ge=1, le=24),
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_read_access)
+    current_user: Principal = Depends(require_read_access)
 ):
     """Get dashboard data with statistics and charts"""
     company_id = db.company_id
     
-    # Get dashboard statistics
-    stats = dashboard_crud.get_stats(db, company_id)
-    category_stats = dashboard_crud.get_category_stats(db, company_id)
+    # Read the version before computing so a write landing mid-request invalidates this entry
+    cache_key = (company_id, months, get_company_version(company_id))
+    cached = dashboard_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    # Get dashboard statistics, category and status breakdowns in one query
+    stats, category_stats, status_stats = dashboard_crud.get_overview(db, company_id)
     
     # Get recent operations (last 10)
     recent_operations = operation_crud.get_by_company(db, company_id, skip=0, limit=10)
     
-    # Mock monthly operations data (in production, calculate from actual data)
-    monthly_operations = [
-        MonthlyOperationStats(month="Янв", receipt=120, transfer=80, disposal=20, adjustment=15),
-        MonthlyOperationStats(month="Фев", receipt=140, transfer=95, disposal=15, adjustment=20),
-        MonthlyOperationStats(month="Мар", receipt=160, transfer=110, disposal=25, adjustment=18),
-        MonthlyOperationStats(month="Апр", receipt=180, transfer=120, disposal=30, adjustment=22),
-        MonthlyOperationStats(month="Май", receipt=200, transfer=140, disposal=35, adjustment=25),
-        MonthlyOperationStats(month="Июн", receipt=220, transfer=160, disposal=28, adjustment=30)
-    ]
-    
-    return DashboardData(
+    # Operations per month and type for the requested window
+    monthly_operations = dashboard_crud.get_monthly_operations(db, company_id, months=months)
+    
+    dashboard = DashboardData(
         stats=stats,
         category_stats=category_stats,
+        status_stats=status_stats,
         monthly_operations=monthly_operations,
         recent_operations=[AssetOperationResponse.from_orm(op) for op in recent_operations]
     )
+    dashboard_cache.set(cache_key, dashboard)
+    
+    return dashboard
 
 # ==========================================
 # ASSET ROUTES
 # ==========================================
 
-@app.get("/assets", response_model=PaginatedResponse)
+@app.get("/assets", response_model=Union[PaginatedResponse, CursorPaginatedResponse])
 async def get_assets(
     request: Request,
     page: int = 1,
     size: int = 10,
     search: Optional[str] = None,
+    search_mode: str = "fulltext",
     category: Optional[AssetCategory] = None,
     status: Optional[AssetStatus] = None,
     warehouse_id: Optional[int] = None,
+    sort_by: Optional[str] = None,
+    sort_order: str = "asc",
+    cursor: Optional[str] = None,
+    count: Optional[str] = None,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_read_access)
+    current_user: Principal = Depends(require_read_access)
 ):
-    """Get paginated list of assets with filters"""
-    company_id = db.company_id
-    skip = (page - 1) * size
+    """Get paginated list of assets with filters
     
-    # Get assets with filters
-    assets = asset_crud.get_by_company(
-        db, company_id, skip=skip, limit=size,
-        search=search, category=category, status=status, warehouse_id=warehouse_id
+    Passing cursor (empty for the first page) switches to keyset pagination:
+    pages are fetched after next_cursor and the total is estimated unless
+    count=exact is requested (count=none skips it). Search uses the full-text
+    index with prefix matching plus inventory/serial fragments; search_mode=contains
+    restores plain substring matching, sort_by=relevance ranks full-text hits.
+    """
+    # The status filter shadows fastapi.status here, hence literal status codes
+    company_id = db.company_id
+    filters = dict(
+        search=search, search_mode=search_mode, category=category, status=status, warehouse_id=warehouse_id
     )
     
-    # Get total count
-    total = asset_crud.count_by_company(
-        db, company_id,
-        search=search, category=category, status=status, warehouse_id=warehouse_id
-    )
+    if cursor is not None:
+        count = count or "estimate"
+        if count not in ("exact", "estimate", "none"):
+            raise HTTPException(status_code=400, detail="Unsupported count mode")
+        
+        try:
+            # Fetch one extra row to know whether another page exists
+            assets = asset_crud.get_by_company(
+                db, company_id, limit=size + 1, sort_by=sort_by, sort_order=sort_order,
+                cursor=cursor or None, **filters
+            )
+            has_next = len(assets) > size
+            assets = assets[:size]
+            next_cursor = asset_crud.make_cursor(assets[-1], sort_by, sort_order) if has_next else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        total = None
+        if count != "none":
+            total = asset_crud.count_by_company(db, company_id, estimate=count == "estimate", **filters)
+        
+        return CursorPaginatedResponse(
+            items=[AssetResponse.from_orm(asset) for asset in assets],
+            size=size,
+            next_cursor=next_cursor,
+            has_next=has_next,
+            total=total,
+            total_is_estimate=count == "estimate"
+        )
+    
+    skip = (page - 1) * size
+    
+    # Get assets with filters and total count
+    try:
+        assets = asset_crud.get_by_company(
+            db, company_id, skip=skip, limit=size, sort_by=sort_by, sort_order=sort_order, **filters
+        )
+        total = asset_crud.count_by_company(db, company_id, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # Calculate pagination info
     pages = (total + size - 1) // size
@@ -223,7 +342,7 @@ async def create_asset(
     asset_data: AssetCreate,
     request: Request,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_warehouse_access)
+    current_user: Principal = Depends(require_warehouse_access)
 ):
     """Create new asset"""
     company_id = db.company_id
@@ -239,14 +358,14 @@ async def get_asset(
     asset_id: int,
     request: Request,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_read_access)
+    current_user: Principal = Depends(require_read_access)
 ):
     """Get asset by ID"""
     company_id = db.company_id
     
-    asset = db.query(Asset).join(Warehouse).join(Branch).filter(
+    asset = db.query(Asset).filter(
         Asset.id == asset_id,
-        Branch.company_id == company_id,
+        Asset.company_id == company_id,
         Asset.is_active == True
     ).first()
     
@@ -261,7 +380,7 @@ async def update_asset(
     asset_data: AssetUpdate,
     request: Request,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_warehouse_access)
+    current_user: Principal = Depends(require_warehouse_access)
 ):
     """Update asset"""
     company_id = db.company_id
@@ -279,22 +398,26 @@ async def delete_asset(
     asset_id: int,
     request: Request,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_admin_or_accountant)
+    current_user: Principal = Depends(require_admin_or_accountant)
 ):
     """Soft delete asset"""
     company_id = db.company_id
     
-    asset = db.query(Asset).join(Warehouse).join(Branch).filter(
+    # Locked so the rollup snapshot matches the row being deactivated
+    asset = db.query(Asset).filter(
         Asset.id == asset_id,
-        Branch.company_id == company_id,
+        Asset.company_id == company_id,
         Asset.is_active == True
-    ).first()
+    ).with_for_update().first()
     
     if not asset:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Asset not found")
     
+    before = rollup_crud.snapshot(asset)
     asset.is_active = False
+    rollup_crud.track(db, company_id, before, None)
     db.commit()
+    bump_company_version(company_id)
     
     return {"message": "Asset deleted successfully"}
 
@@ -302,18 +425,41 @@ async def delete_asset(
 # OPERATIONS ROUTES
 # ==========================================
 
-@app.get("/operations", response_model=List[AssetOperationResponse])
+@app.get("/operations", response_model=Union[List[AssetOperationResponse], CursorPaginatedResponse])
 async def get_operations(
     request: Request,
     skip: int = 0,
     limit: int = 100,
     operation_type: Optional[OperationType] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_warehouse_access)
+    current_user: Principal = Depends(require_warehouse_access)
 ):
-    """Get list of operations"""
+    """Get list of operations, newest first
+    
+    Passing cursor (empty for the first page) switches to keyset pagination
+    over (operation_date, id) and returns a page with next_cursor.
+    """
     company_id = db.company_id
     
+    if cursor is not None:
+        try:
+            # Fetch one extra row to know whether another page exists
+            operations = operation_crud.get_by_company(
+                db, company_id, limit=limit + 1, operation_type=operation_type, cursor=cursor or None
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
+        has_next = len(operations) > limit
+        operations = operations[:limit]
+        return CursorPaginatedResponse(
+            items=[AssetOperationResponse.from_orm(op) for op in operations],
+            size=limit,
+            next_cursor=operation_crud.make_cursor(operations[-1]) if has_next else None,
+            has_next=has_next
+        )
+    
     operations = operation_crud.get_by_company(
         db, company_id, skip=skip, limit=limit, operation_type=operation_type
     )
@@ -325,7 +471,7 @@ async def create_operation(
     operation_data: AssetOperationCreate,
     request: Request,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_warehouse_access)
+    current_user: Principal = Depends(require_warehouse_access)
 ):
     """Create new asset operation"""
     company_id = db.company_id
@@ -344,7 +490,7 @@ async def create_operation(
 async def get_warehouses(
     request: Request,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_read_access)
+    current_user: Principal = Depends(require_read_access)
 ):
     """Get list of warehouses"""
     company_id = db.company_id
@@ -356,7 +502,7 @@ async def create_warehouse(
     warehouse_data: WarehouseCreate,
     request: Request,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_admin_or_accountant)
+    current_user: Principal = Depends(require_admin_or_accountant)
 ):
     """Create new warehouse"""
     company_id = db.company_id
@@ -375,7 +521,7 @@ async def create_warehouse(
 async def get_branches(
     request: Request,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_read_access)
+    current_user: Principal = Depends(require_read_access)
 ):
     """Get list of branches"""
     company_id = db.company_id
@@ -387,7 +533,7 @@ async def create_branch(
     branch_data: BranchCreate,
     request: Request,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_admin)
+    current_user: Principal = Depends(require_admin)
 ):
     """Create new branch (Admin only)"""
     company_id = db.company_id
@@ -402,7 +548,7 @@ async def create_branch(
 async def get_users(
     request: Request,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_admin)
+    current_user: Principal = Depends(require_admin)
 ):
     """Get list of users (Admin only)"""
     company_id = db.company_id
@@ -414,7 +560,7 @@ async def create_user(
     user_data: UserCreate,
     request: Request,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_admin)
+    current_user: Principal = Depends(require_admin)
 ):
     """Create new user (Admin only)"""
     company_id = db.company_id
@@ -427,7 +573,8 @@ async def create_user(
             detail="User with this email already exists"
         )
     
-    user = user_crud.create(db, user_data, company_id)
+    hashed_password = await get_password_hash_async(user_data.password)
+    user = user_crud.create(db, user_data, company_id, hashed_password=hashed_password)
     return UserResponse.from_orm(user)
 
 @app.put("/users/{user_id}", response_model=UserResponse)
@@ -436,14 +583,30 @@ async def update_user(
     user_data: UserUpdate,
     request: Request,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_admin)
+    current_user: Principal = Depends(require_admin)
 ):
     """Update user (Admin only)"""
-    user = user_crud.update(db, user_id, user_data, current_user)
+    hashed_password = await get_password_hash_async(user_data.password) if user_data.password else None
+    user = user_crud.update(db, user_id, user_data, current_user, hashed_password=hashed_password)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return UserResponse.from_orm(user)
 
+@app.post("/users/{user_id}/revoke-tokens")
+async def revoke_user_tokens(
+    user_id: int,
+    request: Request,
+    db: Session = Depends(get_company_db),
+    current_user: Principal = Depends(require_admin)
+):
+    """Revoke all refresh tokens of user, ending their sessions once access tokens expire (Admin only)"""
+    user = user_crud.get_by_id(db, user_id, db.company_id)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    
+    revoked = refresh_token_crud.revoke_user(db, user.id)
+    return {"message": "Refresh tokens revoked", "revoked": revoked}
+
 # ==========================================
 # EXPORT ROUTES
 # ==========================================
@@ -456,43 +619,60 @@ async def export_assets(
     status: Optional[AssetStatus] = None,
     warehouse_id: Optional[int] = None,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_read_access)
+    current_user: Principal = Depends(require_read_access)
 ):
-    """Export assets to Excel or CSV"""
+    """Export assets to Excel, CSV, Parquet or Arrow IPC stream"""
     company_id = db.company_id
+    export_format = format.lower()
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    if export_format == "csv":
+        # Rows are fetched and encoded while the response is sent
+        assets = asset_crud.export_query(
+            db, company_id, category=category, status=status, warehouse_id=warehouse_id
+        )
+        return StreamingResponse(
+            stream_csv(ASSET_EXPORT_HEADERS, (asset_export_row(asset) for asset in assets)),
+            media_type="text/csv",
+            headers={"Content-Disposition": f"attachment; filename=assets_export_{timestamp}.csv"}
+        )
+    
+    if export_format in COLUMNAR_FORMATS:
+        # Typed columns with dictionary-encoded enums, for analytics tools
+        extension, media_type = COLUMNAR_FORMATS[export_format]
+        assets = asset_crud.export_query(
+            db, company_id, batch_size=10000, category=category, status=status, warehouse_id=warehouse_id
+        )
+        return StreamingResponse(
+            stream_columnar(ASSET_ARROW_SCHEMA, assets, export_format),
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename=assets_export_{timestamp}.{extension}"}
+        )
+    
+    if export_format != "excel":
+        # `status` is the filter parameter here, not fastapi.status
+        raise HTTPException(status_code=400, detail="Supported formats: excel, csv, parquet, arrow")
     
     # Get company name for report header
     company = db.query(Company).filter(Company.id == company_id).first()
     company_name = company.name if company else "Company"
     
-    # Get all assets with filters
-    assets = asset_crud.get_by_company(
-        db, company_id, skip=0, limit=10000,  # Large limit for export
-        category=category, status=status, warehouse_id=warehouse_id
+    # Stream all assets with filters into the workbook, off the event loop
+    assets = asset_crud.export_query(
+        db, company_id, category=category, status=status, warehouse_id=warehouse_id
     )
+    excel_file = await run_in_threadpool(ExcelExporter().create_assets_report, assets, company_name)
+    filename = f"assets_export_{timestamp}.xlsx"
     
-    if format.lower() == "excel":
-        # Create Excel export
-        exporter = ExcelExporter()
-        excel_buffer = exporter.create_assets_report(assets, company_name)
-        
-        # Create filename
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"assets_export_{timestamp}.xlsx"
-        
-        # Return Excel file
-        return StreamingResponse(
-            io.BytesIO(excel_buffer.read()),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-    
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Only Excel format is currently supported"
-        )
+    # Return Excel file from its temp file
+    return StreamingResponse(
+        iter_file(excel_file),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(os.fstat(excel_file.fileno()).st_size)
+        }
+    )
 
 @app.get("/export/operations")
 async def export_operations(
@@ -502,9 +682,9 @@ async def export_operations(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_read_access)
+    current_user: Principal = Depends(require_read_access)
 ):
-    """Export operations to Excel or CSV"""
+    """Export operations to Excel, CSV, Parquet or Arrow IPC stream"""
     company_id = db.company_id
     
     # Parse dates if provided
@@ -522,66 +702,259 @@ async def export_operations(
         except ValueError:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid end_date format")
     
+    export_format = format.lower()
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    if export_format == "csv":
+        # Rows are fetched and encoded while the response is sent
+        operations = operation_crud.export_query(
+            db, company_id, operation_type=operation_type, start_date=start_dt, end_date=end_dt
+        )
+        return StreamingResponse(
+            stream_csv(OPERATION_EXPORT_HEADERS, (operation_export_row(operation) for operation in operations)),
+            media_type="text/csv",
+            headers={"Content-Disposition": f"attachment; filename=operations_export_{timestamp}.csv"}
+        )
+    
+    if export_format in COLUMNAR_FORMATS:
+        # Typed columns with dictionary-encoded enums, for analytics tools
+        extension, media_type = COLUMNAR_FORMATS[export_format]
+        operations = operation_crud.export_query(
+            db, company_id, batch_size=10000, operation_type=operation_type, start_date=start_dt, end_date=end_dt
+        )
+        return StreamingResponse(
+            stream_columnar(OPERATION_ARROW_SCHEMA, operations, export_format),
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename=operations_export_{timestamp}.{extension}"}
+        )
+    
+    if export_format != "excel":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Supported formats: excel, csv, parquet, arrow"
+        )
+    
     # Get company name for report header
     company = db.query(Company).filter(Company.id == company_id).first()
     company_name = company.name if company else "Company"
     
-    # Get all operations with filters
-    operations = operation_crud.get_by_company(
-        db, company_id, skip=0, limit=10000,  # Large limit for export
-        operation_type=operation_type, start_date=start_dt, end_date=end_dt
+    # Stream all operations with filters into the workbook, off the event loop
+    operations = operation_crud.export_query(
+        db, company_id, operation_type=operation_type, start_date=start_dt, end_date=end_dt
     )
+    excel_file = await run_in_threadpool(ExcelExporter().create_operations_report, operations, company_name)
+    filename = f"operations_export_{timestamp}.xlsx"
     
-    if format.lower() == "excel":
-        # Create Excel export
-        exporter = ExcelExporter()
-        excel_buffer = exporter.create_operations_report(operations, company_name)
-        
-        # Create filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"operations_export_{timestamp}.xlsx"
-        
-        # Return Excel file
-        return StreamingResponse(
-            io.BytesIO(excel_buffer.read()),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+    # Return Excel file from its temp file
+    return StreamingResponse(
+        iter_file(excel_file),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(os.fstat(excel_file.fileno()).st_size)
+        }
+    )
+
+@app.post("/exports", response_model=ExportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_export_job(
+    job_data: ExportJobCreate,
+    db: Session = Depends(get_company_db),
+    current_user: Principal = Depends(require_read_access)
+):
+    """Queue export for rendering in the background; poll GET /exports/{job_id} for progress"""
+    company_id = db.company_id
+    
+    job = export_job_crud.create(
+        db, job_data, current_user.id, company_id, max_active=exports.EXPORT_MAX_ACTIVE_JOBS
+    )
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many exports in progress, try again when one finishes"
         )
     
-    else:
+    exports.submit(job.id)
+    return ExportJobResponse.from_orm(job)
+
+@app.get("/exports/{job_id}", response_model=ExportJobResponse)
+async def get_export_job(
+    job_id: int,
+    db: Session = Depends(get_company_db),
+    current_user: Principal = Depends(require_read_access)
+):
+    """Get export job status and progress"""
+    job = export_job_crud.get(db, job_id, db.company_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export not found")
+    return ExportJobResponse.from_orm(job)
+
+@app.get("/exports/{job_id}/download")
+async def download_export(
+    job_id: int,
+    request: Request,
+    db: Session = Depends(get_company_db),
+    current_user: Principal = Depends(require_read_access)
+):
+    """Download finished export; supports single byte-range requests for resumed downloads"""
+    job = export_job_crud.get(db, job_id, db.company_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export not found")
+    if job.status == "expired":
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Export has expired")
+    if job.status != "completed":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Export is {job.status}")
+    
+    try:
+        export_file = open(job.file_path, "rb")
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Export has expired")
+    
+    size = os.fstat(export_file.fileno()).st_size
+    headers = {
+        "Content-Disposition": f"attachment; filename={job.file_name}",
+        "Accept-Ranges": "bytes"
+    }
+    
+    try:
+        byte_range = parse_byte_range(request.headers.get("range"), size)
+    except ValueError:
+        export_file.close()
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Only Excel format is currently supported"
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
         )
+    
+    media_type = exports.EXPORT_MEDIA_TYPES[job.format]
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(iter_file(export_file), media_type=media_type, headers=headers)
+    
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        iter_file(export_file, start=start, end=end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers
+    )
 
 # ==========================================
 # BULK OPERATIONS ROUTES
 # ==========================================
 
-@app.post("/assets/bulk-update")
+@app.post("/assets/bulk", response_model=BulkAssetCreateResponse)
+async def bulk_create_assets(
+    bulk_data: BulkAssetCreate,
+    request: Request,
+    db: Session = Depends(get_company_db),
+    current_user: Principal = Depends(require_warehouse_access)
+):
+    """Create many assets at once, e.g. when receiving a shipment"""
+    company_id = db.company_id
+    
+    results = asset_crud.create_bulk(db, bulk_data.assets, company_id)
+    created_count = sum(1 for result in results if result.success)
+    logger.info(f"Bulk created {created_count} of {len(results)} assets for company {company_id}")
+    
+    return BulkAssetCreateResponse(
+        created_count=created_count,
+        failed_count=len(results) - created_count,
+        results=results
+    )
+
+# Spreadsheet imports are streamed, so they may be far larger than other uploads
+IMPORT_EXTENSIONS = [".csv", ".xlsx"]
+IMPORT_MAX_FILE_SIZE = int(os.getenv("IMPORT_MAX_FILE_SIZE", str(200 * 1024 * 1024)))
+
+@app.post("/assets/import")
+async def import_assets(
+    request: Request,
+    file: UploadFile = File(...),
+    warehouse_id: Optional[int] = Form(None),
+    db: Session = Depends(get_company_db),
+    current_user: Principal = Depends(require_warehouse_access)
+):
+    """
+    Import assets from a CSV or XLSX file whose header row names AssetCreate fields
+    Streams newline-delimited JSON: row errors, progress after every batch and a final summary
+    """
+    company_id = db.company_id
+    filename = sanitize_filename(file.filename or "")
+    
+    if not validate_file_upload(filename, file.size, IMPORT_EXTENSIONS, IMPORT_MAX_FILE_SIZE):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Expected a {' or '.join(IMPORT_EXTENSIONS)} file up to {IMPORT_MAX_FILE_SIZE // (1024 * 1024)} MB"
+        )
+    
+    try:
+        rows = read_import_rows(file.file, filename)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    logger.info(f"User {current_user.id} importing assets from {filename} for company {company_id}")
+    events = asset_crud.import_rows(db, rows, company_id, default_warehouse_id=warehouse_id)
+    return StreamingResponse(
+        (json.dumps(event, ensure_ascii=False) + "\n" for event in events),
+        media_type="application/x-ndjson"
+    )
+
+@app.post("/operations/bulk", response_model=BulkOperationResponse)
+async def bulk_create_operations(
+    bulk_data: BulkOperationCreate,
+    request: Request,
+    db: Session = Depends(get_company_db),
+    current_user: Principal = Depends(require_warehouse_access)
+):
+    """Apply one operation to many assets, e.g. moving a pallet between warehouses"""
+    company_id = db.company_id
+    
+    try:
+        results = operation_crud.create_bulk(
+            db, bulk_data.asset_ids, bulk_data.operation, current_user.id, company_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    succeeded_count = sum(1 for result in results if result.success)
+    logger.info(f"Bulk {bulk_data.operation.type.value} applied to {succeeded_count} of {len(results)} assets for company {company_id}")
+    
+    return BulkOperationResponse(
+        succeeded_count=succeeded_count,
+        failed_count=len(results) - succeeded_count,
+        results=results
+    )
+
+@app.post("/assets/bulk-update", response_model=BulkAssetUpdateResponse)
 async def bulk_update_assets(
     bulk_data: BulkAssetUpdate,
     request: Request,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_admin_or_accountant)
+    current_user: Principal = Depends(require_admin_or_accountant)
 ):
     """Bulk update multiple assets"""
     company_id = db.company_id
-    updated_assets = []
     
-    for asset_id in bulk_data.asset_ids:
-        try:
-            asset = asset_crud.update(db, asset_id, bulk_data.updates, company_id)
-            if asset:
-                updated_assets.append(asset)
-        except Exception as e:
-            logger.warning(f"Failed to update asset {asset_id}: {e}")
+    try:
+        updated_ids, skipped_ids = asset_crud.update_bulk(
+            db, bulk_data.asset_ids, bulk_data.updates, company_id,
+            all_or_nothing=bulk_data.mode == "all_or_nothing"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    return {
-        "message": f"Updated {len(updated_assets)} assets successfully",
-        "updated_count": len(updated_assets),
-        "total_requested": len(bulk_data.asset_ids)
-    }
+    if skipped_ids:
+        logger.warning(f"Bulk update skipped {len(skipped_ids)} assets for company {company_id}")
+    
+    return BulkAssetUpdateResponse(
+        message=f"Updated {len(updated_ids)} assets successfully",
+        updated_count=len(updated_ids),
+        total_requested=len(bulk_data.asset_ids),
+        updated_ids=updated_ids,
+        skipped_ids=skipped_ids
+    )
 
 # ==========================================
 # REPORTS ROUTES
@@ -591,57 +964,145 @@ async def bulk_update_assets(
 async def generate_asset_report(
     filters: ReportFilter,
     request: Request,
+    size: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_read_access)
+    current_user: Principal = Depends(require_read_access)
 ):
-    """Generate detailed asset report with filters"""
-    company_id = db.company_id
+    """Generate asset report with filters
     
-    # Get assets with filters
-    assets = asset_crud.get_by_company(
-        db, company_id, skip=0, limit=10000,
-        category=filters.category, status=filters.status,
-        warehouse_id=filters.warehouse_ids[0] if filters.warehouse_ids else None
-    )
+    Totals are aggregated in the database over all matching assets and
+    returned with the first page; pass next_cursor to page through details.
+    """
+    company_id = db.company_id
+    report_filters = {
+        "category": filters.category,
+        "status": filters.status,
+        "warehouse_ids": filters.warehouse_ids
+    }
     
-    # Calculate total value
-    total_value = sum(asset.cost * asset.quantity for asset in assets)
+    try:
+        assets = asset_crud.get_by_company(
+            db, company_id, limit=size + 1, sort_by="id", cursor=cursor, **report_filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    return AssetReport(
+    has_next = len(assets) > size
+    assets = assets[:size]
+    report = AssetReport(
         filters=filters,
         assets=[AssetResponse.from_orm(asset) for asset in assets],
-        total_count=len(assets),
-        total_value=total_value
+        next_cursor=asset_crud.make_cursor(assets[-1], "id") if has_next else None,
+        has_next=has_next
     )
+    
+    if not cursor:
+        summary = asset_crud.get_report_summary(db, company_id, **report_filters)
+        report.total_count = summary["total_count"]
+        report.total_value = summary["total_value"]
+        report.total_quantity = summary["total_quantity"]
+        report.summary_by_category = summary["by_category"]
+        report.summary_by_status = summary["by_status"]
+    
+    return report
 
 @app.post("/reports/operations", response_model=OperationReport)
 async def generate_operation_report(
     filters: ReportFilter,
     request: Request,
+    size: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_company_db),
-    current_user: User = Depends(require_read_access)
+    current_user: Principal = Depends(require_read_access)
 ):
-    """Generate detailed operation report with filters"""
-    company_id = db.company_id
+    """Generate operation report with filters
     
-    # Get operations with filters
-    operations = operation_crud.get_by_company(
-        db, company_id, skip=0, limit=10000,
-        start_date=filters.start_date, end_date=filters.end_date
-    )
+    The per-type summary is a GROUP BY over all matching operations,
+    returned with the first page; pass next_cursor to page through details.
+    """
+    company_id = db.company_id
+    report_filters = {
+        "start_date": filters.start_date,
+        "end_date": filters.end_date,
+        "warehouse_ids": filters.warehouse_ids
+    }
     
-    # Calculate summary by type
-    summary_by_type = {}
-    for op_type in OperationType:
-        count = sum(1 for op in operations if op.type == op_type)
-        summary_by_type[op_type.value] = count
+    try:
+        operations = operation_crud.get_by_company(
+            db, company_id, limit=size + 1, cursor=cursor, **report_filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    return OperationReport(
+    has_next = len(operations) > size
+    operations = operations[:size]
+    report = OperationReport(
         filters=filters,
         operations=[AssetOperationResponse.from_orm(op) for op in operations],
-        total_count=len(operations),
-        summary_by_type=summary_by_type
+        next_cursor=operation_crud.make_cursor(operations[-1]) if has_next else None,
+        has_next=has_next
+    )
+    
+    if not cursor:
+        summary = operation_crud.get_report_summary(db, company_id, **report_filters)
+        report.total_count = summary["total_count"]
+        report.summary_by_type = summary["by_type"]
+    
+    return report
+
+@app.post("/reports/pivot", response_model=PivotResponse)
+async def generate_pivot_report(
+    pivot: PivotRequest,
+    db: Session = Depends(get_company_db),
+    current_user: Principal = Depends(require_read_access)
+):
+    """Pivot asset count, quantity and value by branch, warehouse, category and status
+    
+    Subtotals come from a single ROLLUP/CUBE query; results are cached per
+    company data version, so any write invalidates them.
+    """
+    company_id = db.company_id
+    
+    cache_key = (
+        company_id, get_company_version(company_id), "pivot",
+        tuple(pivot.dimensions), tuple(pivot.measures), pivot.totals,
+        tuple(sorted(pivot.warehouse_ids or ())), pivot.category, pivot.status
     )
+    cached = report_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    report = dashboard_crud.get_pivot(db, company_id, pivot)
+    report_cache.set(cache_key, report)
+    
+    return report
+
+@app.post("/reports/depreciation", response_model=DepreciationReport)
+async def generate_depreciation_report(
+    params: DepreciationRequest,
+    db: Session = Depends(get_company_db),
+    current_user: Principal = Depends(require_read_access)
+):
+    """Depreciation, period charge and book value by category and branch
+    
+    Computed for the whole portfolio at once; cached per company data version.
+    """
+    company_id = db.company_id
+    
+    cache_key = (
+        company_id, get_company_version(company_id), "depreciation",
+        params.as_of or date.today(), params.period_start, params.method, params.useful_life_years,
+        params.factor, tuple(params.group_by), params.category, tuple(sorted(params.warehouse_ids or ()))
+    )
+    cached = report_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    report = asset_crud.get_depreciation_report(db, company_id, params)
+    report_cache.set(cache_key, report)
+    
+    return report
 
 # ==========================================
 # ERROR HANDLERS
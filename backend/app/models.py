@@ -2,7 +2,7 @@
 SQLAlchemy models for Asset Management Platform
 Supports multi-tenancy with company isolation
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, ForeignKey, Text, Enum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -42,6 +42,7 @@ class Company(Base):
     inn = Column(String(12), unique=True, nullable=False, index=True)
     email = Column(String(255), nullable=False)
     address = Column(Text)
+    timezone = Column(String(64), nullable=False, default="UTC", server_default="UTC")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     is_active = Column(Boolean, default=True, index=True)
@@ -112,6 +113,8 @@ class Asset(Base):
     quantity = Column(Integer, nullable=False, default=1)
     status = Column(Enum(AssetStatus), nullable=False, default=AssetStatus.ACTIVE, index=True)
     warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False, index=True)
+    # Denormalized from warehouse -> branch so tenant filters need no joins
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     is_active = Column(Boolean, default=True, index=True)
@@ -129,10 +132,14 @@ class Asset(Base):
 
 class AssetOperation(Base):
     __tablename__ = "asset_operations"
+    # Monthly range partitions on operation_date, managed by CRUDOperationPartitions
+    __table_args__ = {"postgresql_partition_by": "RANGE (operation_date)"}
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     type = Column(Enum(OperationType), nullable=False, index=True)
     asset_id = Column(Integer, ForeignKey("assets.id"), nullable=False, index=True)
+    # Denormalized from the asset so tenant filters need no joins
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False, index=True)
     quantity = Column(Integer, nullable=False, default=1)
     
     # Warehouse movement tracking
@@ -141,7 +148,8 @@ class AssetOperation(Base):
     
     # Operation details
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
-    operation_date = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    # Part of the primary key because a partitioned table's key must include the partition column
+    operation_date = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), index=True)
     reason = Column(String(255))
     notes = Column(Text)
     document_number = Column(String(100), index=True)
@@ -159,6 +167,72 @@ class AssetOperation(Base):
     from_warehouse = relationship("Warehouse", foreign_keys=[from_warehouse_id], back_populates="operations_from")
     to_warehouse = relationship("Warehouse", foreign_keys=[to_warehouse_id], back_populates="operations_to")
 
+class InventoryRollup(Base):
+    """Per-company asset totals by warehouse, category and status, maintained on every asset write"""
+    __tablename__ = "inventory_rollups"
+    
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id"), primary_key=True)
+    category = Column(Enum(AssetCategory), primary_key=True)
+    status = Column(Enum(AssetStatus), primary_key=True)
+    asset_count = Column(Integer, nullable=False, default=0)
+    total_quantity = Column(Integer, nullable=False, default=0)
+    total_value = Column(Float, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class InventoryCounter(Base):
+    """Last inventory number handed out per company, advanced in blocks by the allocator"""
+    __tablename__ = "inventory_counters"
+    
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    last_value = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class RefreshToken(Base):
+    """Opaque refresh token, stored only as its keyed hash and rotated on every use"""
+    __tablename__ = "refresh_tokens"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    token_hash = Column(String(64), nullable=False, unique=True)  # HMAC-SHA256 hex
+    family_id = Column(String(32), nullable=False, index=True)  # tokens rotated from one login
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True))
+
+class ExportJob(Base):
+    """Background export rendered to local disk by the export worker pool"""
+    __tablename__ = "export_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String(20), nullable=False)  # assets, operations
+    format = Column(String(10), nullable=False)  # excel, csv
+    filters = Column(Text)  # JSON string of export filters
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, completed, failed, expired
+    rows_total = Column(Integer)
+    rows_done = Column(Integer, nullable=False, default=0)
+    file_name = Column(String(255))
+    file_path = Column(String(500))
+    file_size = Column(BigInteger)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))  # last sign of life from the rendering worker
+    finished_at = Column(DateTime(timezone=True))
+    expires_at = Column(DateTime(timezone=True))
+    
+    @property
+    def progress(self):
+        """Percent of rows rendered, once the row count is known"""
+        if self.status == "completed":
+            return 100.0
+        if not self.rows_total:
+            return None
+        return round(min(self.rows_done / self.rows_total, 1) * 100, 1)
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
     
@@ -0,0 +1,53 @@
+"""
+Operation partition maintenance command
+Usage: python partitions.py list
+       python partitions.py ensure [--months-ahead N] [--from YYYY-MM]
+       python partitions.py archive --before YYYY-MM [--drop]
+"""
+import argparse
+import sys
+from datetime import datetime
+from database import SessionLocal
+from crud import partition_crud
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def parse_month(value: str):
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected YYYY-MM, got {value}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Manage monthly asset_operations partitions")
+    parser.add_argument("action", choices=["list", "ensure", "archive"])
+    parser.add_argument("--months-ahead", type=int, default=3, help="Future months to create (ensure)")
+    parser.add_argument("--from", dest="start", type=parse_month, default=None, help="First month to create (ensure)")
+    parser.add_argument("--before", type=parse_month, default=None, help="Archive months before this one (archive)")
+    parser.add_argument("--drop", action="store_true", help="Drop detached partitions instead of archiving them")
+    args = parser.parse_args(argv)
+    
+    db = SessionLocal()
+    try:
+        if args.action == "list":
+            for name, month in partition_crud.list(db):
+                print(f"{month:%Y-%m}  {name}")
+            return 0
+        
+        if args.action == "ensure":
+            created = partition_crud.ensure(db, months_ahead=args.months_ahead, start=args.start)
+            logger.info(f"Created {len(created)} operation partitions")
+            return 0
+        
+        if args.before is None:
+            parser.error("archive requires --before")
+        archived = partition_crud.archive(db, args.before, drop=args.drop)
+        logger.info(f"{'Dropped' if args.drop else 'Archived'} {len(archived)} operation partitions")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
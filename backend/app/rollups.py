@@ -0,0 +1,39 @@
+"""
+Inventory rollup maintenance command
+Usage: python rollups.py rebuild|verify [--company-id ID]
+"""
+import argparse
+import sys
+from database import SessionLocal
+from crud import rollup_crud
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rebuild or verify inventory rollups")
+    parser.add_argument("action", choices=["rebuild", "verify"])
+    parser.add_argument("--company-id", type=int, default=None, help="Limit to one company")
+    args = parser.parse_args(argv)
+    
+    db = SessionLocal()
+    try:
+        if args.action == "rebuild":
+            rollup_crud.rebuild(db, args.company_id)
+            return 0
+        
+        mismatches = rollup_crud.verify(db, args.company_id)
+        for mismatch in mismatches:
+            logger.warning(
+                f"Rollup mismatch company={mismatch['company_id']} warehouse={mismatch['warehouse_id']} "
+                f"category={mismatch['category'].value} status={mismatch['status'].value}: "
+                f"expected={mismatch['expected']} actual={mismatch['actual']}"
+            )
+        logger.info(f"Verified inventory rollups: {len(mismatches)} mismatches")
+        return 1 if mismatches else 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
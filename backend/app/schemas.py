@@ -2,8 +2,9 @@
 Pydantic schemas for request/response validation
 """
 from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional, List
-from datetime import datetime
+from typing import Any, Dict, Optional, List, Literal
+from datetime import datetime, date
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from models import UserRole, AssetCategory, AssetStatus, OperationType
 
 # Base schemas
@@ -20,19 +21,46 @@ class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
     expires_in: int
+    refresh_token: Optional[str] = None
+    refresh_expires_in: Optional[int] = None
     user: "UserResponse"
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str = Field(..., min_length=1, max_length=255)
+
 class TokenData(BaseModel):
     email: Optional[str] = None
     company_id: Optional[int] = None
     role: Optional[UserRole] = None
 
+# Authenticated user as resolved for a request; cached between requests,
+# so it carries only what authorization and auditing need
+class Principal(BaseSchema):
+    id: int
+    email: str
+    company_id: int
+    role: UserRole
+    is_active: bool
+
 # Company schemas
+def validate_timezone_name(value: Optional[str]) -> Optional[str]:
+    """Ensure timezone is a known IANA name"""
+    if value is None:
+        return value
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {value}")
+    return value
+
 class CompanyBase(BaseModel):
     name: str = Field(..., min_length=2, max_length=255)
     inn: str = Field(..., min_length=10, max_length=12)
     email: EmailStr
     address: Optional[str] = None
+    timezone: str = Field("UTC", max_length=64)
+
+    _validate_timezone = validator('timezone', allow_reuse=True)(validate_timezone_name)
 
 class CompanyCreate(CompanyBase):
     admin_email: EmailStr
@@ -43,6 +71,9 @@ class CompanyUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=2, max_length=255)
     email: Optional[EmailStr] = None
     address: Optional[str] = None
+    timezone: Optional[str] = Field(None, max_length=64)
+
+    _validate_timezone = validator('timezone', allow_reuse=True)(validate_timezone_name)
 
 class CompanyResponse(CompanyBase, BaseSchema):
     id: int
@@ -124,11 +155,25 @@ class AssetBase(BaseModel):
     supplier: Optional[str] = None
     notes: Optional[str] = None
 
+def parse_plain_date(value: Any) -> Any:
+    """Accept plain dates (2024-06-01 or 01.06.2024) where a datetime is expected"""
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime.combine(value, datetime.min.time())
+    if isinstance(value, str):
+        for date_format in ("%Y-%m-%d", "%d.%m.%Y"):
+            try:
+                return datetime.strptime(value.strip(), date_format)
+            except ValueError:
+                continue
+    return value
+
 class AssetCreate(AssetBase):
     warehouse_id: int
     purchase_date: Optional[datetime] = None
     warranty_until: Optional[datetime] = None
 
+    _parse_dates = validator('purchase_date', 'warranty_until', pre=True, allow_reuse=True)(parse_plain_date)
+
 class AssetUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=2, max_length=255)
     description: Optional[str] = None
@@ -144,6 +189,8 @@ class AssetUpdate(BaseModel):
     warranty_until: Optional[datetime] = None
     is_active: Optional[bool] = None
 
+    _parse_dates = validator('purchase_date', 'warranty_until', pre=True, allow_reuse=True)(parse_plain_date)
+
 class AssetResponse(AssetBase, BaseSchema):
     id: int
     inventory_number: str
@@ -163,8 +210,7 @@ class AssetOperationBase(BaseModel):
     notes: Optional[str] = None
     document_number: Optional[str] = None
 
-class AssetOperationCreate(AssetOperationBase):
-    asset_id: int
+class AssetOperationDetails(AssetOperationBase):
     from_warehouse_id: Optional[int] = None
     to_warehouse_id: Optional[int] = None
     cost_before: Optional[float] = None
@@ -176,6 +222,9 @@ class AssetOperationCreate(AssetOperationBase):
             raise ValueError('to_warehouse_id is required for transfer operations')
         return v
 
+class AssetOperationCreate(AssetOperationDetails):
+    asset_id: int
+
 class AssetOperationResponse(AssetOperationBase, BaseSchema):
     id: int
     asset_id: int
@@ -205,8 +254,15 @@ class AssetCategoryStats(BaseModel):
     value: float
     percentage: float
 
+class AssetStatusStats(BaseModel):
+    status: AssetStatus
+    count: int
+    value: float
+    percentage: float
+
 class MonthlyOperationStats(BaseModel):
     month: str
+    period: Optional[str] = None  # YYYY-MM in company timezone
     receipt: int
     transfer: int
     disposal: int
@@ -215,6 +271,7 @@ class MonthlyOperationStats(BaseModel):
 class DashboardData(BaseModel):
     stats: DashboardStats
     category_stats: List[AssetCategoryStats]
+    status_stats: List[AssetStatusStats] = []
     monthly_operations: List[MonthlyOperationStats]
     recent_operations: List[AssetOperationResponse]
 
@@ -226,17 +283,98 @@ class ReportFilter(BaseModel):
     category: Optional[AssetCategory] = None
     status: Optional[AssetStatus] = None
 
+# Summaries cover every matching row and are returned with the first page
+# only (no cursor); later pages carry just the detail rows
 class AssetReport(BaseModel):
     filters: ReportFilter
     assets: List[AssetResponse]
-    total_count: int
-    total_value: float
+    total_count: Optional[int] = None
+    total_value: Optional[float] = None
+    total_quantity: Optional[int] = None
+    summary_by_category: Optional[dict] = None
+    summary_by_status: Optional[dict] = None
+    next_cursor: Optional[str] = None
+    has_next: bool = False
 
 class OperationReport(BaseModel):
     filters: ReportFilter
     operations: List[AssetOperationResponse]
-    total_count: int
-    summary_by_type: dict
+    total_count: Optional[int] = None
+    summary_by_type: Optional[dict] = None
+    next_cursor: Optional[str] = None
+    has_next: bool = False
+
+# Pivot over the company hierarchy; totals picks the grouping:
+# "rollup" adds subtotals along the dimension order plus a grand total,
+# "cube" adds every combination, "none" returns only the leaf groups
+PivotDimension = Literal["branch", "warehouse", "category", "status"]
+PivotMeasure = Literal["count", "quantity", "value"]
+
+class PivotRequest(BaseModel):
+    dimensions: List[PivotDimension]
+    measures: List[PivotMeasure] = ["count", "quantity", "value"]
+    totals: Literal["rollup", "cube", "none"] = "rollup"
+    warehouse_ids: Optional[List[int]] = None
+    category: Optional[AssetCategory] = None
+    status: Optional[AssetStatus] = None
+    
+    @validator('dimensions', 'measures')
+    def validate_unique(cls, v):
+        if not v:
+            raise ValueError('At least one value is required')
+        if len(set(v)) != len(v):
+            raise ValueError('Values must be unique')
+        return v
+
+# Columnar payload: one list per dimension and measure, all of row_count length.
+# Branch and warehouse columns hold ids, named once in labels. grouping is the
+# GROUPING() bitmask per row (first dimension is the highest bit); a set bit
+# means that dimension is totalled over and its column holds null
+class PivotResponse(BaseModel):
+    dimensions: List[str]
+    measures: List[str]
+    totals: str
+    row_count: int
+    columns: Dict[str, List[Any]]
+    grouping: List[int]
+    labels: Dict[str, Dict[int, str]]
+
+# Depreciation of assets on the balance (not disposed) as of a date;
+# period_depreciation is the charge since period_start (default: January 1st)
+class DepreciationRequest(BaseModel):
+    as_of: Optional[date] = None
+    period_start: Optional[date] = None
+    method: Literal["straight_line", "declining_balance"] = "straight_line"
+    useful_life_years: int = Field(5, ge=1, le=100)
+    factor: float = Field(2.0, gt=0, le=10)  # declining balance rate multiplier
+    group_by: List[Literal["category", "branch"]] = ["category", "branch"]
+    category: Optional[AssetCategory] = None
+    warehouse_ids: Optional[List[int]] = None
+    
+    @validator('period_start')
+    def validate_period_start(cls, v, values):
+        as_of = values.get('as_of') or date.today()
+        if v and v > as_of:
+            raise ValueError('period_start must not be after as_of')
+        return v
+
+class DepreciationGroup(BaseModel):
+    category: Optional[AssetCategory] = None
+    branch_id: Optional[int] = None
+    branch_name: Optional[str] = None
+    asset_count: int
+    cost: float
+    accumulated_depreciation: float
+    period_depreciation: float
+    book_value: float
+
+class DepreciationReport(BaseModel):
+    as_of: date
+    period_start: date
+    method: str
+    useful_life_years: int
+    groups: List[DepreciationGroup]
+    totals: DepreciationGroup
 
 # Pagination schemas
 class PaginationParams(BaseModel):
@@ -244,10 +382,10 @@ class PaginationParams(BaseModel):
     size: int = Field(10, ge=1, le=100)
     search: Optional[str] = None
     sort_by: Optional[str] = None
-    sort_order: Optional[str] = Field("asc", regex="^(asc|desc)$")
+    sort_order: Optional[str] = Field("asc", pattern="^(asc|desc)$")
 
 class PaginatedResponse(BaseModel):
-    items: List[BaseSchema]
+    items: List[Any]
     total: int
     page: int
     size: int
@@ -255,21 +393,92 @@ class PaginatedResponse(BaseModel):
     has_next: bool
     has_prev: bool
 
+class CursorPaginatedResponse(BaseModel):
+    items: List[Any]
+    size: int
+    next_cursor: Optional[str] = None
+    has_next: bool
+    total: Optional[int] = None
+    total_is_estimate: bool = False
+
 # Bulk operation schemas
 class BulkAssetUpdate(BaseModel):
-    asset_ids: List[int] = Field(..., min_items=1)
+    asset_ids: List[int] = Field(..., min_items=1, max_items=50000)
     updates: AssetUpdate
+    # all_or_nothing rejects the request if any asset is missing; best_effort updates the rest
+    mode: Literal["all_or_nothing", "best_effort"] = "best_effort"
+
+class BulkAssetUpdateResponse(BaseModel):
+    message: str
+    updated_count: int
+    total_requested: int
+    updated_ids: List[int]
+    skipped_ids: List[int]
 
 class BulkOperationCreate(BaseModel):
-    asset_ids: List[int] = Field(..., min_items=1)
-    operation: AssetOperationCreate
+    asset_ids: List[int] = Field(..., min_items=1, max_items=10000)
+    operation: AssetOperationDetails
+
+class BulkOperationResult(BaseModel):
+    asset_id: int
+    success: bool
+    operation_id: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkOperationResponse(BaseModel):
+    succeeded_count: int
+    failed_count: int
+    results: List[BulkOperationResult]
+
+class BulkAssetCreate(BaseModel):
+    assets: List[AssetCreate] = Field(..., min_items=1, max_items=10000)
+
+class BulkAssetResult(BaseModel):
+    index: int
+    success: bool
+    id: Optional[int] = None
+    inventory_number: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkAssetCreateResponse(BaseModel):
+    created_count: int
+    failed_count: int
+    results: List[BulkAssetResult]
 
 # Export schemas
 class ExportRequest(BaseModel):
-    format: str = Field("excel", regex="^(excel|csv)$")
+    format: str = Field("excel", pattern="^(excel|csv)$")
     filters: Optional[ReportFilter] = None
     include_operations: bool = False
 
+class ExportJobCreate(BaseModel):
+    kind: Literal["assets", "operations"]
+    format: Literal["excel", "csv"] = "excel"
+    # Asset filters
+    category: Optional[AssetCategory] = None
+    status: Optional[AssetStatus] = None
+    warehouse_id: Optional[int] = None
+    # Operation filters
+    operation_type: Optional[OperationType] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+
+class ExportJobResponse(BaseSchema):
+    id: int
+    kind: str
+    format: str
+    status: str
+    rows_total: Optional[int] = None
+    rows_done: int
+    progress: Optional[float] = None  # percent, once rows_total is known
+    file_name: Optional[str] = None
+    file_size: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+
 # Error response schema
 class ErrorResponse(BaseModel):
     detail: str
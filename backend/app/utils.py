@@ -3,57 +3,53 @@ Utility functions for Asset Management Platform
 """
 import os
 import io
+import json
+import base64
+import csv
+import tempfile
+import itertools
 from datetime import datetime, date
-from typing import List, Dict, Any
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, BinaryIO
+from openpyxl import load_workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
 import pandas as pd
+import numpy as np
+import xlsxwriter
+import pyarrow as pa
+import pyarrow.parquet as pq
 from sqlalchemy.orm import Session
-from models import Asset, AssetOperation, Company
+from models import Asset, AssetOperation, Company, AssetCategory, AssetStatus, OperationType
+from write_behind import record_audit
 import logging
 
 logger = logging.getLogger(__name__)
 
-def generate_inventory_number() -> str:
+def format_inventory_number(company_id: int, value: int) -> str:
     """
-    Generate unique inventory number in format: INV-YYYYMMDD-XXXX
+    Format allocated counter value as inventory number: INV-<company>-NNNNNN
+    The company segment keeps numbers globally unique across tenants
     """
-    today = datetime.now()
-    date_part = today.strftime("%Y%m%d")
-    
-    # In production, you might want to use database sequence or Redis counter
-    # For now, using timestamp-based approach
-    time_part = today.strftime("%H%M")
-    
-    return f"INV-{date_part}-{time_part}"
+    return f"INV-{company_id}-{value:06d}"
 
-def generate_unique_inventory_number(db: Session, company_id: int) -> str:
-    """
-    Generate truly unique inventory number by checking database
-    """
-    attempts = 0
-    max_attempts = 100
+# Short month names used in dashboard charts
+MONTH_ABBREVIATIONS = ["Янв", "Фев", "Мар", "Апр", "Май", "Июн", "Июл", "Авг", "Сен", "Окт", "Ноя", "Дек"]
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """Encode pagination position as an opaque URL-safe cursor"""
+    raw = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Decode cursor produced by encode_cursor, raising ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
     
-    while attempts < max_attempts:
-        inv_number = generate_inventory_number()
-        
-        # Check if number exists in this company
-        existing = db.query(Asset).join(Asset.warehouse).join(Asset.warehouse.branch).filter(
-            Asset.inventory_number == inv_number,
-            Asset.warehouse.branch.company_id == company_id
-        ).first()
-        
-        if not existing:
-            return inv_number
-        
-        attempts += 1
-        
-    # Fallback with random suffix
-    import random
-    suffix = str(random.randint(1000, 9999))
-    today = datetime.now().strftime("%Y%m%d")
-    return f"INV-{today}-{suffix}"
+    if not isinstance(position, dict) or "id" not in position:
+        raise ValueError("Invalid cursor")
+    return position
 
 def format_currency(amount: float, currency: str = "₽") -> str:
     """Format currency with proper separators"""
@@ -71,246 +67,482 @@ def format_datetime(dt: datetime, format_str: str = "%d.%m.%Y %H:%M") -> str:
         return ""
     return dt.strftime(format_str)
 
-class ExcelExporter:
-    """Excel export utility class"""
+# Russian labels used in exports
+STATUS_LABELS = {
+    "Active": "Активен",
+    "Inactive": "Неактивен",
+    "Repair": "Ремонт",
+    "Disposed": "Списан"
+}
+
+OPERATION_TYPE_LABELS = {
+    "Receipt": "Поступление",
+    "Transfer": "Перемещение",
+    "Disposal": "Списание",
+    "Adjustment": "Корректировка"
+}
+
+ASSET_EXPORT_HEADERS = [
+    "Инвентарный номер",
+    "Название",
+    "Категория",
+    "Статус",
+    "Количество",
+    "Стоимость",
+    "Общая стоимость",
+    "Склад",
+    "Серийный номер",
+    "Поставщик",
+    "Дата покупки",
+    "Примечания"
+]
+
+OPERATION_EXPORT_HEADERS = [
+    "Дата операции",
+    "Тип операции",
+    "Актив",
+    "Количество",
+    "Откуда",
+    "Куда",
+    "Пользователь",
+    "Причина",
+    "Документ",
+    "Примечания"
+]
+
+def asset_export_row(asset) -> List[Any]:
+    """Export cells of an asset row from asset_crud.export_query, in ASSET_EXPORT_HEADERS order"""
+    return [
+        asset.inventory_number,
+        asset.name,
+        asset.category.value,
+        STATUS_LABELS.get(asset.status.value, asset.status.value),
+        asset.quantity,
+        asset.cost,
+        asset.cost * asset.quantity,
+        asset.warehouse_name or "",
+        asset.serial_number or "",
+        asset.supplier or "",
+        format_date(asset.purchase_date) if asset.purchase_date else "",
+        asset.notes or ""
+    ]
+
+def operation_export_row(operation) -> List[Any]:
+    """Export cells of an operation row from operation_crud.export_query, in OPERATION_EXPORT_HEADERS order"""
+    return [
+        format_datetime(operation.operation_date),
+        OPERATION_TYPE_LABELS.get(operation.type.value, operation.type.value),
+        operation.asset_name or "",
+        operation.quantity,
+        operation.from_warehouse_name or "Внешний",
+        operation.to_warehouse_name or "Внешний",
+        operation.username or "",
+        operation.reason or "",
+        operation.document_number or "",
+        operation.notes or ""
+    ]
+
+def stream_csv(headers: List[str], rows: Iterable[List[Any]], chunk_rows: int = 500) -> Iterator[bytes]:
+    """
+    Encode rows as UTF-8 CSV incrementally, yielding a chunk every chunk_rows rows
+    The header goes out before the first row is fetched; the BOM lets Excel detect UTF-8
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+    
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % chunk_rows == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+# Columnar (Parquet / Arrow IPC) export schemas; field names match the
+# export_query column labels and keep raw values rather than display text
+ASSET_ARROW_SCHEMA = pa.schema([
+    ("id", pa.int32()),
+    ("inventory_number", pa.string()),
+    ("name", pa.string()),
+    ("category", pa.dictionary(pa.int8(), pa.string())),
+    ("status", pa.dictionary(pa.int8(), pa.string())),
+    ("quantity", pa.int32()),
+    ("cost", pa.float64()),
+    ("warehouse_name", pa.string()),
+    ("serial_number", pa.string()),
+    ("supplier", pa.string()),
+    ("purchase_date", pa.timestamp("us", tz="UTC")),
+    ("notes", pa.string())
+])
+
+OPERATION_ARROW_SCHEMA = pa.schema([
+    ("id", pa.int32()),
+    ("operation_date", pa.timestamp("us", tz="UTC")),
+    ("type", pa.dictionary(pa.int8(), pa.string())),
+    ("asset_id", pa.int32()),
+    ("asset_name", pa.string()),
+    ("quantity", pa.int32()),
+    ("from_warehouse_name", pa.string()),
+    ("to_warehouse_name", pa.string()),
+    ("username", pa.string()),
+    ("reason", pa.string()),
+    ("document_number", pa.string()),
+    ("notes", pa.string())
+])
+
+# Enum columns are encoded against the full list of enum values, so every
+# batch shares one dictionary and readers see stable categories
+ARROW_ENUM_COLUMNS = {"category": AssetCategory, "status": AssetStatus, "type": OperationType}
+_ARROW_ENUM_DICTIONARIES = {
+    column: (pa.array([member.value for member in enum_cls], pa.string()),
+             {member: index for index, member in enumerate(enum_cls)})
+    for column, enum_cls in ARROW_ENUM_COLUMNS.items()
+}
+
+COLUMNAR_FORMATS = {
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "arrow": ("arrows", "application/vnd.apache.arrow.stream")
+}
+
+class _ChunkSink:
+    """Write-only file object that buffers output until drained, for streaming writers"""
     
     def __init__(self):
-        self.workbook = Workbook()
-        self.worksheet = self.workbook.active
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+    
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self.position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def _record_batch(rows: List, schema: "pa.Schema") -> "pa.RecordBatch":
+    """Transpose a list of export rows into one Arrow record batch"""
+    columns = dict(zip(rows[0]._fields, zip(*rows)))
+    arrays = []
+    for field in schema:
+        values = columns[field.name]
+        if field.name in _ARROW_ENUM_DICTIONARIES:
+            dictionary, indices = _ARROW_ENUM_DICTIONARIES[field.name]
+            arrays.append(pa.DictionaryArray.from_arrays(
+                pa.array([None if value is None else indices[value] for value in values], pa.int8()),
+                dictionary
+            ))
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def stream_columnar(schema: "pa.Schema", rows: Iterable, export_format: str = "parquet",
+                    batch_size: int = 50000) -> Iterator[bytes]:
+    """
+    Encode export rows as zstd-compressed Parquet or Arrow IPC stream
+    Every batch_size rows become one record batch (a Parquet row group) and
+    are yielded as soon as they are written
+    """
+    sink = _ChunkSink()
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+    
+    finished = False
+    try:
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            writer.write_batch(_record_batch(batch, schema))
+            yield sink.drain()
+        writer.close()
+        finished = True
+    finally:
+        if not finished:
+            writer.close()
+    
+    yield sink.drain()
+
+class ExcelExporter:
+    """
+    Excel export utility class
+    Uses xlsxwriter's constant_memory mode: each row is flushed to disk once the
+    next one starts, so the report is written in one pass with flat memory
+    """
+    
+    # Excel sheet limit and widest auto-sized column
+    MAX_ROWS = 1048576
+    MAX_COLUMN_WIDTH = 50
+    
+    def __init__(self, fileobj: Optional[BinaryIO] = None):
+        # Writes to fileobj when given, otherwise to an anonymous temp file
+        self.file = fileobj if fileobj is not None else tempfile.TemporaryFile()
+        # Cell text is data: never turn it into formulas or hyperlinks, which
+        # also skips per-cell pattern matching
+        self.workbook = xlsxwriter.Workbook(self.file, {
+            "constant_memory": True,
+            "strings_to_formulas": False,
+            "strings_to_urls": False
+        })
+        self.worksheet = None
+        self.column_widths: List[int] = []
+        self.column_formats: Dict[int, Any] = {}
         
-    def create_assets_report(self, assets: List[Asset], company_name: str) -> io.BytesIO:
+    def create_assets_report(self, assets: Iterable, company_name: str) -> BinaryIO:
         """Create Excel report for assets"""
+        self._start_sheet("Активы", f"Отчет по активам - {company_name}", ASSET_EXPORT_HEADERS, "#4472C4")
         
-        # Set up worksheet
-        self.worksheet.title = "Активы"
-        
-        # Header styling
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Company header
-        self.worksheet.merge_cells('A1:L1')
-        company_cell = self.worksheet['A1']
-        company_cell.value = f"Отчет по активам - {company_name}"
-        company_cell.font = Font(bold=True, size=14)
-        company_cell.alignment = Alignment(horizontal="center")
-        
-        # Date header
-        self.worksheet.merge_cells('A2:L2')
-        date_cell = self.worksheet['A2']
-        date_cell.value = f"Сгенерирован: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
-        date_cell.alignment = Alignment(horizontal="center")
-        
-        # Column headers
-        headers = [
-            "Инвентарный номер",
-            "Название",
-            "Категория",
-            "Статус",
-            "Количество",
-            "Стоимость",
-            "Общая стоимость",
-            "Склад",
-            "Серийный номер",
-            "Поставщик",
-            "Дата покупки",
-            "Примечания"
-        ]
-        
-        for col, header in enumerate(headers, 1):
-            cell = self.worksheet.cell(row=4, column=col)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
+        # Cost and total cost columns; unformatted cells pick up their column format
+        money_format = self.workbook.add_format({"num_format": "#,##0.00"})
+        self.column_formats = {5: money_format, 6: money_format}
+        self.worksheet.set_column(5, 6, None, money_format)
         
         # Data rows
+        count = 0
         total_value = 0
-        for row, asset in enumerate(assets, 5):
-            asset_total = asset.cost * asset.quantity
-            total_value += asset_total
-            
-            data = [
-                asset.inventory_number,
-                asset.name,
-                asset.category.value,
-                self._get_status_text(asset.status.value),
-                asset.quantity,
-                asset.cost,
-                asset_total,
-                asset.warehouse.name if asset.warehouse else "",
-                asset.serial_number or "",
-                asset.supplier or "",
-                format_date(asset.purchase_date) if asset.purchase_date else "",
-                asset.notes or ""
-            ]
-            
-            for col, value in enumerate(data, 1):
-                cell = self.worksheet.cell(row=row, column=col)
-                cell.value = value
-                
-                # Format currency columns
-                if col in [6, 7]:  # Cost and total cost columns
-                    cell.number_format = '#,##0.00'
+        for count, asset in enumerate(self._limit_rows(assets), 1):
+            data = asset_export_row(asset)
+            total_value += data[6]
+            self._write_row(count + 3, data)
         
         # Summary row
-        summary_row = len(assets) + 6
-        self.worksheet.merge_cells(f'A{summary_row}:F{summary_row}')
-        summary_cell = self.worksheet[f'A{summary_row}']
-        summary_cell.value = f"Итого активов: {len(assets)}"
-        summary_cell.font = Font(bold=True)
+        summary_row = count + 5
+        summary_format = self.workbook.add_format({"bold": True})
+        self.worksheet.merge_range(summary_row, 0, summary_row, 5, f"Итого активов: {count}", summary_format)
+        self.worksheet.write_number(summary_row, 6, total_value,
+                                    self.workbook.add_format({"bold": True, "num_format": "#,##0.00"}))
         
-        total_cell = self.worksheet[f'G{summary_row}']
-        total_cell.value = total_value
-        total_cell.font = Font(bold=True)
-        total_cell.number_format = '#,##0.00'
-        
-        # Auto-adjust column widths
-        self._auto_adjust_columns()
-        
-        # Save to BytesIO
-        excel_buffer = io.BytesIO()
-        self.workbook.save(excel_buffer)
-        excel_buffer.seek(0)
-        
-        return excel_buffer
+        return self._finish()
     
-    def create_operations_report(self, operations: List[AssetOperation], company_name: str) -> io.BytesIO:
+    def create_operations_report(self, operations: Iterable, company_name: str) -> BinaryIO:
         """Create Excel report for operations"""
+        self._start_sheet("Операции", f"Отчет по операциям - {company_name}", OPERATION_EXPORT_HEADERS, "#70AD47")
         
-        self.worksheet.title = "Операции"
+        # Data rows
+        count = 0
+        for count, operation in enumerate(self._limit_rows(operations), 1):
+            self._write_row(count + 3, operation_export_row(operation))
         
-        # Header styling
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
+        # Summary row
+        summary_row = count + 5
+        self.worksheet.merge_range(summary_row, 0, summary_row, 3, f"Всего операций: {count}",
+                                   self.workbook.add_format({"bold": True}))
+        
+        return self._finish()
+    
+    def _start_sheet(self, sheet_name: str, title: str, headers: List[str], header_color: str):
+        """Add worksheet with title, generation date and column headers (rows 1-4)"""
+        self.worksheet = self.workbook.add_worksheet(sheet_name)
+        last_col = len(headers) - 1
         
         # Company header
-        self.worksheet.merge_cells('A1:J1')
-        company_cell = self.worksheet['A1']
-        company_cell.value = f"Отчет по операциям - {company_name}"
-        company_cell.font = Font(bold=True, size=14)
-        company_cell.alignment = Alignment(horizontal="center")
+        title_format = self.workbook.add_format({"bold": True, "font_size": 14, "align": "center"})
+        self.worksheet.merge_range(0, 0, 0, last_col, title, title_format)
         
         # Date header
-        self.worksheet.merge_cells('A2:J2')
-        date_cell = self.worksheet['A2']
-        date_cell.value = f"Сгенерирован: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
-        date_cell.alignment = Alignment(horizontal="center")
+        date_format = self.workbook.add_format({"align": "center"})
+        self.worksheet.merge_range(1, 0, 1, last_col,
+                                   f"Сгенерирован: {datetime.now().strftime('%d.%m.%Y %H:%M')}", date_format)
         
         # Column headers
-        headers = [
-            "Дата операции",
-            "Тип операции",
-            "Актив",
-            "Количество",
-            "Откуда",
-            "Куда",
-            "Пользователь",
-            "Причина",
-            "Документ",
-            "Примечания"
-        ]
-        
-        for col, header in enumerate(headers, 1):
-            cell = self.worksheet.cell(row=4, column=col)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-        
-        # Data rows
-        for row, operation in enumerate(operations, 5):
-            data = [
-                format_datetime(operation.operation_date),
-                self._get_operation_type_text(operation.type.value),
-                operation.asset.name if operation.asset else "",
-                operation.quantity,
-                operation.from_warehouse.name if operation.from_warehouse else "Внешний",
-                operation.to_warehouse.name if operation.to_warehouse else "Внешний",
-                operation.user.username if operation.user else "",
-                operation.reason or "",
-                operation.document_number or "",
-                operation.notes or ""
-            ]
-            
-            for col, value in enumerate(data, 1):
-                self.worksheet.cell(row=row, column=col, value=value)
-        
-        # Summary row
-        summary_row = len(operations) + 6
-        self.worksheet.merge_cells(f'A{summary_row}:D{summary_row}')
-        summary_cell = self.worksheet[f'A{summary_row}']
-        summary_cell.value = f"Всего операций: {len(operations)}"
-        summary_cell.font = Font(bold=True)
-        
-        # Auto-adjust column widths
-        self._auto_adjust_columns()
-        
-        # Save to BytesIO
-        excel_buffer = io.BytesIO()
-        self.workbook.save(excel_buffer)
-        excel_buffer.seek(0)
-        
-        return excel_buffer
-    
-    def _get_status_text(self, status: str) -> str:
-        """Convert status to Russian text"""
-        status_map = {
-            "Active": "Активен",
-            "Inactive": "Неактивен",
-            "Repair": "Ремонт",
-            "Disposed": "Списан"
-        }
-        return status_map.get(status, status)
-    
-    def _get_operation_type_text(self, op_type: str) -> str:
-        """Convert operation type to Russian text"""
-        type_map = {
-            "Receipt": "Поступление",
-            "Transfer": "Перемещение",
-            "Disposal": "Списание",
-            "Adjustment": "Корректировка"
-        }
-        return type_map.get(op_type, op_type)
-    
-    def _auto_adjust_columns(self):
-        """Auto-adjust column widths"""
-        for column in self.worksheet.columns:
-            max_length = 0
-            column = [cell for cell in column]
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            self.worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
+        header_format = self.workbook.add_format({
+            "bold": True, "font_color": "#FFFFFF", "bg_color": header_color,
+            "align": "center", "valign": "vcenter"
+        })
+        self.worksheet.write_row(3, 0, headers, header_format)
+        self.column_widths = [len(header) for header in headers]
+    
+    def _limit_rows(self, rows: Iterable) -> Iterator:
+        """Yield rows that fit on the sheet below the headers and above the summary"""
+        limit = self.MAX_ROWS - 6
+        for count, row in enumerate(rows):
+            if count == limit:
+                logger.warning(f"Excel export truncated to {limit} rows")
+                return
+            yield row
+    
+    def _write_row(self, row: int, data: List[Any]):
+        """Write data row and widen tracked column widths"""
+        self.worksheet.write_row(row, 0, data)
+        widths = self.column_widths
+        for col, value in enumerate(data):
+            if value is not None:
+                length = len(str(value))
+                if length > widths[col]:
+                    widths[col] = length
+    
+    def _finish(self) -> BinaryIO:
+        """Apply tracked column widths, close the workbook and return the file rewound"""
+        for col, width in enumerate(self.column_widths):
+            self.worksheet.set_column(col, col, min(width + 2, self.MAX_COLUMN_WIDTH),
+                                      self.column_formats.get(col))
+        self.workbook.close()
+        self.file.seek(0)
+        return self.file
+
+def iter_file(fileobj: BinaryIO, chunk_size: int = 64 * 1024, start: int = 0,
+              end: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Yield file content in chunks, closing the file once it is read or the client goes away
+    With start/end only that inclusive byte range is read
+    """
+    try:
+        if start:
+            fileobj.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = fileobj.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
+
+def parse_byte_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range Range header into an inclusive (start, end) byte range
+    Returns None when the whole file should be sent (no header, other units or
+    multiple ranges); raises ValueError when the range cannot be satisfied
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    
+    first, _, last = range_header[len("bytes="):].strip().partition("-")
+    if not (first or last) or not (first or "0").isdigit() or not (last or "0").isdigit():
+        # Malformed ranges are ignored
+        return None
+    
+    if not first:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+        if int(last) == 0:
+            start = size
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    
+    if start >= size or end < start:
+        raise ValueError(f"Range not satisfiable: {range_header}")
+    return start, end
 
 def create_backup_filename(prefix: str = "backup") -> str:
     """Create timestamped backup filename"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     return f"{prefix}_{timestamp}.sql"
 
-def validate_file_upload(file_content: bytes, allowed_extensions: List[str]) -> bool:
-    """Validate uploaded file"""
-    # Basic file validation
-    if len(file_content) > 10 * 1024 * 1024:  # 10MB limit
+def validate_file_upload(filename: str, file_size: Optional[int], allowed_extensions: List[str],
+                         max_size: int = 10 * 1024 * 1024) -> bool:
+    """Validate uploaded file by extension and size without reading its content"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in allowed_extensions:
+        return False
+    
+    if file_size is not None and file_size > max_size:
         return False
     
-    # Add more validation as needed
     return True
 
 def sanitize_filename(filename: str) -> str:
     """Sanitize filename for safe storage"""
     import re
     # Remove or replace unsafe characters
-    filename = re.sub(r'[^\w\s-.]', '', filename)
+    filename = re.sub(r'[^\w\s.-]', '', filename)
     filename = re.sub(r'[-\s]+', '-', filename)
     return filename.strip('-.')
 
+def _normalize_header(value: Any) -> str:
+    """Map a spreadsheet header cell to a field name: 'Serial Number' -> 'serial_number'"""
+    return "_".join(str(value or "").strip().lower().split())
+
+# Text fields of AssetCreate; XLSX hands numeric-looking cells (serial numbers,
+# names like 1001) over as numbers, which the schema would reject
+IMPORT_TEXT_FIELDS = ("name", "description", "serial_number", "supplier", "notes")
+
+def _import_text(value: Any) -> Any:
+    """Spreadsheet cell as text, whole numbers without a trailing .0"""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+def read_import_rows(fileobj: BinaryIO, filename: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Open a CSV or XLSX upload and return an iterator of (row_number, record) pairs
+    Rows are read lazily so memory stays flat regardless of file size; the header
+    is read eagerly so malformed files raise ValueError before any row is processed
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    
+    if extension == ".xlsx":
+        try:
+            workbook = load_workbook(fileobj, read_only=True, data_only=True)
+        except Exception as e:
+            raise ValueError(f"Cannot read XLSX file: {e}") from e
+        rows = workbook.active.iter_rows(values_only=True)
+        close = workbook.close
+    elif extension == ".csv":
+        text_stream = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        sample = text_stream.read(64 * 1024)
+        text_stream.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        rows = csv.reader(text_stream, dialect)
+        # Detach so closing the wrapper later does not close the upload
+        close = text_stream.detach
+    else:
+        raise ValueError(f"Unsupported file type: {extension}")
+    
+    header = next(rows, None)
+    if not header:
+        close()
+        raise ValueError("File has no header row")
+    columns = [_normalize_header(value) for value in header]
+    
+    def generate():
+        try:
+            for row_number, values in enumerate(rows, 2):
+                # Blank CSV cells mean "not set", like empty XLSX cells
+                record = {
+                    column: None if value == "" else value
+                    for column, value in zip(columns, values) if column
+                }
+                for column in IMPORT_TEXT_FIELDS:
+                    if column in record:
+                        record[column] = _import_text(record[column])
+                if any(value is not None for value in record.values()):
+                    yield row_number, record
+        finally:
+            close()
+    
+    return generate()
+
+DEPRECIATION_METHODS = ("straight_line", "declining_balance")
+
 def calculate_depreciation(cost: float, purchase_date: datetime, useful_life_years: int = 5) -> Dict[str, Any]:
     """Calculate asset depreciation"""
     if not purchase_date:
@@ -328,6 +560,52 @@ def calculate_depreciation(cost: float, purchase_date: datetime, useful_life_yea
         "years_since_purchase": round(years_since_purchase, 2)
     }
 
+def _accumulated_depreciation(cost: np.ndarray, years: np.ndarray, useful_life_years: int,
+                              method: str, factor: float) -> np.ndarray:
+    """Accumulated depreciation after the given number of years"""
+    if method == "straight_line":
+        return np.minimum(cost * (years / useful_life_years), cost)
+    
+    # Declining balance at factor / useful life per year; whatever is left
+    # at the end of the useful life is written off
+    rate = min(factor / useful_life_years, 1.0)
+    remaining = np.where(years >= useful_life_years, 0.0, np.power(1.0 - rate, years))
+    return cost * (1.0 - remaining)
+
+def calculate_portfolio_depreciation(cost: np.ndarray, purchase_date: np.ndarray, as_of: date,
+                                     useful_life_years: int = 5, method: str = "straight_line",
+                                     factor: float = 2.0, period_start: Optional[date] = None) -> Dict[str, np.ndarray]:
+    """
+    Vectorized depreciation for many assets at once
+    cost holds the depreciable value per element, purchase_date is datetime64[D]
+    with NaT for unknown dates (not depreciated, like calculate_depreciation).
+    Depreciation is linear in cost, so elements may be sums over assets bought
+    on the same day. Returns arrays of accumulated depreciation at as_of, the
+    depreciation charged since period_start (default: start of as_of's year)
+    and book value
+    """
+    if method not in DEPRECIATION_METHODS:
+        raise ValueError(f"Unknown depreciation method: {method}")
+    
+    cost = np.asarray(cost, dtype=np.float64)
+    purchase_date = np.asarray(purchase_date, dtype="datetime64[D]")
+    known = ~np.isnat(purchase_date)
+    if period_start is None:
+        period_start = date(as_of.year, 1, 1)
+    
+    def years_at(moment: date) -> np.ndarray:
+        days = (np.datetime64(moment, "D") - purchase_date).astype(np.int64)
+        return np.where(known, np.maximum(days, 0), 0) / 365.25
+    
+    accumulated = _accumulated_depreciation(cost, years_at(as_of), useful_life_years, method, factor)
+    accumulated_at_start = _accumulated_depreciation(cost, years_at(period_start), useful_life_years, method, factor)
+    
+    return {
+        "accumulated_depreciation": accumulated,
+        "period_depreciation": accumulated - accumulated_at_start,
+        "book_value": cost - accumulated
+    }
+
 # Logging utility
 def log_audit_action(
     user_id: int,
@@ -339,7 +617,8 @@ def log_audit_action(
     new_values: Dict = None,
     db: Session = None
 ):
-    """Log audit action (simplified - in production use proper audit system)"""
+    """Log audit action and queue it for audit_logs; written in batches, not in the caller's transaction"""
     logger.info(
         f"AUDIT: User {user_id} (Company {company_id}) performed {action} on {resource_type} {resource_id}"
-    )
\ No newline at end of file
+    )
+    record_audit(user_id, company_id, action, resource_type, resource_id, old_values, new_values)
\ No newline at end of file
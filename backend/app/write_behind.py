@@ -0,0 +1,168 @@
+"""
+Write-behind buffer for low-priority bookkeeping writes
+last_login and audit entries are queued in memory, coalesced per key and
+written in one multi-row statement per kind, off the request path
+"""
+import os
+import json
+import itertools
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from sqlalchemy import DateTime, Integer, column, insert, or_, update, values
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import AuditLog, User
+import logging
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL_MS", "1000")) / 1000
+WRITE_BEHIND_MAX_ENTRIES = int(os.getenv("WRITE_BEHIND_MAX_ENTRIES", "500"))
+
+Flusher = Callable[[Session, List[Dict[str, Any]]], None]
+
+class WriteBehindBuffer:
+    """
+    Queue writes per kind and key, flushing every interval or once max_entries are pending
+    A later write for the same key replaces the queued one. Until start() (and
+    after stop()) writes go straight through, so scripts and worker processes
+    never leave entries behind
+    """
+
+    def __init__(self, interval: float = 1.0, max_entries: int = 500):
+        self.interval = interval
+        self.max_entries = max_entries
+        self._flushers: Dict[str, Flusher] = {}
+        self._pending: Dict[str, Dict[Hashable, Dict[str, Any]]] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._sequence = itertools.count()
+
+    def register(self, kind: str, flusher: Flusher) -> None:
+        """Set function writing a batch of kind's entries (no commit)"""
+        self._flushers[kind] = flusher
+        self._pending.setdefault(kind, {})
+
+    def add(self, kind: str, entry: Dict[str, Any], key: Optional[Hashable] = None) -> None:
+        """Queue entry; entries without a key are never coalesced"""
+        if key is None:
+            key = next(self._sequence)
+        with self._lock:
+            queue = self._pending[kind]
+            if key not in queue:
+                self._count += 1
+            queue[key] = entry
+            full = self._count >= self.max_entries
+
+        if not self._running:
+            self.flush()
+        elif full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Write all queued entries, one statement per kind; returns entries written"""
+        with self._flush_lock:
+            with self._lock:
+                batches = {kind: list(queue.values()) for kind, queue in self._pending.items() if queue}
+                for kind in batches:
+                    self._pending[kind] = {}
+                self._count = 0
+
+            if not batches:
+                return 0
+
+            written = 0
+            db = SessionLocal()
+            try:
+                for kind, entries in batches.items():
+                    self._flushers[kind](db, entries)
+                    written += len(entries)
+                db.commit()
+            except Exception as e:
+                # Bookkeeping is best effort: a failed batch is logged and dropped
+                # rather than retried into an ever-growing queue
+                db.rollback()
+                logger.error(f"Write-behind flush of {sum(map(len, batches.values()))} entries failed: {e}")
+                written = 0
+            finally:
+                db.close()
+            return written
+
+    def start(self) -> None:
+        """Start the background flush thread"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flush thread and write whatever is still queued"""
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while self._running:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {e}")
+
+    def __len__(self) -> int:
+        return self._count
+
+def _flush_last_login(db: Session, entries: List[Dict[str, Any]]) -> None:
+    """UPDATE ... FROM (VALUES ...) setting each user's last_login"""
+    logins = values(
+        column("id", Integer), column("last_login", DateTime(timezone=True)), name="logins"
+    ).data([(entry["id"], entry["last_login"]) for entry in entries])
+    # Never move last_login backwards, e.g. behind a write from another worker
+    db.execute(
+        update(User).where(
+            User.id == logins.c.id,
+            or_(User.last_login.is_(None), User.last_login < logins.c.last_login)
+        ).values(last_login=logins.c.last_login)
+    )
+
+def _flush_audit(db: Session, entries: List[Dict[str, Any]]) -> None:
+    """Multi-row INSERT of audit log entries"""
+    db.execute(insert(AuditLog).values(entries))
+
+write_buffer = WriteBehindBuffer(interval=WRITE_BEHIND_INTERVAL, max_entries=WRITE_BEHIND_MAX_ENTRIES)
+write_buffer.register("last_login", _flush_last_login)
+write_buffer.register("audit", _flush_audit)
+
+def record_last_login(user_id: int, when: Optional[datetime] = None) -> None:
+    """Queue user's last_login update; repeated logins before a flush cost one row"""
+    write_buffer.add(
+        "last_login",
+        {"id": user_id, "last_login": when or datetime.now(timezone.utc)},
+        key=user_id
+    )
+
+def record_audit(user_id: int, company_id: int, action: str, resource_type: str,
+                 resource_id: Optional[int] = None, old_values: Optional[Dict] = None,
+                 new_values: Optional[Dict] = None) -> None:
+    """Queue audit log entry, timestamped now rather than at flush"""
+    write_buffer.add("audit", {
+        "user_id": user_id,
+        "company_id": company_id,
+        "action": action,
+        "resource_type": resource_type,
+        "resource_id": resource_id,
+        "old_values": json.dumps(old_values, default=str) if old_values is not None else None,
+        "new_values": json.dumps(new_values, default=str) if new_values is not None else None,
+        "timestamp": datetime.now(timezone.utc)
+    })
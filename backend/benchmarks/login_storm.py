@@ -0,0 +1,78 @@
+"""
+Login storm benchmark
+Measures latency of a cheap authenticated request (GET /warehouses) before
+and during a burst of concurrent logins, and the status codes of the logins
+Usage: python login_storm.py --email user@example.com --password secret
+       [--base-url http://127.0.0.1:8000] [--logins 200] [--baseline-seconds 3]
+       [--probe-interval-ms 10]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+from typing import List
+import httpx
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Percentile of latencies in seconds, as milliseconds"""
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 1)
+
+async def probe(client: httpx.AsyncClient, headers: dict, interval: float,
+                latencies: List[float], stop: asyncio.Event) -> None:
+    """Request /warehouses every interval until stopped, recording latencies"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/warehouses", headers=headers)
+        latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+        await asyncio.sleep(interval)
+
+async def run(args) -> None:
+    credentials = {"email": args.email, "password": args.password}
+    limits = httpx.Limits(max_connections=args.logins * 2)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        response = await client.post("/auth/login", json=credentials)
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        interval = args.probe_interval_ms / 1000
+
+        baseline, stop = [], asyncio.Event()
+        prober = asyncio.create_task(probe(client, headers, interval, baseline, stop))
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        await prober
+
+        storm, stop = [], asyncio.Event()
+        prober = asyncio.create_task(probe(client, headers, interval, storm, stop))
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/auth/login", json=credentials) for _ in range(args.logins)
+        ))
+        duration = time.perf_counter() - started
+        stop.set()
+        await prober
+
+    codes = Counter(response.status_code for response in responses)
+    print(f"baseline probe p50/p99 ms: {percentile(baseline, 0.5)} / {percentile(baseline, 0.99)} ({len(baseline)} requests)")
+    print(f"storm    probe p50/p99 ms: {percentile(storm, 0.5)} / {percentile(storm, 0.99)}, "
+          f"max {percentile(storm, 1)} ({len(storm)} requests)")
+    print(f"{args.logins} logins in {duration:.2f} s: "
+          + ", ".join(f"{code}: {count}" for code, count in sorted(codes.items())))
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Probe request latency during a burst of logins")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="API base URL")
+    parser.add_argument("--email", required=True, help="Login of an existing user")
+    parser.add_argument("--password", required=True, help="Password of that user")
+    parser.add_argument("--logins", type=int, default=200, help="Concurrent logins in the burst")
+    parser.add_argument("--baseline-seconds", type=float, default=3, help="Probe time before the burst")
+    parser.add_argument("--probe-interval-ms", type=float, default=10, help="Pause between probe requests")
+    args = parser.parse_args(argv)
+
+    asyncio.run(run(args))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Test fixtures
+Tests using the database run against the PostgreSQL database named by
+TEST_DATABASE_URL (tables and operation partitions are created on first use)
+and are skipped without it; the rest always run
+"""
+import os
+import sys
+import uuid
+from types import SimpleNamespace
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from sqlalchemy import text
+from database import SessionLocal, create_tables
+from models import Company, Branch, Warehouse, User, Asset, UserRole, AssetCategory, AssetStatus
+from crud import partition_crud, rollup_crud
+
+# Child tables first: the ORM-created schema has no ON DELETE CASCADE
+CLEANUP_TABLES = (
+    "audit_logs", "export_jobs", "refresh_tokens", "inventory_rollups", "inventory_counters",
+    "asset_operations", "assets", "users"
+)
+
+@pytest.fixture(scope="session")
+def database():
+    """Create tables and current operation partitions once per run"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        partition_crud.ensure(db, months_ahead=1)
+    finally:
+        db.close()
+
+@pytest.fixture
+def db(database):
+    """Session closed after the test"""
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def company(db):
+    """Company with one branch, two warehouses and an admin; removed with everything it owns"""
+    suffix = uuid.uuid4().hex[:12]
+    company = Company(name=f"Test company {suffix}", inn=suffix, email=f"{suffix}@example.com")
+    db.add(company)
+    db.flush()
+
+    branch = Branch(name="Main branch", company_id=company.id)
+    db.add(branch)
+    db.flush()
+
+    warehouses = [Warehouse(name=f"Warehouse {index}", branch_id=branch.id) for index in (1, 2)]
+    admin = User(
+        email=f"admin-{suffix}@example.com", username=f"admin-{suffix}",
+        hashed_password="!", role=UserRole.ADMIN, company_id=company.id
+    )
+    db.add_all(warehouses + [admin])
+    db.flush()
+    # Ids read before the commit: reading them after would reload the rows and
+    # keep a connection checked out for the whole test
+    ids = SimpleNamespace(id=company.id, branch_id=branch.id, admin_id=admin.id,
+                          warehouse_ids=[warehouse.id for warehouse in warehouses])
+    db.commit()
+
+    yield ids
+
+    db.rollback()
+    for table in CLEANUP_TABLES:
+        db.execute(text(f"DELETE FROM {table} WHERE company_id = :company_id"), {"company_id": ids.id})
+    db.execute(text("DELETE FROM warehouses WHERE branch_id = :branch_id"), {"branch_id": ids.branch_id})
+    db.execute(text("DELETE FROM branches WHERE company_id = :company_id"), {"company_id": ids.id})
+    db.execute(text("DELETE FROM companies WHERE id = :company_id"), {"company_id": ids.id})
+    db.commit()
+
+@pytest.fixture
+def make_assets(db, company):
+    """Factory inserting count active assets (into the first warehouse) with rollups rebuilt"""
+    def make(count: int, **values):
+        assets = [
+            Asset(
+                inventory_number=f"T-{uuid.uuid4().hex[:16]}",
+                name=f"Asset {index}",
+                category=values.get("category", AssetCategory.FIXED_ASSETS),
+                cost=values.get("cost", 100.0),
+                quantity=values.get("quantity", 1),
+                status=values.get("status", AssetStatus.ACTIVE),
+                warehouse_id=values.get("warehouse_id", company.warehouse_ids[0]),
+                company_id=company.id
+            )
+            for index in range(count)
+        ]
+        db.add_all(assets)
+        db.commit()
+        rollup_crud.rebuild(db, company.id)
+        return [asset.id for asset in assets]
+    return make
@@ -0,0 +1,23 @@
+"""
+Spreadsheet rows read for asset import validate as AssetCreate
+"""
+import io
+from openpyxl import Workbook
+from schemas import AssetCreate
+from utils import read_import_rows
+
+def test_xlsx_numeric_cells_in_text_fields():
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Name", "Category", "Cost", "Quantity", "Warehouse ID", "Serial Number", "Supplier"])
+    sheet.append([1001, "Materials", 250.5, 3, 1, 4815162342, 42.5])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+
+    (row_number, record), = list(read_import_rows(buffer, "assets.xlsx"))
+    asset = AssetCreate(**record)
+
+    assert row_number == 2
+    assert (asset.name, asset.serial_number, asset.supplier) == ("1001", "4815162342", "42.5")
+    assert (asset.cost, asset.quantity, asset.warehouse_id) == (250.5, 3, 1)
@@ -0,0 +1,50 @@
+"""
+Asset totals estimates and keyset cursors with hostile input
+"""
+import pytest
+from models import AssetCategory
+from utils import encode_cursor
+from crud import Explain, asset_crud
+
+@pytest.mark.parametrize("search_mode", ["fulltext", "contains"])
+def test_estimate_count_with_quotes_and_percent_in_search(db, company, make_assets, search_mode):
+    make_assets(3)
+    filters = {"search": "o'brien 5%", "search_mode": search_mode, "category": AssetCategory.FIXED_ASSETS}
+
+    estimate = asset_crud.count_by_company(db, company.id, estimate=True, **filters)
+    explain = Explain(asset_crud._filtered_query(db, company.id, **filters).statement)
+
+    assert estimate >= 0
+    # The search text is sent as a parameter, not rendered into the EXPLAIN
+    assert "brien" not in str(explain.compile(dialect=db.get_bind().dialect))
+    assert asset_crud.count_by_company(db, company.id, **filters) == 0
+
+@pytest.mark.parametrize("sort_by,value,asset_id", [
+    ("cost", "abc", 1),
+    ("id", "1", 1),
+    ("name", 5, 1),
+    ("created_at", 12345, 1),
+    ("created_at", "yesterday", 1),
+    ("id", 1, "1"),
+])
+def test_tampered_cursor_is_rejected(db, company, make_assets, sort_by, value, asset_id):
+    make_assets(2)
+    cursor = encode_cursor({"sort_by": sort_by, "sort_order": "asc", "value": value, "id": asset_id})
+
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        asset_crud.get_by_company(db, company.id, sort_by=sort_by, cursor=cursor)
+
+    # Rejected before reaching the database, so the session stays usable
+    assert len(asset_crud.get_by_company(db, company.id, sort_by=sort_by)) == 2
+
+def test_cursor_pages_through_all_assets(db, company, make_assets):
+    asset_ids = make_assets(5)
+    seen, cursor = [], None
+    while True:
+        page = asset_crud.get_by_company(db, company.id, limit=2, sort_by="cost", sort_order="desc", cursor=cursor)
+        if not page:
+            break
+        seen.extend(asset.id for asset in page)
+        cursor = asset_crud.make_cursor(page[-1], "cost", "desc")
+
+    assert sorted(seen) == sorted(asset_ids)
@@ -0,0 +1,44 @@
+"""
+Login reads the user once and reports this login as the last one
+"""
+from datetime import datetime, timezone
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from database import engine
+from models import User
+from auth import get_password_hash
+import main
+
+def test_login_selects_user_once(db, company):
+    admin = db.get(User, company.admin_id)
+    admin.hashed_password = get_password_hash("secret1")
+    email = admin.email
+    db.commit()
+
+    user_selects = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+            user_selects.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = TestClient(main.app).post("/auth/login", json={"email": email, "password": "secret1"})
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    assert response.status_code == 200
+    assert response.json()["user"]["email"] == email
+    assert len(user_selects) == 1
+
+def test_login_response_shows_current_login(db, company):
+    admin = db.get(User, company.admin_id)
+    admin.hashed_password = get_password_hash("secret1")
+    email = admin.email
+    db.commit()
+
+    before = datetime.now(timezone.utc)
+    response = TestClient(main.app).post("/auth/login", json={"email": email, "password": "secret1"})
+
+    assert response.status_code == 200
+    assert datetime.fromisoformat(response.json()["user"]["last_login"]) >= before
@@ -0,0 +1,28 @@
+"""
+Dashboard "today" follows the company's calendar, not the server's
+"""
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+from models import Company, AssetOperation, OperationType
+from crud import dashboard_crud, partition_crud
+
+TIMEZONE = "Pacific/Kiritimati"
+
+def test_operations_today_uses_company_midnight(db, company, make_assets):
+    asset_id = make_assets(1)[0]
+    db.get(Company, company.id).timezone = TIMEZONE
+    # The company's day can start in the previous server month
+    partition_crud.ensure(db, months_ahead=1, start=date.today() - timedelta(days=2))
+
+    tz = ZoneInfo(TIMEZONE)
+    day_start = datetime.combine(datetime.now(tz).date(), datetime.min.time(), tzinfo=tz)
+    minute = timedelta(minutes=1)
+    # Fourteen hours ahead of UTC: these straddle the company's midnight, not a UTC one
+    for when in (day_start - minute, day_start + minute):
+        db.add(AssetOperation(
+            type=OperationType.ADJUSTMENT, asset_id=asset_id, company_id=company.id,
+            user_id=company.admin_id, operation_date=when
+        ))
+    db.commit()
+
+    assert dashboard_crud.get_aggregates(db, company.id)["operations_today"] == 1
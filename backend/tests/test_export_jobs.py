@@ -0,0 +1,81 @@
+"""
+Export job limits and expiry; expiry follows the worker's heartbeat, not the job's age
+"""
+import threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from database import SessionLocal
+from models import ExportJob
+from schemas import ExportJobCreate
+from crud import export_job_crud
+
+TTL = timedelta(hours=24)
+STALE_AFTER = timedelta(minutes=15)
+
+def add_job(db, company, **values):
+    job = ExportJob(company_id=company.id, user_id=company.admin_id, kind="assets", format="csv", **values)
+    db.add(job)
+    db.commit()
+    return job.id
+
+def test_long_running_job_with_fresh_heartbeat_is_kept(db, company):
+    now = datetime.now(ZoneInfo("UTC"))
+    busy_id = add_job(db, company, status="running", created_at=now - 2 * TTL,
+                      started_at=now - 2 * TTL, heartbeat_at=now - timedelta(minutes=1))
+    quiet_id = add_job(db, company, status="running", created_at=now - timedelta(hours=1),
+                       started_at=now - timedelta(hours=1), heartbeat_at=now - 2 * STALE_AFTER)
+
+    export_job_crud.expire_due(db, TTL, STALE_AFTER)
+
+    assert export_job_crud.get(db, busy_id, company.id).status == "running"
+    quiet = export_job_crud.get(db, quiet_id, company.id)
+    assert (quiet.status, quiet.error) == ("failed", "Export worker stopped responding")
+
+def test_stale_job_is_not_completed_afterwards(db, company):
+    now = datetime.now(ZoneInfo("UTC"))
+    job_id = add_job(db, company, status="running", started_at=now - STALE_AFTER * 2,
+                     heartbeat_at=now - STALE_AFTER * 2)
+    export_job_crud.expire_due(db, TTL, STALE_AFTER)
+
+    assert not export_job_crud.complete(db, job_id, 10, "assets.csv", "/tmp/assets.csv", 100, TTL)
+    assert export_job_crud.get(db, job_id, company.id).status == "failed"
+
+def test_expired_rows_are_purged_after_grace_period(db, company):
+    now = datetime.now(ZoneInfo("UTC"))
+    old_id = add_job(db, company, status="expired", expires_at=now - timedelta(days=8))
+    recent_id = add_job(db, company, status="expired", expires_at=now - timedelta(days=1))
+
+    assert export_job_crud.purge_expired(db, timedelta(days=7)) >= 1
+
+    assert export_job_crud.get(db, old_id, company.id) is None
+    assert export_job_crud.get(db, recent_id, company.id) is not None
+
+def test_concurrent_creates_respect_active_limit(db, company):
+    max_active, attempts = 3, 10
+    barrier = threading.Barrier(attempts)
+    created, errors = [], []
+
+    def create():
+        session = SessionLocal()
+        try:
+            barrier.wait(timeout=30)
+            job = export_job_crud.create(
+                session, ExportJobCreate(kind="assets", format="csv"), company.admin_id, company.id,
+                max_active=max_active
+            )
+            if job:
+                created.append(job.id)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=create) for _ in range(attempts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(created) == max_active
+    assert export_job_crud.count_active(db, company.id) == max_active
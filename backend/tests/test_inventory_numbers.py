@@ -0,0 +1,37 @@
+"""
+Inventory numbers stay unique when many threads allocate at once
+"""
+import threading
+from database import SessionLocal
+from crud import CRUDInventoryNumber
+
+# Every connection the session pool can open (pool_size + max_overflow)
+THREADS = 30
+ALLOCATIONS = 20
+
+def test_concurrent_allocations_are_unique(company):
+    allocator = CRUDInventoryNumber(block_size=7)
+    barrier = threading.Barrier(THREADS)
+    numbers, errors = [], []
+
+    def allocate():
+        db = SessionLocal()
+        try:
+            # Hold a session connection, like a request creating assets does
+            db.connection()
+            barrier.wait()
+            for index in range(ALLOCATIONS):
+                numbers.extend(allocator.allocate(db, company.id, 1 + index % 3))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=allocate) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(numbers) == len(set(numbers)) == THREADS * sum(1 + index % 3 for index in range(ALLOCATIONS))
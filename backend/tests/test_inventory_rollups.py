@@ -0,0 +1,61 @@
+"""
+Inventory rollups stay equal to the base tables under concurrent writers
+"""
+import random
+import threading
+from database import SessionLocal
+from models import AssetStatus, OperationType
+from schemas import AssetUpdate, AssetOperationCreate
+from crud import asset_crud, operation_crud, rollup_crud
+
+WRITERS = 4
+ROUNDS = 25
+
+def run_writer(seed: int, company, asset_ids, barrier, errors):
+    """Random single, bulk and operation updates of the same few assets"""
+    rng = random.Random(seed)
+    db = SessionLocal()
+    try:
+        barrier.wait()
+        for _ in range(ROUNDS):
+            asset_id = rng.choice(asset_ids)
+            warehouse_id = rng.choice(company.warehouse_ids)
+            action = rng.randrange(4)
+            if action == 0:
+                asset_crud.update(db, asset_id, AssetUpdate(
+                    quantity=rng.randint(1, 10),
+                    status=rng.choice([AssetStatus.ACTIVE, AssetStatus.REPAIR])
+                ), company.id)
+            elif action == 1:
+                asset_crud.update_bulk(db, asset_ids, AssetUpdate(
+                    warehouse_id=warehouse_id, cost=float(rng.randint(50, 500))
+                ), company.id)
+            elif action == 2:
+                operation_crud.create(db, AssetOperationCreate(
+                    type=OperationType.TRANSFER, quantity=1, asset_id=asset_id, to_warehouse_id=warehouse_id
+                ), company.admin_id, company.id)
+            else:
+                operation_crud.create_bulk(db, asset_ids, AssetOperationCreate(
+                    type=OperationType.ADJUSTMENT, quantity=1, asset_id=asset_id,
+                    cost_after=float(rng.randint(50, 500))
+                ), company.admin_id, company.id)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        db.close()
+
+def test_rollups_match_after_concurrent_updates(db, company, make_assets):
+    asset_ids = make_assets(3, quantity=2)
+    barrier = threading.Barrier(WRITERS)
+    errors = []
+    threads = [
+        threading.Thread(target=run_writer, args=(seed, company, asset_ids, barrier, errors))
+        for seed in range(WRITERS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert rollup_crud.verify(db, company.id) == []
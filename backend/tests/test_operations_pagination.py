@@ -0,0 +1,61 @@
+"""
+Operation pages issue a fixed number of statements whatever their size
+"""
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from database import engine
+from models import OperationType
+from schemas import AssetOperationDetails, AssetOperationResponse
+from crud import operation_crud
+
+LIMITS = (5, 50, 200)
+
+@contextmanager
+def count_statements():
+    """Count statements sent to the database inside the block"""
+    counter = {"statements": 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter["statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+@pytest.fixture
+def operations(db, company, make_assets):
+    """Transfers back and forth between the company's warehouses, more than two of the largest pages"""
+    asset_ids = make_assets(50)
+    for round_number in range(9):
+        operation_crud.create_bulk(db, asset_ids, AssetOperationDetails(
+            type=OperationType.TRANSFER, quantity=1,
+            from_warehouse_id=company.warehouse_ids[round_number % 2],
+            to_warehouse_id=company.warehouse_ids[(round_number + 1) % 2]
+        ), company.admin_id, company.id)
+    return asset_ids
+
+def load_page(db, company_id, **params):
+    """Statements issued to fetch and serialize one page"""
+    db.expire_all()
+    with count_statements() as counter:
+        page = operation_crud.get_by_company(db, company_id, **params)
+        items = [AssetOperationResponse.from_orm(operation) for operation in page]
+    assert len(items) == params["limit"]
+    return counter["statements"]
+
+def test_page_statements_do_not_grow_with_limit(db, company, operations):
+    counts = {}
+    for limit in LIMITS:
+        first_page = operation_crud.get_by_company(db, company.id, limit=limit)
+        cursor = operation_crud.make_cursor(first_page[-1])
+        counts[limit] = (
+            load_page(db, company.id, skip=limit, limit=limit),
+            load_page(db, company.id, cursor=cursor, limit=limit)
+        )
+
+    assert len(set(counts.values())) == 1, counts
+    offset_statements, cursor_statements = counts[LIMITS[0]]
+    assert offset_statements == cursor_statements
@@ -3,6 +3,7 @@
 
 -- Create database extensions
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- ==========================================
 -- ENUMS
@@ -30,6 +31,7 @@ CREATE TABLE companies (
     inn VARCHAR(12) UNIQUE NOT NULL,
     email VARCHAR(255) NOT NULL,
     address TEXT,
+    timezone VARCHAR(64) NOT NULL DEFAULT 'UTC',
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE,
     is_active BOOLEAN DEFAULT TRUE
@@ -117,6 +119,8 @@ CREATE TABLE assets (
     quantity INTEGER NOT NULL DEFAULT 1 CHECK (quantity >= 0),
     status asset_status NOT NULL DEFAULT 'Active',
     warehouse_id INTEGER NOT NULL REFERENCES warehouses(id) ON DELETE RESTRICT,
+    -- Denormalized from warehouse -> branch, maintained by trigger
+    company_id INTEGER NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE,
     is_active BOOLEAN DEFAULT TRUE,
@@ -140,6 +144,8 @@ CREATE INDEX idx_assets_purchase_date ON assets(purchase_date);
 CREATE INDEX idx_assets_serial_number ON assets(serial_number);
 
 -- Composite indexes for common queries
+CREATE INDEX idx_assets_company_active ON assets(company_id, is_active);
+CREATE INDEX idx_assets_company_warehouse ON assets(company_id, warehouse_id, status, category) WHERE is_active = TRUE;
 CREATE INDEX idx_assets_warehouse_active ON assets(warehouse_id, is_active);
 CREATE INDEX idx_assets_category_status ON assets(category, status);
 CREATE INDEX idx_assets_status_active ON assets(status, is_active);
@@ -147,21 +153,29 @@ CREATE INDEX idx_assets_status_active ON assets(status, is_active);
 -- Full text search index for assets
 CREATE INDEX idx_assets_search ON assets USING gin(to_tsvector('russian', name || ' ' || COALESCE(description, '') || ' ' || inventory_number));
 
+-- Trigram indexes for inventory/serial number fragment search
+CREATE INDEX idx_assets_inventory_number_trgm ON assets USING gin(inventory_number gin_trgm_ops);
+CREATE INDEX idx_assets_serial_number_trgm ON assets USING gin(serial_number gin_trgm_ops);
+
 -- ==========================================
 -- ASSET OPERATIONS TABLE
 -- ==========================================
 
+-- Append-only history, range partitioned by month on operation_date so date
+-- filters prune to the relevant months and old months can be detached cheaply
 CREATE TABLE asset_operations (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     type operation_type NOT NULL,
     asset_id INTEGER NOT NULL REFERENCES assets(id) ON DELETE CASCADE,
+    -- Denormalized from the asset, maintained by trigger
+    company_id INTEGER NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
     quantity INTEGER NOT NULL DEFAULT 1 CHECK (quantity > 0),
     -- Warehouse movement tracking
     from_warehouse_id INTEGER REFERENCES warehouses(id) ON DELETE SET NULL,
     to_warehouse_id INTEGER REFERENCES warehouses(id) ON DELETE SET NULL,
     -- Operation details
     user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE RESTRICT,
-    operation_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    operation_date TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
     reason VARCHAR(255),
     notes TEXT,
     document_number VARCHAR(100),
@@ -169,8 +183,37 @@ CREATE TABLE asset_operations (
     cost_before DECIMAL(12,2),
     cost_after DECIMAL(12,2),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    is_active BOOLEAN DEFAULT TRUE
-);
+    is_active BOOLEAN DEFAULT TRUE,
+    -- The partition key must be part of the primary key
+    PRIMARY KEY (id, operation_date)
+) PARTITION BY RANGE (operation_date);
+
+-- Function to create monthly partitions from from_month through months_ahead
+-- months past the current one; the application runs the same on startup.
+-- There is deliberately no DEFAULT partition: it would block
+-- DETACH PARTITION CONCURRENTLY when archiving old months
+CREATE OR REPLACE FUNCTION ensure_operation_partitions(from_month DATE DEFAULT CURRENT_DATE, months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_month)::date;
+    last_month DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := 'asset_operations_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF asset_operations FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, month_start, (month_start + interval '1 month')::date);
+            created := created + 1;
+        END IF;
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ language 'plpgsql';
+
+SELECT ensure_operation_partitions();
 
 -- Create indexes for asset_operations
 CREATE INDEX idx_operations_type ON asset_operations(type);
@@ -183,10 +226,91 @@ CREATE INDEX idx_operations_is_active ON asset_operations(is_active);
 CREATE INDEX idx_operations_document_number ON asset_operations(document_number);
 
 -- Composite indexes for common queries
+CREATE INDEX idx_operations_company_date ON asset_operations(company_id, operation_date DESC);
+CREATE INDEX idx_operations_company_type_date ON asset_operations(company_id, type, operation_date DESC);
 CREATE INDEX idx_operations_asset_date ON asset_operations(asset_id, operation_date DESC);
 CREATE INDEX idx_operations_type_date ON asset_operations(type, operation_date DESC);
 CREATE INDEX idx_operations_user_date ON asset_operations(user_id, operation_date DESC);
 
+-- ==========================================
+-- INVENTORY ROLLUPS TABLE
+-- ==========================================
+
+-- Asset totals per company, warehouse, category and status.
+-- Maintained by the application in the same transaction as asset writes;
+-- rebuild/verify with backend/app/rollups.py
+CREATE TABLE inventory_rollups (
+    company_id INTEGER NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+    warehouse_id INTEGER NOT NULL REFERENCES warehouses(id) ON DELETE CASCADE,
+    category asset_category NOT NULL,
+    status asset_status NOT NULL,
+    asset_count INTEGER NOT NULL DEFAULT 0,
+    total_quantity INTEGER NOT NULL DEFAULT 0,
+    total_value DECIMAL(18,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (company_id, warehouse_id, category, status)
+);
+
+-- ==========================================
+-- INVENTORY COUNTERS TABLE
+-- ==========================================
+CREATE TABLE inventory_counters (
+    company_id INTEGER PRIMARY KEY REFERENCES companies(id) ON DELETE CASCADE,
+    last_value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ==========================================
+-- REFRESH TOKENS TABLE
+-- ==========================================
+
+CREATE TABLE refresh_tokens (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    company_id INTEGER NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+    token_hash VARCHAR(64) NOT NULL UNIQUE, -- HMAC-SHA256 of the token, never the token itself
+    family_id VARCHAR(32) NOT NULL, -- tokens rotated from one login
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    revoked_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX idx_refresh_tokens_user_id ON refresh_tokens(user_id);
+CREATE INDEX idx_refresh_tokens_family_id ON refresh_tokens(family_id);
+
+-- ==========================================
+-- EXPORT JOBS TABLE
+-- ==========================================
+
+CREATE TABLE export_jobs (
+    id SERIAL PRIMARY KEY,
+    company_id INTEGER NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    kind VARCHAR(20) NOT NULL CHECK (kind IN ('assets', 'operations')),
+    format VARCHAR(10) NOT NULL CHECK (format IN ('excel', 'csv')),
+    filters TEXT, -- JSON string
+    status VARCHAR(20) NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'running', 'completed', 'failed', 'expired')),
+    rows_total INTEGER,
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    file_name VARCHAR(255),
+    file_path VARCHAR(500),
+    file_size BIGINT,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    heartbeat_at TIMESTAMP WITH TIME ZONE, -- refreshed by the worker while rendering
+    finished_at TIMESTAMP WITH TIME ZONE,
+    expires_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX idx_export_jobs_company_created ON export_jobs(company_id, created_at DESC);
+-- Cleanup scans only jobs that still own a file or may still be running
+CREATE INDEX idx_export_jobs_pending_cleanup ON export_jobs(status, expires_at)
+    WHERE status IN ('pending', 'running', 'completed', 'failed');
+-- Expired rows are purged after a grace period
+CREATE INDEX idx_export_jobs_expired ON export_jobs(expires_at) WHERE status = 'expired';
+
 -- ==========================================
 -- AUDIT LOGS TABLE
 -- ==========================================
@@ -246,6 +370,35 @@ CREATE TRIGGER update_warehouses_updated_at BEFORE UPDATE ON warehouses
 CREATE TRIGGER update_assets_updated_at BEFORE UPDATE ON assets 
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Function to keep assets.company_id in sync with the warehouse hierarchy
+CREATE OR REPLACE FUNCTION sync_asset_company_id()
+RETURNS TRIGGER AS $$
+BEGIN
+    SELECT b.company_id INTO NEW.company_id
+    FROM warehouses w
+    JOIN branches b ON w.branch_id = b.id
+    WHERE w.id = NEW.warehouse_id;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER sync_asset_company_id_trigger BEFORE INSERT OR UPDATE OF warehouse_id ON assets
+    FOR EACH ROW EXECUTE FUNCTION sync_asset_company_id();
+
+-- Function to copy company_id from the asset onto its operations
+CREATE OR REPLACE FUNCTION sync_operation_company_id()
+RETURNS TRIGGER AS $$
+BEGIN
+    SELECT a.company_id INTO NEW.company_id
+    FROM assets a
+    WHERE a.id = NEW.asset_id;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER sync_operation_company_id_trigger BEFORE INSERT OR UPDATE OF asset_id ON asset_operations
+    FOR EACH ROW EXECUTE FUNCTION sync_operation_company_id();
+
 -- Function to validate asset operations
 CREATE OR REPLACE FUNCTION validate_asset_operation()
 RETURNS TRIGGER AS $$
@@ -326,9 +479,7 @@ SELECT
 FROM asset_operations o
 JOIN assets a ON o.asset_id = a.id
 JOIN users u ON o.user_id = u.id
-JOIN warehouses wa ON a.warehouse_id = wa.id
-JOIN branches ba ON wa.branch_id = ba.id
-JOIN companies c ON ba.company_id = c.id
+JOIN companies c ON o.company_id = c.id
 LEFT JOIN warehouses wf ON o.from_warehouse_id = wf.id
 LEFT JOIN warehouses wt ON o.to_warehouse_id = wt.id
 WHERE o.is_active = TRUE
@@ -346,6 +497,8 @@ ALTER TABLE warehouses ENABLE ROW LEVEL SECURITY;
 ALTER TABLE assets ENABLE ROW LEVEL SECURITY;
 ALTER TABLE asset_operations ENABLE ROW LEVEL SECURITY;
 ALTER TABLE audit_logs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE export_jobs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE refresh_tokens ENABLE ROW LEVEL SECURITY;
 
 -- Note: RLS policies would be implemented in application layer through ORM
 -- as they require context from JWT tokens which is handled by FastAPI
@@ -366,6 +519,7 @@ ANALYZE branches;
 ANALYZE warehouses;
 ANALYZE assets;
 ANALYZE asset_operations;
+ANALYZE inventory_rollups;
 ANALYZE audit_logs;
 
 -- Set statistics targets for frequently queried columns
@@ -0,0 +1,4 @@
+-- Per-company time zone used to bucket dashboard time series
+-- Apply to databases created before the column was added to init.sql
+
+ALTER TABLE companies ADD COLUMN IF NOT EXISTS timezone VARCHAR(64) NOT NULL DEFAULT 'UTC';
@@ -0,0 +1,26 @@
+-- Incrementally maintained inventory rollups
+-- Creates the table and fills it from the base tables
+
+CREATE TABLE IF NOT EXISTS inventory_rollups (
+    company_id INTEGER NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+    warehouse_id INTEGER NOT NULL REFERENCES warehouses(id) ON DELETE CASCADE,
+    category asset_category NOT NULL,
+    status asset_status NOT NULL,
+    asset_count INTEGER NOT NULL DEFAULT 0,
+    total_quantity INTEGER NOT NULL DEFAULT 0,
+    total_value DECIMAL(18,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (company_id, warehouse_id, category, status)
+);
+
+BEGIN;
+LOCK TABLE inventory_rollups IN SHARE ROW EXCLUSIVE MODE;
+DELETE FROM inventory_rollups;
+INSERT INTO inventory_rollups (company_id, warehouse_id, category, status, asset_count, total_quantity, total_value)
+SELECT b.company_id, a.warehouse_id, a.category, a.status, COUNT(*), SUM(a.quantity), SUM(a.cost * a.quantity)
+FROM assets a
+JOIN warehouses w ON a.warehouse_id = w.id
+JOIN branches b ON w.branch_id = b.id
+WHERE a.is_active = TRUE
+GROUP BY b.company_id, a.warehouse_id, a.category, a.status;
+COMMIT;
@@ -0,0 +1,7 @@
+-- Trigram indexes backing inventory/serial number fragment search
+-- CONCURRENTLY avoids blocking writes; run outside a transaction
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_assets_inventory_number_trgm ON assets USING gin(inventory_number gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_assets_serial_number_trgm ON assets USING gin(serial_number gin_trgm_ops);
@@ -0,0 +1,100 @@
+-- Denormalize company_id onto assets and asset_operations
+-- Adds the columns, backfills them from the warehouse hierarchy, then
+-- installs the sync triggers and tenant indexes used by the application
+
+ALTER TABLE assets ADD COLUMN IF NOT EXISTS company_id INTEGER REFERENCES companies(id) ON DELETE CASCADE;
+ALTER TABLE asset_operations ADD COLUMN IF NOT EXISTS company_id INTEGER REFERENCES companies(id) ON DELETE CASCADE;
+
+-- Backfill
+UPDATE assets a
+SET company_id = b.company_id
+FROM warehouses w
+JOIN branches b ON w.branch_id = b.id
+WHERE a.warehouse_id = w.id
+  AND a.company_id IS DISTINCT FROM b.company_id;
+
+UPDATE asset_operations o
+SET company_id = a.company_id
+FROM assets a
+WHERE o.asset_id = a.id
+  AND o.company_id IS DISTINCT FROM a.company_id;
+
+-- Keep the columns in sync for writes that do not set them
+CREATE OR REPLACE FUNCTION sync_asset_company_id()
+RETURNS TRIGGER AS $$
+BEGIN
+    SELECT b.company_id INTO NEW.company_id
+    FROM warehouses w
+    JOIN branches b ON w.branch_id = b.id
+    WHERE w.id = NEW.warehouse_id;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS sync_asset_company_id_trigger ON assets;
+CREATE TRIGGER sync_asset_company_id_trigger BEFORE INSERT OR UPDATE OF warehouse_id ON assets
+    FOR EACH ROW EXECUTE FUNCTION sync_asset_company_id();
+
+CREATE OR REPLACE FUNCTION sync_operation_company_id()
+RETURNS TRIGGER AS $$
+BEGIN
+    SELECT a.company_id INTO NEW.company_id
+    FROM assets a
+    WHERE a.id = NEW.asset_id;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS sync_operation_company_id_trigger ON asset_operations;
+CREATE TRIGGER sync_operation_company_id_trigger BEFORE INSERT OR UPDATE OF asset_id ON asset_operations
+    FOR EACH ROW EXECUTE FUNCTION sync_operation_company_id();
+
+-- Rows written between the backfill and the trigger installation
+UPDATE assets a
+SET company_id = b.company_id
+FROM warehouses w
+JOIN branches b ON w.branch_id = b.id
+WHERE a.warehouse_id = w.id
+  AND a.company_id IS NULL;
+
+UPDATE asset_operations o
+SET company_id = a.company_id
+FROM assets a
+WHERE o.asset_id = a.id
+  AND o.company_id IS NULL;
+
+ALTER TABLE assets ALTER COLUMN company_id SET NOT NULL;
+ALTER TABLE asset_operations ALTER COLUMN company_id SET NOT NULL;
+
+-- Tenant indexes (CONCURRENTLY: run outside a transaction)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_assets_company_active ON assets(company_id, is_active);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_assets_company_warehouse ON assets(company_id, warehouse_id, status, category) WHERE is_active = TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_operations_company_date ON asset_operations(company_id, operation_date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_operations_company_type_date ON asset_operations(company_id, type, operation_date DESC);
+
+-- Operation history view no longer needs the warehouse hierarchy
+CREATE OR REPLACE VIEW operation_history AS
+SELECT 
+    o.id,
+    o.type,
+    o.quantity,
+    o.operation_date,
+    o.reason,
+    o.notes,
+    o.document_number,
+    a.name as asset_name,
+    a.inventory_number,
+    u.username as user_name,
+    u.email as user_email,
+    wf.name as from_warehouse_name,
+    wt.name as to_warehouse_name,
+    c.name as company_name,
+    c.id as company_id
+FROM asset_operations o
+JOIN assets a ON o.asset_id = a.id
+JOIN users u ON o.user_id = u.id
+JOIN companies c ON o.company_id = c.id
+LEFT JOIN warehouses wf ON o.from_warehouse_id = wf.id
+LEFT JOIN warehouses wt ON o.to_warehouse_id = wt.id
+WHERE o.is_active = TRUE
+ORDER BY o.operation_date DESC;
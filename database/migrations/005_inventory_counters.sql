@@ -0,0 +1,13 @@
+-- Per-company inventory number counters
+-- Numbers are handed out in blocks by advancing last_value, so allocation
+-- never probes assets for collisions
+
+CREATE TABLE IF NOT EXISTS inventory_counters (
+    company_id INTEGER PRIMARY KEY REFERENCES companies(id) ON DELETE CASCADE,
+    last_value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO inventory_counters (company_id)
+SELECT id FROM companies
+ON CONFLICT (company_id) DO NOTHING;
@@ -0,0 +1,146 @@
+-- Convert asset_operations into a table range partitioned by month on operation_date
+-- Rebuilds the table: run in a maintenance window, writes to asset_operations
+-- are blocked until COMMIT. Partitions are created for every month that has
+-- data plus three months ahead; the application keeps creating future months
+-- on startup (or run: python partitions.py ensure)
+
+BEGIN;
+
+LOCK TABLE asset_operations IN ACCESS EXCLUSIVE MODE;
+
+DROP VIEW IF EXISTS operation_history;
+
+-- Free the names of the existing table, its primary key and indexes
+ALTER TABLE asset_operations RENAME TO asset_operations_unpartitioned;
+ALTER INDEX asset_operations_pkey RENAME TO asset_operations_unpartitioned_pkey;
+DROP INDEX IF EXISTS idx_operations_type;
+DROP INDEX IF EXISTS idx_operations_asset_id;
+DROP INDEX IF EXISTS idx_operations_user_id;
+DROP INDEX IF EXISTS idx_operations_operation_date;
+DROP INDEX IF EXISTS idx_operations_from_warehouse;
+DROP INDEX IF EXISTS idx_operations_to_warehouse;
+DROP INDEX IF EXISTS idx_operations_is_active;
+DROP INDEX IF EXISTS idx_operations_document_number;
+DROP INDEX IF EXISTS idx_operations_company_date;
+DROP INDEX IF EXISTS idx_operations_company_type_date;
+DROP INDEX IF EXISTS idx_operations_asset_date;
+DROP INDEX IF EXISTS idx_operations_type_date;
+DROP INDEX IF EXISTS idx_operations_user_date;
+
+CREATE TABLE asset_operations (
+    id INTEGER NOT NULL DEFAULT nextval('asset_operations_id_seq'),
+    type operation_type NOT NULL,
+    asset_id INTEGER NOT NULL REFERENCES assets(id) ON DELETE CASCADE,
+    company_id INTEGER NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+    quantity INTEGER NOT NULL DEFAULT 1 CHECK (quantity > 0),
+    from_warehouse_id INTEGER REFERENCES warehouses(id) ON DELETE SET NULL,
+    to_warehouse_id INTEGER REFERENCES warehouses(id) ON DELETE SET NULL,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE RESTRICT,
+    operation_date TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    reason VARCHAR(255),
+    notes TEXT,
+    document_number VARCHAR(100),
+    cost_before DECIMAL(12,2),
+    cost_after DECIMAL(12,2),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    is_active BOOLEAN DEFAULT TRUE,
+    PRIMARY KEY (id, operation_date)
+) PARTITION BY RANGE (operation_date);
+
+-- Keep the id sequence when the old table is dropped
+ALTER SEQUENCE asset_operations_id_seq OWNED BY asset_operations.id;
+
+CREATE OR REPLACE FUNCTION ensure_operation_partitions(from_month DATE DEFAULT CURRENT_DATE, months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_month)::date;
+    last_month DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := 'asset_operations_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF asset_operations FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, month_start, (month_start + interval '1 month')::date);
+            created := created + 1;
+        END IF;
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ language 'plpgsql';
+
+-- Rows without a date cannot be routed to a partition
+UPDATE asset_operations_unpartitioned
+SET operation_date = COALESCE(created_at, CURRENT_TIMESTAMP)
+WHERE operation_date IS NULL;
+
+SELECT ensure_operation_partitions(COALESCE((SELECT MIN(operation_date) FROM asset_operations_unpartitioned)::date, CURRENT_DATE));
+
+-- Copy before creating indexes and triggers so the load is a plain bulk insert
+INSERT INTO asset_operations (
+    id, type, asset_id, company_id, quantity, from_warehouse_id, to_warehouse_id, user_id,
+    operation_date, reason, notes, document_number, cost_before, cost_after, created_at, is_active
+)
+SELECT
+    id, type, asset_id, company_id, quantity, from_warehouse_id, to_warehouse_id, user_id,
+    operation_date, reason, notes, document_number, cost_before, cost_after, created_at, is_active
+FROM asset_operations_unpartitioned;
+
+DROP TABLE asset_operations_unpartitioned;
+
+-- Indexes on the parent are created on every partition, present and future
+CREATE INDEX idx_operations_type ON asset_operations(type);
+CREATE INDEX idx_operations_asset_id ON asset_operations(asset_id);
+CREATE INDEX idx_operations_user_id ON asset_operations(user_id);
+CREATE INDEX idx_operations_operation_date ON asset_operations(operation_date);
+CREATE INDEX idx_operations_from_warehouse ON asset_operations(from_warehouse_id);
+CREATE INDEX idx_operations_to_warehouse ON asset_operations(to_warehouse_id);
+CREATE INDEX idx_operations_is_active ON asset_operations(is_active);
+CREATE INDEX idx_operations_document_number ON asset_operations(document_number);
+CREATE INDEX idx_operations_company_date ON asset_operations(company_id, operation_date DESC);
+CREATE INDEX idx_operations_company_type_date ON asset_operations(company_id, type, operation_date DESC);
+CREATE INDEX idx_operations_asset_date ON asset_operations(asset_id, operation_date DESC);
+CREATE INDEX idx_operations_type_date ON asset_operations(type, operation_date DESC);
+CREATE INDEX idx_operations_user_date ON asset_operations(user_id, operation_date DESC);
+
+CREATE TRIGGER sync_operation_company_id_trigger BEFORE INSERT OR UPDATE OF asset_id ON asset_operations
+    FOR EACH ROW EXECUTE FUNCTION sync_operation_company_id();
+
+CREATE TRIGGER validate_asset_operation_trigger BEFORE INSERT OR UPDATE ON asset_operations
+    FOR EACH ROW EXECUTE FUNCTION validate_asset_operation();
+
+CREATE VIEW operation_history AS
+SELECT
+    o.id,
+    o.type,
+    o.quantity,
+    o.operation_date,
+    o.reason,
+    o.notes,
+    o.document_number,
+    a.name as asset_name,
+    a.inventory_number,
+    u.username as user_name,
+    u.email as user_email,
+    wf.name as from_warehouse_name,
+    wt.name as to_warehouse_name,
+    c.name as company_name,
+    c.id as company_id
+FROM asset_operations o
+JOIN assets a ON o.asset_id = a.id
+JOIN users u ON o.user_id = u.id
+JOIN companies c ON o.company_id = c.id
+LEFT JOIN warehouses wf ON o.from_warehouse_id = wf.id
+LEFT JOIN warehouses wt ON o.to_warehouse_id = wt.id
+WHERE o.is_active = TRUE
+ORDER BY o.operation_date DESC;
+
+ALTER TABLE asset_operations ENABLE ROW LEVEL SECURITY;
+ALTER TABLE asset_operations ALTER COLUMN type SET STATISTICS 1000;
+ALTER TABLE asset_operations ALTER COLUMN operation_date SET STATISTICS 1000;
+
+COMMIT;
+
+ANALYZE asset_operations;
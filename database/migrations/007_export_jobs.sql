@@ -0,0 +1,31 @@
+-- Background export jobs
+-- Rows track status and progress of exports rendered by the worker pool;
+-- files live on local disk until expires_at
+
+CREATE TABLE IF NOT EXISTS export_jobs (
+    id SERIAL PRIMARY KEY,
+    company_id INTEGER NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    kind VARCHAR(20) NOT NULL CHECK (kind IN ('assets', 'operations')),
+    format VARCHAR(10) NOT NULL CHECK (format IN ('excel', 'csv')),
+    filters TEXT, -- JSON string
+    status VARCHAR(20) NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'running', 'completed', 'failed', 'expired')),
+    rows_total INTEGER,
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    file_name VARCHAR(255),
+    file_path VARCHAR(500),
+    file_size BIGINT,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    expires_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_export_jobs_company_created ON export_jobs(company_id, created_at DESC);
+-- Cleanup scans only jobs that still own a file or may still be running
+CREATE INDEX IF NOT EXISTS idx_export_jobs_pending_cleanup ON export_jobs(status, expires_at)
+    WHERE status IN ('pending', 'running', 'completed', 'failed');
+
+ALTER TABLE export_jobs ENABLE ROW LEVEL SECURITY;
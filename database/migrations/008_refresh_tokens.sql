@@ -0,0 +1,19 @@
+-- Refresh tokens
+-- Opaque tokens are stored only as their keyed hash; each use rotates the
+-- token within its family, and reuse of a rotated token revokes the family
+
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    company_id INTEGER NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+    token_hash VARCHAR(64) NOT NULL UNIQUE, -- HMAC-SHA256 of the token, never the token itself
+    family_id VARCHAR(32) NOT NULL, -- tokens rotated from one login
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    revoked_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user_id ON refresh_tokens(user_id);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_family_id ON refresh_tokens(family_id);
+
+ALTER TABLE refresh_tokens ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,10 @@
+-- Export job heartbeat
+-- Running jobs count as stale only once their worker stops refreshing
+-- heartbeat_at, and expired rows are purged after a grace period
+
+ALTER TABLE export_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITH TIME ZONE;
+
+UPDATE export_jobs SET heartbeat_at = COALESCE(started_at, created_at)
+WHERE status = 'running' AND heartbeat_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_export_jobs_expired ON export_jobs(expires_at) WHERE status = 'expired';
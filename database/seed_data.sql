@@ -6,8 +6,8 @@
 -- ==========================================
 
 -- Insert Result Education company
-INSERT INTO companies (name, inn, email, address) VALUES 
-('Result Education', '7743013902', 'info@result-education.ru', 'г. Ташкент, ул. Шота Руставели, д. 10');
+INSERT INTO companies (name, inn, email, address, timezone) VALUES 
+('Result Education', '7743013902', 'info@result-education.ru', 'г. Ташкент, ул. Шота Руставели, д. 10', 'Asia/Tashkent');
 
 -- Get company ID for reference
 -- In real application, this would be handled programmatically
@@ -148,6 +148,9 @@ INSERT INTO assets (inventory_number, name, description, category, cost, quantit
 -- SAMPLE OPERATIONS DATA
 -- ==========================================
 
+-- Operations are partitioned by month; sample data starts in January 2024
+SELECT ensure_operation_partitions('2024-01-01');
+
 -- Receipt operations (поступления)
 INSERT INTO asset_operations (type, asset_id, quantity, to_warehouse_id, user_id, operation_date, reason, document_number, notes) VALUES 
 (1, 'Receipt', 1, 1, NULL, 1, '2024-06-01 09:00:00', 'Закупка нового оборудования', 'ПО-2024-001', 'Поступление компьютера Dell'),
@@ -191,6 +194,19 @@ INSERT INTO audit_logs (user_id, company_id, action, resource_type, resource_id,
 (2, 1, 'ADJUSTMENT', 'Asset', 14, '2024-06-20 16:00:00', '192.168.1.102'),
 (1, 1, 'LOGIN', 'User', 1, CURRENT_TIMESTAMP, '192.168.1.100');
 
+-- ==========================================
+-- INVENTORY ROLLUPS
+-- ==========================================
+
+-- Build rollups for the seeded assets
+INSERT INTO inventory_rollups (company_id, warehouse_id, category, status, asset_count, total_quantity, total_value)
+SELECT b.company_id, a.warehouse_id, a.category, a.status, COUNT(*), SUM(a.quantity), SUM(a.cost * a.quantity)
+FROM assets a
+JOIN warehouses w ON a.warehouse_id = w.id
+JOIN branches b ON w.branch_id = b.id
+WHERE a.is_active = TRUE
+GROUP BY b.company_id, a.warehouse_id, a.category, a.status;
+
 -- ==========================================
 -- UPDATE STATISTICS
 -- ==========================================
@@ -202,6 +218,7 @@ ANALYZE branches;
 ANALYZE warehouses;
 ANALYZE assets;
 ANALYZE asset_operations;
+ANALYZE inventory_rollups;
 ANALYZE audit_logs;
 
 -- Create some test data for different time periods for analytics